@@ -3,16 +3,18 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from app.schemas.aiops import AIOpsRequest, AIOpsResponse
 from app.services.aiops_service import AIOpsService
-from app.core.settings import Settings, get_settings
+from app.core.dependencies import AppResources, get_app_resources
 from loguru import logger
 import json
 
 router = APIRouter(tags=["aiops"])
 
 
-def get_aiops_service(settings: Settings = Depends(get_settings)) -> AIOpsService:
-    """依赖注入：获取 AIOps 服务实例"""
-    return AIOpsService(settings)
+def get_aiops_service(resources: AppResources = Depends(get_app_resources)) -> AIOpsService:
+    """依赖注入：获取应用级共享的 AIOps 服务实例"""
+    if resources.aiops_service is None:
+        resources.aiops_service = AIOpsService(resources.settings, resources=resources)
+    return resources.aiops_service
 
 
 @router.post("/ai_ops", response_model=AIOpsResponse)
@@ -10,6 +10,7 @@ from app.schemas.chat import ChatRequest, ChatResponse
 from app.services.session_store import SessionStore
 from app.services.chat_service import ChatService
 from app.clients.dashscope_client import DashScopeClient
+from app.core.dependencies import AppResources, get_app_resources
 from app.core.settings import Settings, get_settings
 from app.api.routes_session import get_session_store
 from loguru import logger
@@ -18,9 +19,10 @@ router = APIRouter(tags=["chat"])
 
 
 def get_chat_service(settings: Settings = Depends(get_settings),
-                     session_store: SessionStore = Depends(get_session_store)) -> ChatService:
-
-    return ChatService(settings, session_store)
+                     session_store: SessionStore = Depends(get_session_store),
+                     resources: AppResources = Depends(get_app_resources)) -> ChatService:
+    # ChatService 本身很轻，重资源（Milvus/Embedding/Reranker/LLM）都来自应用级容器
+    return ChatService(settings, session_store, resources=resources)
 
 
 @router.post("/chat", response_model=ChatResponse)
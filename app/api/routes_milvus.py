@@ -3,15 +3,15 @@
 # - GET /milvus/health - 检查 Milvus 连接状态
 from fastapi import APIRouter, Depends
 from app.clients.milvus_client import MilvusClient
-from app.core.settings import Settings, get_settings
+from app.core.dependencies import AppResources, get_app_resources
 from loguru import logger
 
 # 创建路由器
 router = APIRouter(tags=["milvus"])
 
 
-def get_milvus_client(settings: Settings = Depends(get_settings)):
-    return MilvusClient(settings)
+def get_milvus_client(resources: AppResources = Depends(get_app_resources)) -> MilvusClient:
+    return resources.milvus_client
 @router.get("/health")
 async def milvus_health(milvus_client:MilvusClient=Depends(get_milvus_client)):
     try:
@@ -5,23 +5,63 @@
 
 from typing import Optional
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
-from app.schemas.upload import UploadResponse
-from app.services.vector_index_service import VectorIndexService
+from app.schemas.upload import IngestionJobResponse, UploadResponse
+from app.services.ingestion_service import IngestionJobQueue
+from app.core.dependencies import AppResources, get_app_resources
 from app.core.settings import Settings, get_settings
-from app.clients.milvus_client import MilvusClient
-from app.rag.embeddings import EmbeddingService
-from app.rag.chunking import DocumentChunker,get_strategy_by_filename
-from app.rag.vector_store import VectorStore
+from app.rag.chunking import get_strategy_by_filename
 from loguru import logger
+import asyncio
+import hashlib
 import os
+import uuid
+from typing import Tuple
 router = APIRouter()
 
 
+def get_ingestion_jobs(resources: AppResources = Depends(get_app_resources)) -> IngestionJobQueue:
+    return resources.ingestion_jobs
+
+
+async def save_upload_stream(
+        file: UploadFile,
+        file_path: str,
+        max_bytes: int,
+        chunk_size: int
+) -> Tuple[int, str]:
+    """按固定大小分块流式落盘，边写边算 sha256；超过上限返回 413 并删除半成品。"""
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"文件过大：{file.size} 字节，上限 {max_bytes} 字节")
+
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = f"{file_path}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"文件过大：超过上限 {max_bytes} 字节")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        # 写完再原子替换，避免并发上传同名文件时读到写了一半的文件
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size, digest.hexdigest()
+
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(
         file: UploadFile = File(...),
         title: Optional[str] = Form(None),
-        settings: Settings = Depends(get_settings)
+        settings: Settings = Depends(get_settings),
+        ingestion_jobs: IngestionJobQueue = Depends(get_ingestion_jobs)
 ):
     try:
         allowed_extensions= [".txt", ".md", ".pdf", ".docx", ".html", ".htm", ".csv", ".json", ".xlsx", ".xls"]
@@ -36,27 +76,29 @@ async def upload_file(
         # 2. 确保 uploads 目录存在
         os.makedirs(settings.upload_dir, exist_ok=True)
 
-        file_path=os.path.join(settings.upload_dir,file.filename)
-        with open(file_path,"wb") as f:
-            content=await file.read()
-            f.write(content)
-        logger.info(f"文件{file.filename}保存成功:{file_path}")
+        # 先存到任务独占的暂存路径，任务完成后才替换同名文件；
+        # 同名文件再次上传不会覆盖前一个还在排队 / 解析中的任务正在读的文件
+        job_id=uuid.uuid4().hex
+        final_path=os.path.join(settings.upload_dir,file.filename)
+        file_path=os.path.join(settings.upload_dir,f"{job_id}_{file.filename}")
+        size,file_hash=await save_upload_stream(
+            file,file_path,
+            max_bytes=settings.upload_max_bytes,
+            chunk_size=settings.upload_chunk_size
+        )
+        logger.info(f"文件{file.filename}保存成功:{file_path}（{size} 字节，sha256={file_hash}）")
         strategy=get_strategy_by_filename(file.filename)
         logger.info(f"文件 {file.filename} 使用分块策略: {strategy.value}")
 
-        milvus_client = MilvusClient(settings)
-        await milvus_client.connect()
-        await milvus_client.ensure_collection()
-
-        embedding_service=EmbeddingService(settings)
-        vector_store=VectorStore(milvus_client,embedding_service)
-        chunker=DocumentChunker(
-            strategy=strategy, max_size=settings.doc_chunk_max_size,
-            overlap=settings.doc_chunk_overlap
+        # 加载/切分/向量化/写入都交给后台任务，接口只登记任务并立即返回 job_id
+        job=ingestion_jobs.submit(
+            file_path,file.filename,title=title or "",file_hash=file_hash,
+            final_path=final_path,job_id=job_id
+        )
+        return UploadResponse(
+            filename=file.filename,chunks=0,status=job.status,
+            job_id=job.job_id,file_hash=file_hash
         )
-        index_service=VectorIndexService(chunker,vector_store)
-        result=await index_service.index_document(file_path,file.filename,title=title or "")
-        return UploadResponse(**result)
     except HTTPException:
         raise
     except Exception as e:
@@ -64,18 +106,12 @@ async def upload_file(
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+@router.get("/upload/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_upload_job(
+        job_id: str,
+        ingestion_jobs: IngestionJobQueue = Depends(get_ingestion_jobs)
+):
+    job=ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"导入任务不存在: {job_id}")
+    return IngestionJobResponse(**job.to_dict())
@@ -8,6 +8,11 @@
 # Phase 2: 将添加 create_collection、insert、search 方法
 from functools import lru_cache
 import asyncio
+import functools
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, TypeVar
 from pymilvus import (
     connections,
     utility,
@@ -19,26 +24,132 @@ from pymilvus import (
 from app.core.settings import Settings
 from loguru import logger
 
+T = TypeVar("T")
+
+# schema v2：把高频过滤字段从 JSON metadata 提升为带标量索引的列，
+# 过滤和按 source 删除不再扫描 JSON。字段名 -> (FieldSchema 参数, 标量索引类型)
+SCALAR_FIELD_SPECS = {
+    "source": ({"dtype": DataType.VARCHAR, "max_length": 2048}, "INVERTED"),
+    "doc_type": ({"dtype": DataType.VARCHAR, "max_length": 64}, "INVERTED"),
+    "title": ({"dtype": DataType.VARCHAR, "max_length": 2048}, "INVERTED"),
+    "ingested_at": ({"dtype": DataType.INT64}, "STL_SORT"),
+    "content_hash": ({"dtype": DataType.VARCHAR, "max_length": 64}, "INVERTED"),
+}
+
+
+VECTOR_INDEX_TYPES = ("AUTO", "IVF_FLAT", "IVF_SQ8", "IVF_PQ", "HNSW", "DISKANN")
+
+# 目标召回率 -> 需要探查的聚类比例（IVF 系列经验值，区间内线性插值）
+_RECALL_PROBE_FRACTIONS = [(0.80, 0.01), (0.90, 0.02), (0.95, 0.05), (0.99, 0.12), (1.00, 1.00)]
+
+
+def auto_nlist(entity_count: int) -> int:
+    """nlist ≈ 4·sqrt(N)，向上取 2 的幂，限制在 [128, 65536]；空 collection 退回原来的 128。"""
+    target = 4 * math.sqrt(max(entity_count, 1))
+    nlist = 1 << math.ceil(math.log2(target))
+    return min(65536, max(128, nlist))
+
+
+def auto_nprobe(nlist: int, target_recall: float) -> int:
+    recall = min(max(target_recall, _RECALL_PROBE_FRACTIONS[0][0]), 1.0)
+    fraction = _RECALL_PROBE_FRACTIONS[-1][1]
+    for (low_recall, low_frac), (high_recall, high_frac) in zip(
+        _RECALL_PROBE_FRACTIONS, _RECALL_PROBE_FRACTIONS[1:]
+    ):
+        if recall <= high_recall:
+            ratio = (recall - low_recall) / (high_recall - low_recall)
+            fraction = low_frac + ratio * (high_frac - low_frac)
+            break
+    nprobe = math.ceil(nlist * fraction)
+    return min(nlist, max(min(8, nlist), nprobe))
+
+
+def build_index_params(settings: Settings, entity_count: int = 0, index_type: Optional[str] = None) -> Dict:
+    """根据配置和当前数据量生成向量索引的建索引参数。"""
+    index_type = (index_type or settings.milvus_index_type).upper()
+    nlist = settings.milvus_index_nlist or auto_nlist(entity_count)
+    if index_type in ("AUTO", "IVF_FLAT", "IVF_SQ8"):
+        params = {"nlist": nlist}
+        index_type = "IVF_FLAT" if index_type == "AUTO" else index_type
+    elif index_type == "IVF_PQ":
+        params = {"nlist": nlist, "m": settings.milvus_pq_m, "nbits": 8}
+    elif index_type == "HNSW":
+        params = {"M": settings.milvus_hnsw_m, "efConstruction": settings.milvus_hnsw_ef_construction}
+    elif index_type == "DISKANN":
+        params = {}
+    else:
+        raise ValueError(f"不支持的向量索引类型: {index_type}，可选 {', '.join(VECTOR_INDEX_TYPES)}")
+    return {"metric_type": "IP", "index_type": index_type, "params": params}
+
+
+def build_schema(schema_version: int = 2) -> CollectionSchema:
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=1024),
+        FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
+        FieldSchema(name="metadata", dtype=DataType.JSON),
+    ]
+    if schema_version >= 2:
+        fields.extend(
+            FieldSchema(name=name, **params) for name, (params, _index) in SCALAR_FIELD_SPECS.items()
+        )
+    return CollectionSchema(fields=fields, description="知识库向量存储")
+
 
 class MilvusClient:
     """Milvus 向量数据库客户端"""
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, collection_name: Optional[str] = None):
         self.settings = settings
-        self.collection_name = settings.milvus_collection
+        self.collection_name = collection_name or settings.milvus_collection
         self.collection = None
+        # 当前 collection 实际拥有的标量列；v1 schema 为空集合，调用方据此选择表达式写法
+        self.scalar_fields: Set[str] = set()
+        # 当前向量索引的实际类型和 nlist，用于生成检索参数
+        self.index_type: Optional[str] = None
+        self.index_nlist: Optional[int] = None
+        # pymilvus 的 ORM 接口全是同步阻塞调用，统一丢到有界的专用线程池里执行，
+        # 避免慢查询卡住事件循环（所有 SSE 流都会被拖住）
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def run(self, fn: Callable[..., T], *args, timeout: Optional[float] = None, **kwargs) -> T:
+        """
+        在 Milvus 专用线程池中执行同步调用。
+
+        Args:
+            timeout: 单次调用超时秒数，None 取 Settings.milvus_call_timeout，<=0 表示不限时。
+                超时只会让调用方提前返回，已发出的 pymilvus 请求仍会在线程里跑完。
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.settings.milvus_io_workers,
+                thread_name_prefix="milvus-io",
+            )
+        if timeout is None:
+            timeout = self.settings.milvus_call_timeout
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout if timeout and timeout > 0 else None)
+        except asyncio.TimeoutError:
+            name = getattr(fn, "__name__", repr(fn))
+            logger.error(f"Milvus 调用超时（{timeout}s）: {name}")
+            raise TimeoutError(f"Milvus 调用超时（{timeout}s）: {name}")
+
+    def _connect_sync(self) -> None:
+        if connections.has_connection("default"):
+            logger.info("milvus连接")
+            return
+        connections.connect(
+            alias="default",
+            host=self.settings.milvus_host,
+            port=self.settings.milvus_port
+        )
+        logger.info("连接注册成功")
 
     async def connect(self) -> None:
         try:
-            if connections.has_connection("default"):
-                logger.info("milvus连接")
-                return
-            connections.connect(
-                alias="default",
-                host=self.settings.milvus_host,
-                port=self.settings.milvus_port
-            )
-            logger.info("连接注册成功")
+            await self.run(self._connect_sync)
         except Exception as e:
             logger.error(f"连接milvus失败：{str(e)}")
             raise Exception(f"无法连接到 Milvus: {str(e)}")
@@ -48,18 +159,24 @@ class MilvusClient:
             if not connections.has_connection("default"):
                 logger.warning("milvus连接不存在")
                 return False
-            utility.list_collections()
+            await self.run(utility.list_collections)
             logger.debug("milvus健康检查通过")
             return True
         except Exception as e:
             logger.error(f"Milvus 健康检查失败: {str(e)}")
             return False
+
+    def _open_collection_sync(self) -> None:
+        self.collection=Collection(self.collection_name)
+        self.collection.load()
+        self._detect_schema()
+        self._detect_index()
+
     async def ensure_collection(self) -> None:
          try:
-              if utility.has_collection(self.collection_name):
+              if await self.run(utility.has_collection, self.collection_name):
                    logger.info(f"Collection '{self.collection_name}' 已存在")
-                   self.collection=Collection(self.collection_name)
-                   self.collection.load()
+                   await self.run(self._open_collection_sync)
               else:
                    logger.info(
                         f"Collection '{self.collection_name}' 不存在，" )
@@ -68,36 +185,118 @@ class MilvusClient:
          except Exception as e:
               logger.error(f"检查 collection 失败: {str(e)}")
               raise Exception(f"无法检查 collection: {str(e)}")
-    async def create_collection(self)->None:
-        try:
-            if utility.has_collection(self.collection_name):
-                logger.info(f"Collection '{self.collection_name}' 已存在,跳过创建")
-                self.collection=Collection(self.collection_name)
-                return
-            fields=[
-                FieldSchema(name="id",dtype=DataType.INT64,is_primary=True,auto_id=True),
-                FieldSchema(name="vector",dtype=DataType.FLOAT_VECTOR,dim=1024),
-                FieldSchema(name="content",dtype=DataType.VARCHAR,max_length=65535),
-                FieldSchema(name="metadata",dtype=DataType.JSON)
-            ]
-            schema=CollectionSchema(
-                fields=fields,
-                description="知识库向量存储"
-            )
-            self.collection=Collection(
-                name=self.collection_name,
-                schema=schema
-            )
-            index_params = {
-           "metric_type": "IP",
-           "index_type": "IVF_FLAT",
-           "params": {"nlist": 128}   }
-            self.collection.create_index(
-                field_name="vector",
-                index_params=index_params
+    def _detect_schema(self) -> None:
+        names = {field.name for field in self.collection.schema.fields}
+        self.scalar_fields = names & set(SCALAR_FIELD_SPECS)
+        if not self.scalar_fields and self.settings.milvus_schema_version >= 2:
+            logger.warning(
+                f"Collection '{self.collection_name}' 仍是 v1 schema（只有 JSON metadata），"
+                "过滤与删除会扫描 JSON；可运行 python -m evals.rag.migrate_collection_schema 迁移"
             )
-            self.collection.load()
-            logger.info(f"Collection '{self.collection_name}' 创建成功")
+
+    def _vector_index(self):
+        for index in self.collection.indexes:
+            if index.field_name == "vector":
+                return index
+        return None
+
+    def _detect_index(self) -> None:
+        self.index_type, self.index_nlist = None, None
+        index = self._vector_index()
+        if index is None:
+            return
+        params = dict(index.params)
+        nested = params.get("params")
+        if isinstance(nested, str):
+            nested = json.loads(nested)
+        if isinstance(nested, dict):
+            params.update(nested)
+        self.index_type = str(params.get("index_type") or "").upper() or None
+        self.index_nlist = int(params["nlist"]) if params.get("nlist") else None
+
+        if self.index_nlist and self.settings.milvus_index_type.upper() == "AUTO":
+            recommended = auto_nlist(self.collection.num_entities)
+            if recommended >= self.index_nlist * 4:
+                logger.warning(
+                    f"当前 nlist={self.index_nlist} 对 {self.collection.num_entities} 条数据偏小（建议 {recommended}），"
+                    "可运行 python -m evals.rag.rebuild_vector_index 重建索引"
+                )
+
+    def search_params(self, limit: int) -> Dict:
+        """按当前索引类型生成检索参数；ef / search_list 不能小于返回条数。"""
+        settings = self.settings
+        index_type = self.index_type or "IVF_FLAT"
+        if index_type == "HNSW":
+            params = {"ef": max(settings.milvus_hnsw_ef, limit)}
+        elif index_type == "DISKANN":
+            params = {"search_list": max(settings.milvus_diskann_search_list, limit)}
+        elif index_type.startswith("IVF"):
+            nlist = self.index_nlist or 128
+            nprobe = settings.milvus_search_nprobe or auto_nprobe(nlist, settings.milvus_target_recall)
+            params = {"nprobe": min(nprobe, nlist)}
+        else:
+            params = {}
+        return {"metric_type": "IP", "params": params}
+
+    def _rebuild_vector_index_sync(self, index_type: Optional[str]) -> Dict:
+        entity_count = self.collection.num_entities
+        index_params = build_index_params(self.settings, entity_count, index_type)
+        old_index = self._vector_index()
+        self.collection.release()
+        if old_index is not None:
+            self.collection.drop_index(index_name=old_index.index_name)
+        self.collection.create_index(
+            field_name="vector",
+            index_params=index_params,
+            index_name=old_index.index_name if old_index is not None else "",
+        )
+        self.collection.load()
+        self._detect_index()
+        logger.info(f"向量索引重建完成: {index_params}（{entity_count} 条）")
+        return {"entity_count": entity_count, "index_params": index_params}
+
+    async def rebuild_vector_index(self, index_type: Optional[str] = None) -> Dict:
+        """原地重建向量索引（切换类型或按当前数据量重选 nlist），向量本身不动，无需重新 embedding。"""
+        try:
+            # 大集合建索引耗时不可预估，不设超时
+            return await self.run(self._rebuild_vector_index_sync, index_type, timeout=0)
+        except Exception as e:
+            logger.error(f"重建向量索引失败: {str(e)}")
+            raise Exception(f"重建向量索引失败: {str(e)}")
+
+    def _create_collection_sync(self, schema_version: Optional[int]) -> None:
+        if utility.has_collection(self.collection_name):
+            logger.info(f"Collection '{self.collection_name}' 已存在,跳过创建")
+            self.collection=Collection(self.collection_name)
+            self._detect_schema()
+            self._detect_index()
+            return
+        if schema_version is None:
+            schema_version = self.settings.milvus_schema_version
+        self.collection=Collection(
+            name=self.collection_name,
+            schema=build_schema(schema_version)
+        )
+        index_params = build_index_params(self.settings)
+        self.collection.create_index(
+            field_name="vector",
+            index_params=index_params
+        )
+        if schema_version >= 2:
+            for name, (_params, index_type) in SCALAR_FIELD_SPECS.items():
+                self.collection.create_index(
+                    field_name=name,
+                    index_name=f"idx_{name}",
+                    index_params={"index_type": index_type},
+                )
+        self.collection.load()
+        self._detect_schema()
+        self._detect_index()
+        logger.info(f"Collection '{self.collection_name}' 创建成功（schema v{schema_version}）")
+
+    async def create_collection(self, schema_version: Optional[int] = None)->None:
+        try:
+            await self.run(self._create_collection_sync, schema_version, timeout=0)
         except Exception as e:
             logger.error(f"创建 collection 失败: {str(e)}")
             raise Exception(f"创建 collection 失败: {str(e)}")
@@ -106,10 +305,11 @@ class MilvusClient:
     async def close(self)->None:
          try:
               if connections.has_connection("default"):
-                   connections.disconnect("default")
+                   await self.run(connections.disconnect, "default")
                    logger.info("Milvus 连接已关闭")
          except Exception as e:
              logger.error(f"关闭 Milvus 连接失败: {str(e)}")
-
-
-
+         finally:
+             if self._executor is not None:
+                 self._executor.shutdown(wait=False)
+                 self._executor = None
@@ -1,3 +1,177 @@
 # FastAPI 依赖注入
-# TODO: 定义服务和客户端的依赖函数
-# Phase 2 会用到
+# 应用级共享资源容器：在 lifespan 中构建一次，所有路由复用同一套
+# Milvus 连接 / Embedding / Reranker / VectorStore / BM25 / LLM 客户端，
+# 避免每个请求都重新连 Milvus、重新加载本地模型。
+import asyncio
+from typing import Optional
+
+from fastapi import Request
+from langchain_community.chat_models import ChatTongyi
+from loguru import logger
+
+from app.clients.milvus_client import MilvusClient
+from app.core.settings import Settings, get_settings
+from app.rag.bm25 import BM25Retriever
+from app.rag.document_parser import DocumentParsePool
+from app.rag.embedding_batcher import QueryEmbeddingBatcher
+from app.rag.embedding_cache import CachedEmbeddingService, EmbeddingCache
+from app.rag.embeddings import EmbeddingService
+from app.rag.reranker import BGEReranker
+from app.rag.vector_store import VectorStore
+from app.services.ingestion_service import IngestionJobQueue
+from app.services.rag_service import RAGService
+
+
+class AppResources:
+    """进程级单例资源，路由只拿引用，不再自行构建。"""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        # 对话主模型（流式）与摘要/改写用的非流式模型
+        self.chat_llm = ChatTongyi(
+            dashscope_api_key=settings.dashscope_api_key,
+            model_name=settings.chat_model,
+            streaming=True,
+        )
+        self.summary_llm = ChatTongyi(
+            dashscope_api_key=settings.dashscope_api_key,
+            model_name=settings.chat_model,
+            streaming=False,
+            temperature=0.0,
+        )
+        self.reranker_llm = ChatTongyi(
+            dashscope_api_key=settings.dashscope_api_key,
+            model_name="qwen-turbo",
+            streaming=False,
+            temperature=0.0,
+        )
+
+        self.milvus_client = MilvusClient(settings)
+        self.embedding_service: Optional[EmbeddingService] = None
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.reranker: Optional[BGEReranker] = None
+        self.bm25_retriever: Optional[BM25Retriever] = None
+        self.vector_store: Optional[VectorStore] = None
+        self.rag_service: Optional[RAGService] = None
+        self.aiops_rag_service: Optional[RAGService] = None
+        self.aiops_service = None
+        # 上传后的加载/切分/向量化在后台任务队列中执行，解析放到独立进程，不占用服务进程的 GIL
+        self.parse_pool = DocumentParsePool(
+            max_workers=settings.parse_workers,
+            timeout=settings.parse_timeout_seconds,
+            pdf_parallel_min_pages=settings.pdf_parallel_min_pages,
+            pdf_pages_per_task=settings.pdf_pages_per_task,
+        )
+        self.ingestion_jobs = IngestionJobQueue(
+            settings, self.ensure_vector_store, parse_pool=self.parse_pool
+        )
+
+        self._reranker_loaded = False
+        self._lock = asyncio.Lock()
+
+    async def startup(self) -> None:
+        """lifespan 启动阶段预热；Milvus 不可用时不阻塞应用启动，后续请求再懒加载重试。"""
+        try:
+            await self.ensure_vector_store()
+            logger.info("应用共享资源初始化完成")
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"应用共享资源预热失败，将在首次请求时重试: {e}")
+
+    async def ensure_vector_store(self) -> VectorStore:
+        if self.vector_store is not None:
+            return self.vector_store
+
+        async with self._lock:
+            if self.vector_store is not None:
+                return self.vector_store
+
+            await self.milvus_client.connect()
+            await self.milvus_client.ensure_collection()
+
+            # 本地模型加载是同步且耗时的操作，放到线程里避免阻塞事件循环。
+            if self.embedding_service is None:
+                self.embedding_service = await asyncio.to_thread(self._build_embedding_service)
+            if not self._reranker_loaded:
+                try:
+                    self.reranker = await asyncio.to_thread(
+                        BGEReranker,
+                        "BAAI/bge-reranker-base",
+                        batch_size=self.settings.rerank_batch_size,
+                        max_length=self.settings.rerank_max_length,
+                        cache_size=self.settings.rerank_cache_size,
+                    )
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"BGE Reranker 初始化失败，回退到 LLM 重排: {e}")
+                    self.reranker = None
+                self._reranker_loaded = True
+
+            if self.bm25_retriever is None:
+                self.bm25_retriever = await asyncio.to_thread(
+                    BM25Retriever, self.settings.bm25_index_dir
+                )
+            vector_store = VectorStore(
+                self.milvus_client,
+                self.embedding_service,
+                reranker_llm=self.reranker_llm,
+                reranker=self.reranker,
+                bm25_retriever=self.bm25_retriever,
+                dense_top_k=10,
+                enable_rerank=True,
+                insert_batch_size=self.settings.ingest_batch_size,
+            )
+            try:
+                await vector_store.sync_bm25_index()
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f"BM25 索引回灌失败，继续使用本地已持久化的索引: {e}")
+            self.rag_service = RAGService(vector_store, self.chat_llm)
+            self.aiops_rag_service = RAGService(vector_store, self.summary_llm)
+            self.vector_store = vector_store
+            return vector_store
+
+    def _build_embedding_service(self):
+        # 组装顺序：缓存 -> 查询微批合并 -> 实际 provider，缓存命中的查询不进入批次
+        embedding_service = EmbeddingService(self.settings)
+        if self.settings.embedding_batch_enabled:
+            embedding_service = QueryEmbeddingBatcher(
+                embedding_service,
+                max_batch_size=self.settings.embedding_batch_max_size,
+                max_wait_ms=self.settings.embedding_batch_max_wait_ms,
+            )
+        if not self.settings.embedding_cache_enabled:
+            return embedding_service
+        self.embedding_cache = EmbeddingCache(
+            path=self.settings.embedding_cache_path,
+            max_items=self.settings.embedding_cache_size,
+        )
+        namespace = f"{self.settings.embedding_provider}:{self.settings.embedding_model}"
+        if self.settings.embedding_provider == "onnx" and self.settings.embedding_onnx_quantize:
+            # int8 量化后的向量与 fp32 有细微差别，缓存分开存
+            namespace += ":int8"
+        return CachedEmbeddingService(embedding_service, self.embedding_cache, namespace=namespace)
+
+    async def get_rag_service(self) -> RAGService:
+        await self.ensure_vector_store()
+        return self.rag_service
+
+    async def get_aiops_rag_service(self) -> RAGService:
+        await self.ensure_vector_store()
+        return self.aiops_rag_service
+
+    async def shutdown(self) -> None:
+        await self.ingestion_jobs.shutdown()
+        self.parse_pool.shutdown()
+        await self.milvus_client.close()
+        if self.bm25_retriever is not None:
+            # 等后台快照合并写完再退出
+            await asyncio.to_thread(self.bm25_retriever.close)
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+
+
+def get_app_resources(request: Request) -> AppResources:
+    resources = getattr(request.app.state, "resources", None)
+    if resources is None:
+        # 未走 lifespan 的场景（例如测试里单独挂载 router）按需补建一次。
+        resources = AppResources(get_settings())
+        request.app.state.resources = resources
+    return resources
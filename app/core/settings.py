@@ -8,24 +8,86 @@ class Settings(BaseSettings):
     # 应用配置
     app_port: int = 9900
     upload_dir: str = "./uploads"
+    # 单个上传文件大小上限（字节）与流式落盘的分块大小
+    upload_max_bytes: int = 100 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
 
     # DashScope 配置
     dashscope_api_key: str
     chat_model: str = "qwen3-max"
-    # 默认仍走 DashScope；只有显式改成 bge 才切到本地 embedding。
+    # 默认仍走 DashScope；显式改成 bge（FlagModel / PyTorch）或 onnx（ONNX Runtime，CPU 节点推荐）才切到本地 embedding。
     embedding_provider: str = "dashscope"
     embedding_model: str = "text-embedding-v4"
     embedding_device: str = ""
+    # onnx 后端：导出目录（空 = 模型缓存目录下的 onnx/）、是否动态 int8 量化、intra-op 线程数（0 = ORT 自动）
+    embedding_onnx_dir: str = ""
+    embedding_onnx_quantize: bool = True
+    embedding_onnx_threads: int = 0
+    # 本地模型（bge / onnx）按 token 长度分桶组批：单批最多条数、单批 padding 后 token 总数上限
+    embedding_local_max_batch_size: int = 64
+    embedding_local_max_batch_tokens: int = 16384
+    # 本地 BGE reranker：单批 pair 数、pair 最大 token 长度、(query, chunk) 分数 LRU 缓存条数
+    rerank_batch_size: int = 32
+    rerank_max_length: int = 512
+    rerank_cache_size: int = 20000
+    # embedding 两级缓存（内存 LRU + SQLite）
+    embedding_cache_enabled: bool = True
+    embedding_cache_size: int = 10000
+    embedding_cache_path: str = "./data/embedding_cache.sqlite3"
+    # 并发查询 embedding 的微批合并
+    embedding_batch_enabled: bool = True
+    embedding_batch_max_size: int = 16
+    embedding_batch_max_wait_ms: float = 5.0
+    # 文档 embedding 分批：单次请求条数（DashScope text-embedding-v3/v4 单次最多 10 条）、批间并发数、单批失败重试次数
+    embedding_doc_batch_size: int = 10
+    embedding_concurrency: int = 4
+    embedding_max_retries: int = 2
 
     # Milvus 配置
     milvus_host: str = "localhost"
     milvus_port: int = 19530
     milvus_collection: str = "knowledge_base"
+    # pymilvus 同步调用所在线程池的大小与单次调用超时（秒）
+    milvus_io_workers: int = 8
+    milvus_call_timeout: float = 30.0
+    # 新建 collection 使用的 schema 版本：1 = 仅 JSON metadata；2 = 高频过滤字段提升为标量列
+    milvus_schema_version: int = 2
+    # 向量索引：AUTO / IVF_FLAT / IVF_SQ8 / IVF_PQ / HNSW / DISKANN
+    # AUTO 按建索引时的数据量选 nlist，检索时按 nlist 和目标召回率选 nprobe
+    milvus_index_type: str = "AUTO"
+    milvus_index_nlist: int = 0  # 0 表示按数据量自动选择
+    milvus_search_nprobe: int = 0  # 0 表示按 milvus_target_recall 自动选择
+    milvus_target_recall: float = 0.95
+    milvus_pq_m: int = 64  # IVF_PQ 子空间数，需整除向量维度
+    milvus_hnsw_m: int = 16
+    milvus_hnsw_ef_construction: int = 200
+    milvus_hnsw_ef: int = 64
+    milvus_diskann_search_list: int = 100
 
     # RAG 配置
     doc_chunk_max_size: int = 800
     doc_chunk_overlap: int = 100
+    # 表格（CSV/Excel）每个 chunk 的行数
+    doc_table_rows_per_chunk: int = 20
+    # >0 时按 token 预算切分（本地 BGE 编码上限 512 token），0 表示沿用按字符的 doc_chunk_max_size
+    doc_chunk_max_tokens: int = 0
+    # token 计数方式：approx（近似估算，无额外依赖）或 HuggingFace tokenizer 名称，如 BAAI/bge-large-zh-v1.5
+    doc_chunk_tokenizer: str = "approx"
     rag_top_k: int = 3
+    # 批量导入时每批写入 Milvus 的 chunk 数
+    ingest_batch_size: int = 512
+    # 后台导入任务的解析 / 索引 worker 数（各自独立）
+    ingest_workers: int = 2
+    # 超过该大小的上传文件走流式导入（边加载切分边写入），不在解析阶段整体物化
+    ingest_stream_min_bytes: int = 64 * 1024 * 1024
+    # 文档解析进程池：0 表示 CPU 核数 - 1；单文件解析超时（秒，<=0 不限制）
+    parse_workers: int = 0
+    parse_timeout_seconds: float = 300.0
+    # PDF 页数达到阈值时按页段拆给多个解析进程并行处理
+    pdf_parallel_min_pages: int = 32
+    pdf_pages_per_task: int = 16
+    # BM25 索引持久化目录（快照 + 追加日志）
+    bm25_index_dir: str = "./data/bm25"
 
     redis_host: str = "localhost"
     redis_port: int = 6379
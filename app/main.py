@@ -1,13 +1,32 @@
 # FastAPI 应用入口
-# TODO: 任务 3.1 - 初始化 FastAPI 应用，配置 CORS，添加启动/关闭事件
+# 任务 3.1 - 初始化 FastAPI 应用，配置 CORS，lifespan 管理共享资源
 # TODO: 任务 3.2 - 添加健康检查端点 GET /health
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import routes_chat, routes_milvus, routes_session, routes_upload, routes_aiops
+from app.core.dependencies import AppResources
+from app.core.settings import get_settings
 import os
 os.environ["HF_HOME"] = "D:/AI编程/kiro-place/JAVA-agent/my-agent/models"
 os.environ["TRANSFORMERS_CACHE"] = "D:/AI编程/kiro-place/JAVA-agent/my-agent/models"
-app=FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时构建共享资源，关闭时释放连接"""
+    print("Application starting...")
+    resources = AppResources(get_settings())
+    await resources.startup()
+    app.state.resources = resources
+    print("Application startup complete")
+    yield
+    print("Application shutting down...")
+    await resources.shutdown()
+    print("Application shutdown complete")
+
+
+app=FastAPI(lifespan=lifespan)
 
 
 app.add_middleware(
@@ -18,27 +37,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 启动事件：应用启动时执行
-@app.on_event("startup")
-async def startup_event():
-    """应用启动时的初始化操作"""
-    print("Application starting...")
-    # TODO: 这里后续会添加：
-    # - 初始化日志系统
-    # - 连接 Milvus 数据库
-    # - 初始化其他资源
-    print("Application startup complete")
-
-# 关闭事件：应用关闭时执行
-@app.on_event("shutdown")
-async def shutdown_event():
-    """应用关闭时的清理操作"""
-    print("Application shutting down...")
-    # TODO: 这里后续会添加：
-    # - 断开 Milvus 连接
-    # - 清理临时资源
-    print("Application shutdown complete")
-
 
 @app.get("/health")
 async def health()->dict:
@@ -1,10 +1,12 @@
 import asyncio
 import os
 from pathlib import Path
-from typing import Iterable, List
+from typing import Callable, Iterable, List, Sequence
 
+import numpy as np
 import torch
 from FlagEmbedding import FlagModel
+from loguru import logger
 
 
 # 统一放在 D 盘，避免模型下载到系统盘。
@@ -19,13 +21,74 @@ MODEL_ALIASES = {
 }
 
 
+def plan_length_batches(
+    lengths: Sequence[int],
+    max_batch_size: int = 64,
+    max_batch_tokens: int = 16384,
+) -> List[np.ndarray]:
+    """
+    按 token 长度降序分批，长度相近的文本放在同一批，padding 只补到批内最长；
+    每批 padding 后的 token 数（条数 × 批内最长）不超过 max_batch_tokens，条数不超过 max_batch_size。
+    短文本因此能组成更大的批，长文本的批自动变小。返回每批在原输入中的下标。
+    """
+    order = np.argsort(-np.asarray(lengths, dtype=np.int64), kind="stable")
+    batches: List[np.ndarray] = []
+    current: List[int] = []
+    longest = 0
+    for index in order.tolist():
+        # 降序遍历，批内第一条就是最长的
+        if current and (len(current) >= max_batch_size or (len(current) + 1) * longest > max_batch_tokens):
+            batches.append(np.asarray(current))
+            current = []
+        if not current:
+            longest = max(1, int(lengths[index]))
+        current.append(index)
+    if current:
+        batches.append(np.asarray(current))
+    return batches
+
+
+def encode_by_length(
+    lengths: Sequence[int],
+    encode_batch: Callable[[np.ndarray], np.ndarray],
+    max_batch_size: int = 64,
+    max_batch_tokens: int = 16384,
+) -> np.ndarray:
+    """按 plan_length_batches 分批编码，再按下标写回，输出顺序与输入一致。"""
+    batches = plan_length_batches(lengths, max_batch_size, max_batch_tokens)
+    vectors = None
+    for batch in batches:
+        batch_vectors = encode_batch(batch)
+        if vectors is None:
+            vectors = np.empty((len(lengths), batch_vectors.shape[1]), dtype=np.float32)
+        vectors[batch] = batch_vectors
+    if vectors is None:
+        return np.empty((0, 0), dtype=np.float32)
+
+    padded = sum(len(batch) * max(1, int(lengths[batch[0]])) for batch in batches)
+    logger.debug(
+        f"本地 embedding 按长度分 {len(batches)} 批，有效 token 占比 {sum(lengths) / padded:.1%}"
+    )
+    return vectors
+
+
 class BGELocalEmbeddings:
     """本地 BGE embedding 封装，直接走 FlagEmbedding。"""
 
-    def __init__(self, model_name: str, device: str = ""):
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "",
+        max_batch_size: int = 64,
+        max_batch_tokens: int = 16384,
+        max_length: int = 512,
+    ):
         MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
         self.model_name = MODEL_ALIASES.get(model_name, model_name)
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.use_fp16 = self.device == "cuda"
         self.model = FlagModel(
@@ -33,17 +96,28 @@ class BGELocalEmbeddings:
             use_fp16=self.use_fp16,
         )
 
-    def _encode(self, texts: Iterable[str]) -> List[List[float]]:
-        vectors = self.model.encode(
-            list(texts),
-            batch_size=32,
-            max_length=512,
-        )
-        return [list(map(float, vector)) for vector in vectors]
+    def _encode(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        # 先只做分词拿长度（fast tokenizer，远比模型前向便宜），再按长度分批交给 FlagModel
+        encoded = self.model.tokenizer(texts, truncation=True, max_length=self.max_length)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+
+        def encode_batch(batch: np.ndarray) -> np.ndarray:
+            vectors = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                max_length=self.max_length,
+            )
+            # 直接返回 (n, dim) 的 float32 矩阵，不再逐元素转成 Python float 列表；fp16 推理结果在这里统一转回 float32
+            return np.atleast_2d(vectors).astype(np.float32, copy=False)
+
+        return encode_by_length(lengths, encode_batch, self.max_batch_size, self.max_batch_tokens)
 
     async def aembed_query(self, text: str):
         vectors = await asyncio.to_thread(self._encode, [text])
-        return vectors[0] if vectors else []
+        return vectors[0]
 
     async def aembed_documents(self, texts):
         return await asyncio.to_thread(self._encode, texts)
@@ -1,26 +1,598 @@
-from rank_bm25 import BM25Okapi
-from typing import List, Dict
+import json
+import math
+import os
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
 import jieba
+import numpy as np
+from loguru import logger
+
+from app.rag.metadata_filters import matches_metadata_filters, normalize_metadata_filters
+
+# 精确匹配的过滤字段：为它们维护倒排集合，检索时先用集合生成文档掩码，再在掩码内取 top-k
+INDEXED_FILTER_FIELDS = ("source", "title", "doc_type", "sheet_name", "section_path")
+
+
+def tokenize(text: str) -> List[str]:
+    """jieba 分词，去掉空白 token 并统一小写，保证 CPU / cpu 能互相命中。"""
+    return [token.lower() for token in jieba.cut(text or "") if token.strip()]
+
+
+class SparseBM25Matrix:
+    """CSR 形式的 term × doc 权重矩阵。
+
+    每个非零元已经乘好 idf 和文档长度归一化：
+        w(t, d) = idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+    查询打分就是查询词向量与矩阵的稀疏点积，top-k 用 argpartition，
+    不需要对全部文档排序。
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        doc_ids: np.ndarray,
+    ):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.doc_ids = doc_ids
+        self.alive = np.ones(len(doc_ids), dtype=bool)
+        self.dead_count = 0
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(
+        cls,
+        doc_ids: np.ndarray,
+        term_ids: List[np.ndarray],
+        tfs: List[np.ndarray],
+        n_terms: int,
+        k1: float,
+        b: float,
+    ) -> "SparseBM25Matrix":
+        n_docs = len(doc_ids)
+        lengths = np.fromiter((len(ids) for ids in term_ids), dtype=np.int64, count=n_docs)
+        rows = np.concatenate(term_ids) if n_docs else np.zeros(0, dtype=np.int32)
+        values = np.concatenate(tfs) if n_docs else np.zeros(0, dtype=np.float32)
+        cols = np.repeat(np.arange(n_docs, dtype=np.int32), lengths)
+
+        # 文档长度 = 词频之和；df = 每个 term 出现的文档数（同一文档内 term 不重复）
+        doc_len = np.bincount(cols, weights=values, minlength=n_docs)
+        avgdl = doc_len.mean() if n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len / avgdl) if avgdl else np.full(n_docs, k1)
+        df = np.bincount(rows, minlength=n_terms)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        weights = idf[rows] * values * (k1 + 1) / (values + norm[cols])
+
+        order = np.argsort(rows, kind="stable")
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        return cls(
+            indptr=indptr,
+            indices=cols[order],
+            data=weights[order].astype(np.float32),
+            doc_ids=doc_ids,
+        )
+
+    def kill(self, doc_id: int) -> None:
+        pos = np.searchsorted(self.doc_ids, doc_id)
+        if pos < len(self.doc_ids) and self.doc_ids[pos] == doc_id and self.alive[pos]:
+            self.alive[pos] = False
+            self.dead_count += 1
+
+    def score(self, query_terms: Dict[int, int]) -> np.ndarray:
+        n_rows = len(self.indptr) - 1
+        cols, weights = [], []
+        for term_id, qtf in query_terms.items():
+            if term_id >= n_rows:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            if start == end:
+                continue
+            cols.append(self.indices[start:end])
+            weights.append(self.data[start:end] * qtf if qtf != 1 else self.data[start:end])
+        if not cols:
+            return np.zeros(self.n_docs, dtype=np.float64)
+        scores = np.bincount(
+            np.concatenate(cols), weights=np.concatenate(weights), minlength=self.n_docs
+        )
+        if self.dead_count:
+            scores[~self.alive] = 0.0
+        return scores
+
+    def mask(self, doc_ids: Set[int]) -> np.ndarray:
+        """doc_ids 在本主段中的布尔掩码，开销与集合大小成正比。"""
+        ids = np.fromiter(doc_ids, dtype=np.int64, count=len(doc_ids))
+        pos = np.searchsorted(self.doc_ids, ids)
+        inside = pos < len(self.doc_ids)
+        pos = pos[inside]
+        pos = pos[self.doc_ids[pos] == ids[inside]]
+        mask = np.zeros(self.n_docs, dtype=bool)
+        mask[pos] = True
+        return mask
+
+    def top_k(
+        self, query_terms: Dict[int, int], k: int, mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        if k <= 0:
+            return []
+        scores = self.score(query_terms)
+        if mask is not None:
+            scores[~mask] = 0.0
+        positive = np.flatnonzero(scores > 0)
+        if len(positive) > k:
+            positive = positive[np.argpartition(-scores[positive], k - 1)[:k]]
+        return [(int(self.doc_ids[i]), float(scores[i])) for i in positive]
 
 
 class BM25Retriever:
-    def __init__(self):
-        self.bm25 = None
-        self.documents = []
-
-    def index(self, documents: List[Dict]):
-        self.documents = documents
-        tokenized = [list(jieba.cut(doc["content"]))
-                     for doc in documents]
-        self.bm25 = BM25Okapi(tokenized)
-
-    def search(self, query: str, top_k: int = 10) -> List[Dict]:
-        tokenized_query = list(jieba.cut(query))
-        scores = self.bm25.get_scores(tokenized_query)
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+    """可增量更新、可落盘的 BM25 检索器。
+
+    - 每个 chunk 只在写入时分词一次，词频随文档一起持久化，重启后无需重新分词；
+    - 打分走 SparseBM25Matrix（CSR 主段）；增量写入先进入小的 delta 段，删除只打标记，
+      变化量超过阈值后在后台线程重建主段，建好之前查询继续用旧主段 + delta，建好后再换上；
+    - 落盘采用「快照 + 追加日志」，单次写入开销与新增文档大小成正比；
+      日志体积超过快照的 compact_ratio 倍后，在后台线程把当前索引合并成新快照，不阻塞事件循环。
+    """
+
+    snapshot_name = "snapshot.json"
+    log_name = "ops.jsonl"
+
+    def __init__(
+        self,
+        index_dir: Optional[str] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        compact_ratio: float = 0.5,
+        compact_min_bytes: int = 4 << 20,
+        rebuild_min_pending: int = 1000,
+        rebuild_ratio: float = 0.1,
+    ):
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.rebuild_min_pending = rebuild_min_pending
+        self.rebuild_ratio = rebuild_ratio
+        # 落盘状态：快照对应的日志代数、当前快照 / 活动日志的字节数、后台合并任务
+        self._generation = 0
+        self._snapshot_bytes = 0
+        self._log_bytes = 0
+        self._compaction: Optional[Future] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._reset()
+        if self.index_dir is not None:
+            self._load()
+
+    def _reset(self) -> None:
+        self.documents: Dict[int, Dict] = {}
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.doc_term_ids: Dict[int, np.ndarray] = {}
+        self.doc_tfs: Dict[int, np.ndarray] = {}
+        self.doc_len: Dict[int, int] = {}
+        self.df: Counter = Counter()
+        self.source_index: Dict[str, Set[int]] = {}
+        # 字段 -> 取值（与 matches_metadata_filters 一样 strip 后比较）-> 文档 id
+        self.field_index: Dict[str, Dict[str, Set[int]]] = {field: {} for field in INDEXED_FILTER_FIELDS}
+        self.total_len = 0
+        self._next_id = 0
+        # 主段矩阵 + 尚未并入主段的增量文档（term_id -> {doc_id: tf}）
+        self._matrix: Optional[SparseBM25Matrix] = None
+        self._delta_postings: Dict[int, Dict[int, int]] = {}
+        self._delta_docs: Set[int] = set()
+        self._removed_since_build = 0
+        # 后台重建中的主段：覆盖 id < _rebuild_upto 的文档，期间删除的文档在换上时补打标记
+        self._rebuild: Optional[Future] = None
+        self._rebuild_upto = 0
+        self._removed_during_rebuild: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @staticmethod
+    def _source_of(doc: Dict) -> str:
+        return str((doc.get("metadata") or {}).get("source", ""))
+
+    @staticmethod
+    def _to_entry(doc: Dict) -> Dict:
+        return {
+            "content": doc["content"],
+            "metadata": doc.get("metadata") or {},
+            "terms": dict(Counter(tokenize(doc["content"]))),
+        }
+
+    @staticmethod
+    def _filter_values(metadata: Dict) -> Iterable[Tuple[str, str]]:
+        for field in INDEXED_FILTER_FIELDS:
+            value = str(metadata.get(field, "")).strip()
+            if value:
+                yield field, value
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.vocab[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def _apply_add(self, entries: Iterable[Dict]) -> None:
+        for entry in entries:
+            doc_id = self._next_id
+            self._next_id += 1
+            terms = entry["terms"]
+            term_ids = np.fromiter((self._term_id(t) for t in terms), dtype=np.int32, count=len(terms))
+            tfs = np.fromiter(terms.values(), dtype=np.float32, count=len(terms))
+            length = int(tfs.sum())
+
+            self.documents[doc_id] = {"content": entry["content"], "metadata": entry["metadata"]}
+            self.doc_term_ids[doc_id] = term_ids
+            self.doc_tfs[doc_id] = tfs
+            self.doc_len[doc_id] = length
+            self.total_len += length
+            self.source_index.setdefault(self._source_of(entry), set()).add(doc_id)
+            for field, value in self._filter_values(entry["metadata"]):
+                self.field_index[field].setdefault(value, set()).add(doc_id)
+
+            self._delta_docs.add(doc_id)
+            for term_id, tf in zip(term_ids.tolist(), terms.values()):
+                self.df[term_id] += 1
+                self._delta_postings.setdefault(term_id, {})[doc_id] = tf
+
+    def _apply_remove(self, source: str) -> int:
+        doc_ids = self.source_index.pop(source, set())
+        for doc_id in doc_ids:
+            term_ids = self.doc_term_ids.pop(doc_id)
+            del self.doc_tfs[doc_id]
+            for term_id in term_ids.tolist():
+                self.df[term_id] -= 1
+                if self.df[term_id] <= 0:
+                    del self.df[term_id]
+            if doc_id in self._delta_docs:
+                self._delta_docs.discard(doc_id)
+                for term_id in term_ids.tolist():
+                    postings = self._delta_postings.get(term_id)
+                    if postings is not None:
+                        postings.pop(doc_id, None)
+                        if not postings:
+                            del self._delta_postings[term_id]
+            elif self._matrix is not None:
+                self._matrix.kill(doc_id)
+                self._removed_since_build += 1
+            if self._rebuild is not None:
+                self._removed_during_rebuild.append(doc_id)
+            self.total_len -= self.doc_len.pop(doc_id)
+            for field, value in self._filter_values(self.documents[doc_id]["metadata"]):
+                ids = self.field_index[field].get(value)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self.field_index[field][value]
+            del self.documents[doc_id]
+        return len(doc_ids)
+
+    def _build_inputs(self) -> Tuple:
+        # id 单调递增、字典保持插入顺序，documents 的键天然有序；单个文档的数组写入后不再修改
+        doc_ids = np.fromiter(self.documents, dtype=np.int64, count=len(self.documents))
+        return doc_ids, dict(self.doc_term_ids), dict(self.doc_tfs), len(self.terms)
+
+    def _build_matrix(self, doc_ids: np.ndarray, doc_term_ids: Dict, doc_tfs: Dict, n_terms: int) -> SparseBM25Matrix:
+        id_list = doc_ids.tolist()
+        return SparseBM25Matrix.build(
+            doc_ids=doc_ids,
+            term_ids=[doc_term_ids[d] for d in id_list],
+            tfs=[doc_tfs[d] for d in id_list],
+            n_terms=n_terms,
+            k1=self.k1,
+            b=self.b,
+        )
+
+    def _rebuild_matrix(self) -> None:
+        """同步重建主段（加载 / 全量索引时使用，调用方本身不在事件循环上）。"""
+        self._matrix = self._build_matrix(*self._build_inputs())
+        self._delta_postings = {}
+        self._delta_docs = set()
+        self._removed_since_build = 0
+
+    def _maybe_rebuild(self) -> None:
+        if self._rebuild is not None:
+            if self._rebuild.done():
+                self._swap_matrix()
+            return
+        pending = len(self._delta_docs) + self._removed_since_build
+        if not pending:
+            return
+        base = self._matrix.n_docs if self._matrix is not None else 0
+        if pending >= max(self.rebuild_min_pending, self.rebuild_ratio * base):
+            # 在内存状态的浅拷贝上后台重建，查询路径只付拷贝字典的开销
+            self._rebuild_upto = self._next_id
+            self._removed_during_rebuild = []
+            self._rebuild = self._executor().submit(self._build_matrix, *self._build_inputs())
+
+    def _swap_matrix(self) -> None:
+        """换上后台建好的主段：补上重建期间的删除，已并入主段的文档移出 delta。"""
+        future, self._rebuild = self._rebuild, None
+        removed, self._removed_during_rebuild = self._removed_during_rebuild, []
+        try:
+            matrix = future.result()
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"BM25 主段重建失败，继续使用旧主段: {e}")
+            return
+        for doc_id in removed:
+            matrix.kill(doc_id)
+        # 只剩重建期间新增的文档留在 delta，按它们重新生成倒排，开销与这段时间的写入量成正比
+        self._delta_docs = {d for d in self._delta_docs if d >= self._rebuild_upto}
+        self._delta_postings = {}
+        for doc_id in self._delta_docs:
+            for term_id, tf in zip(self.doc_term_ids[doc_id].tolist(), self.doc_tfs[doc_id].tolist()):
+                self._delta_postings.setdefault(term_id, {})[doc_id] = tf
+        self._matrix = matrix
+        self._removed_since_build = matrix.dead_count
+
+    def index(self, documents: List[Dict]) -> None:
+        """全量重建（启动回灌 / 评测脚本使用），会覆盖已有快照。"""
+        self.drain()
+        self._reset()
+        self._apply_add(self._to_entry(doc) for doc in documents)
+        self._rebuild_matrix()
+        self._compact(background=False)
+        logger.info(f"BM25 全量索引完成，共 {len(self.documents)} 个 chunks")
+
+    def add(self, documents: List[Dict]) -> None:
+        """增量写入：只对新增 chunk 分词。"""
+        if not documents:
+            return
+        entries = [self._to_entry(doc) for doc in documents]
+        self._apply_add(entries)
+        self._append_log({"op": "add", "docs": entries})
+
+    def remove_source(self, source: str) -> int:
+        removed = self._apply_remove(source)
+        if removed:
+            self._append_log({"op": "remove", "source": source})
+        return removed
+
+    def _score_delta(self, query_terms: Dict[int, int]) -> Dict[int, float]:
+        """delta 段文档量很小，直接用当前全局统计量逐个打分。"""
+        n_docs = len(self.documents)
+        avgdl = self.total_len / n_docs if n_docs else 0.0
+        scores: Dict[int, float] = {}
+        for term_id, qtf in query_terms.items():
+            postings = self._delta_postings.get(term_id)
+            if not postings:
+                continue
+            df = self.df[term_id]
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                weight = idf * tf * (self.k1 + 1) / (tf + norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * qtf
+        return scores
+
+    def _pushdown_filters(self, filters: Dict) -> Tuple[Optional[Set[int]], Dict]:
+        """
+        精确字段用倒排集合求交得到允许的文档 id（None 表示没有这类条件），
+        其余条件作为 residual 留给逐个检查。
+        """
+        sets, residual = [], {}
+        for key, value in filters.items():
+            if key in self.field_index:
+                sets.append(self.field_index[key].get(value, set()))
+            else:
+                residual[key] = value
+        if not sets:
+            return None, residual
+        sets.sort(key=len)
+        allowed = sets[0]
+        for ids in sets[1:]:
+            allowed = allowed & ids
+        return allowed, residual
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        metadata_filters: Optional[Dict] = None,
+    ) -> List[Dict]:
+        if not self.documents:
+            return []
+
+        query_terms = Counter(
+            self.vocab[token] for token in tokenize(query) if token in self.vocab
+        )
+        if not query_terms:
+            return []
+
+        self._maybe_rebuild()
+        filters = normalize_metadata_filters(metadata_filters)
+        allowed, residual = self._pushdown_filters(filters)
+        if allowed is not None and not allowed:
+            return []
+        mask = self._matrix.mask(allowed) if self._matrix is not None and allowed is not None else None
+        delta = self._score_delta(query_terms) if self._delta_docs else {}
+        if allowed is not None:
+            delta = {doc_id: score for doc_id, score in delta.items() if doc_id in allowed}
+
+        # 精确字段已经体现在掩码里；剩下的包含匹配 / 时间范围只能逐个检查，
+        # 先取 top_k 的若干倍候选，满足条件的不够再扩大，避免先截断再过滤导致结果为空
+        limit = top_k * 4 if residual else top_k
+        while True:
+            candidates = self._matrix.top_k(query_terms, limit, mask) if self._matrix is not None else []
+            exhausted = len(candidates) < limit
+            candidates.extend(delta.items())
+            candidates.sort(key=lambda item: item[1], reverse=True)
+            if not residual:
+                top = candidates[:top_k]
+                break
+            top = [
+                (doc_id, score)
+                for doc_id, score in candidates
+                if matches_metadata_filters(self.documents[doc_id].get("metadata"), residual)
+            ][:top_k]
+            if len(top) >= top_k or exhausted:
+                break
+            limit *= 4
         return [
-            {
-                **self.documents[i], "bm25_score": scores[i], "bm25_rank": rank + 1
-            }
-            for rank, i in enumerate(top_indices)
+            {**self.documents[doc_id], "bm25_score": score, "bm25_rank": rank + 1}
+            for rank, (doc_id, score) in enumerate(top)
         ]
+
+    # ===== 持久化 =====
+
+    def _snapshot_path(self) -> Path:
+        return self.index_dir / self.snapshot_name
+
+    def _log_path(self) -> Path:
+        return self.index_dir / self.log_name
+
+    def _sealed_log_path(self, generation: int) -> Path:
+        return self.index_dir / f"ops.{generation}.jsonl"
+
+    def _sealed_logs(self) -> List[Tuple[int, Path]]:
+        """合并时封存的旧日志，按代数排序。"""
+        logs = []
+        for path in self.index_dir.glob("ops.*.jsonl"):
+            generation = path.name[len("ops."):-len(".jsonl")]
+            if generation.isdigit():
+                logs.append((int(generation), path))
+        return sorted(logs)
+
+    def _load(self) -> None:
+        snapshot_path = self._snapshot_path()
+        log_path = self._log_path()
+        if snapshot_path.exists():
+            data = json.loads(snapshot_path.read_text(encoding="utf-8"))
+            self._apply_add(data.get("docs", []))
+            self._generation = data.get("generation", 0)
+            self._snapshot_bytes = snapshot_path.stat().st_size
+        # 快照之后的封存日志（上次合并中途退出）和活动日志依次重放
+        replay = [path for generation, path in self._sealed_logs() if generation > self._generation]
+        if log_path.exists():
+            replay.append(log_path)
+        for path in replay:
+            self._replay_log(path)
+        if self.documents:
+            self._rebuild_matrix()
+        if replay:
+            self._compact(background=False)
+        logger.info(f"BM25 索引已从 {self.index_dir} 加载，共 {len(self.documents)} 个 chunks")
+
+    def _replay_log(self, path: Path) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程在写日志时被杀掉，最后一行可能不完整
+                    logger.warning("BM25 日志存在损坏行，已跳过")
+                    continue
+                self._replay(op)
+
+    def _replay(self, op: Dict) -> None:
+        if op.get("op") == "add":
+            self._apply_add(op.get("docs", []))
+        elif op.get("op") == "remove":
+            self._apply_remove(op.get("source", ""))
+
+    def _append_log(self, op: Dict) -> None:
+        if self.index_dir is None:
+            return
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(op, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self._log_path(), "ab") as f:
+            f.write(line)
+        self._log_bytes += len(line)
+        # 按日志相对快照的体积触发合并：合并开销与语料成正比，摊到与其同量级的写入上
+        if self._compaction is not None and not self._compaction.done():
+            return
+        if self._log_bytes >= max(self.compact_min_bytes, self.compact_ratio * self._snapshot_bytes):
+            self._compact()
+
+    def _compact(self, background: bool = True) -> None:
+        """
+        把当前索引合并成新快照。活动日志先改名封存（之后的写入进新日志），在内存状态的浅拷贝上
+        写出新快照并原子替换，再删掉已并入快照的封存日志；background=True 时写文件在后台线程完成。
+        """
+        if self.index_dir is None:
+            return
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self._generation += 1
+        generation = self._generation
+        log_path = self._log_path()
+        if log_path.exists():
+            os.replace(log_path, self._sealed_log_path(generation))
+        self._log_bytes = 0
+        # 单个文档的词表数组写入后不再修改，拷贝字典本身即可得到一致的视图
+        state = (dict(self.documents), dict(self.doc_term_ids), dict(self.doc_tfs), self.terms)
+        if not background:
+            self._write_snapshot(state, generation)
+            return
+        self._compaction = self._executor().submit(self._write_snapshot, state, generation)
+        self._compaction.add_done_callback(self._log_background_error)
+
+    def _write_snapshot(self, state: Tuple, generation: int) -> None:
+        documents, doc_term_ids, doc_tfs, terms = state
+        snapshot_path = self._snapshot_path()
+        tmp_path = snapshot_path.with_suffix(".tmp")
+        # 逐个文档序列化写出：不在内存里拼整份 JSON，后台线程也能频繁让出 GIL
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f'{{"generation": {generation}, "docs": [')
+            for i, doc_id in enumerate(sorted(documents)):
+                term_ids = doc_term_ids[doc_id].tolist()
+                tfs = doc_tfs[doc_id].tolist()
+                entry = {
+                    **documents[doc_id],
+                    "terms": {terms[t]: int(tf) for t, tf in zip(term_ids, tfs)},
+                }
+                if i:
+                    f.write(",")
+                f.write(json.dumps(entry, ensure_ascii=False))
+            f.write("]}")
+        os.replace(tmp_path, snapshot_path)
+        self._snapshot_bytes = snapshot_path.stat().st_size
+        for sealed_generation, path in self._sealed_logs():
+            if sealed_generation <= generation:
+                path.unlink(missing_ok=True)
+
+    # ===== 后台任务 =====
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            # 快照合并与主段重建各自最多一个在途，互不排队
+            self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bm25")
+        return self._pool
+
+    @staticmethod
+    def _log_background_error(future: Future) -> None:
+        error = future.exception()
+        if error is not None:
+            logger.error(f"BM25 后台任务失败: {error}")
+
+    def drain(self) -> None:
+        """等待后台的快照合并和主段重建完成并换上新主段（全量重建前、关闭时、测试中调用）。"""
+        if self._compaction is not None:
+            self._compaction.exception()
+            self._compaction = None
+        if self._rebuild is not None:
+            self._rebuild.exception()
+            self._swap_matrix()
+
+    def close(self) -> None:
+        self.drain()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -1,9 +1,11 @@
 # 文档切分模块
 # TODO: 任务 11.1 - 实现 DocumentChunker 类
 from typing import List, Dict,Optional
+import re
 from langchain_text_splitters import RecursiveCharacterTextSplitter,MarkdownHeaderTextSplitter
 from loguru import logger
 from enum import Enum
+from app.rag.tokenization import get_token_counter
 class ChunkStrategy(Enum):
     """分块策略枚举"""
     RECURSIVE = "recursive"      # 通用文本
@@ -13,15 +15,43 @@ class ChunkStrategy(Enum):
     HTML = "html"                # HTML 网页
     CSV = "csv"                  # CSV 表格
     JSON = "json"                # JSON 数据
+# TableProcessor 输出的行描述 "记录N: ..."（超长行拆段后为 "记录N(续): ..."）和分组行区间 "第s-e条记录"
+_TABLE_ROW_RE = re.compile(r"^记录(\d+)(?:\(续\))?[:：]")
+_TABLE_RANGE_RE = re.compile(r"^第\d+-\d+条记录$")
+
+
 class DocumentChunker:
-    def __init__(self, strategy:ChunkStrategy,max_size: int = 800, overlap: int = 100):
+    def __init__(
+        self,
+        strategy:ChunkStrategy,
+        max_size: int = 800,
+        overlap: int = 100,
+        table_rows: int = 20,
+        max_tokens: int = 0,
+        tokenizer: str = "approx",
+    ):
         self.strategy=strategy
         self.max_size = max_size
         self.overlap = overlap
+        # 表格策略每个 chunk 的行数上限（同时受大小上限约束）
+        self.table_rows = max(1, table_rows)
+        # max_tokens > 0 时按 token 预算切分，overlap 按 max_size 的同等比例换算成 token
+        self.max_tokens = max_tokens
+        self.count_tokens = get_token_counter(tokenizer)
         self.splitter = self._create_splitter()
-        
+
+    @property
+    def size_limit(self) -> int:
+        return self.max_tokens if self.max_tokens > 0 else self.max_size
+
+    def measure(self, text: str) -> int:
+        """切分时的长度度量：token 模式下为 token 数，否则为字符数"""
+        return self.count_tokens(text) if self.max_tokens > 0 else len(text)
+
     def _create_splitter(self):
         if self.strategy==ChunkStrategy.MARKDOWN:
+            # token 模式下超长的 markdown 小节再按 token 预算细分
+            self.section_splitter = self._create_recursive_splitter() if self.max_tokens > 0 else None
             return MarkdownHeaderTextSplitter(
                 headers_to_split_on=[
                     ("#","header1"),
@@ -30,7 +60,18 @@ class DocumentChunker:
                 ]
             )
         else:
+            return self._create_recursive_splitter()
+
+    def _create_recursive_splitter(self) -> RecursiveCharacterTextSplitter:
+        if self.max_tokens > 0:
+            overlap = int(self.overlap * self.max_tokens / self.max_size) if self.max_size else 0
             return RecursiveCharacterTextSplitter(
+                chunk_size=self.max_tokens,
+                chunk_overlap=min(overlap, self.max_tokens // 2),
+                length_function=self.count_tokens,
+                separators=["\n\n", "\n", "。", "！", "？", " ", ""]
+            )
+        return RecursiveCharacterTextSplitter(
             chunk_size=self.max_size,
             chunk_overlap=self.overlap,
             separators=["\n\n", "\n", "。", "！", "？", " ", ""]
@@ -40,13 +81,34 @@ class DocumentChunker:
         if text is None or not text.strip():
             logger.warning(f"切分的{source}文本为空")
             return []
+        chunks = self._split(text, source)
+        # 记录每个 chunk 的 token 数，用于 token 分布统计和 embedding 按长度组批
+        for chunk in chunks:
+            chunk["metadata"]["token_count"] = self.count_tokens(chunk["content"])
+        return chunks
+
+    def _split(self, text: str, source: str) -> List[Dict]:
         if self.strategy==ChunkStrategy.MARKDOWN:
             
             md_chunks=self.splitter.split_text(text)
+            if self.section_splitter is not None:
+                md_chunks=[
+                    (piece, chunk.metadata)
+                    for chunk in md_chunks
+                    for piece in (
+                        [chunk.page_content]
+                        if self.measure(chunk.page_content) <= self.max_tokens
+                        else self.section_splitter.split_text(chunk.page_content)
+                    )
+                ]
+            else:
+                md_chunks=[(chunk.page_content, chunk.metadata) for chunk in md_chunks]
             return[
-                {"content":chunk.page_content,"metadata":{"source":source,"chunk_index":i,"total_chunks":len(md_chunks),"strategy":"markdown",**chunk.metadata}}
-                for i,chunk in enumerate(md_chunks)
+                {"content":content,"metadata":{"source":source,"chunk_index":i,"total_chunks":len(md_chunks),"strategy":"markdown",**metadata}}
+                for i,(content,metadata) in enumerate(md_chunks)
             ]
+        elif self.strategy==ChunkStrategy.CSV:
+            return self._chunk_table(text, source)
         else:
             response = self.splitter.split_text(text)
             chunks = []
@@ -59,6 +121,89 @@ class DocumentChunker:
                 )
             logger.info(f"文档 {source} 切分完成: {len(chunks)} 个 chunks")
             return chunks
+
+    def _chunk_table(self, text: str, source: str) -> List[Dict]:
+        """
+        表格切分：按行分组，每组最多 table_rows 行且不超过大小上限（max_size 或 max_tokens），
+        每个 chunk 都重放表名和列头，metadata 记录 row_start/row_end。
+        不含行描述的文本（统计摘要、空表格等）不超限时整块保留，过长时退回递归切分。
+        """
+        lines = text.split("\n")
+        first_row = next((i for i, line in enumerate(lines) if _TABLE_ROW_RE.match(line)), None)
+        if first_row is None:
+            pieces = [text] if self.measure(text) <= self.size_limit else self.splitter.split_text(text)
+            return [
+                {
+                    "content": piece,
+                    "metadata": {"source": source, "chunk_index": i, "total_chunks": len(pieces), "strategy": "table"},
+                }
+                for i, piece in enumerate(pieces)
+            ]
+
+        header = [line for line in lines[:first_row] if line.strip() and not _TABLE_RANGE_RE.match(line)]
+        header_size = sum(self.measure(line) + 1 for line in header)
+        row_lines = [line for line in lines[first_row:] if _TABLE_ROW_RE.match(line)]
+        tail = "\n".join(line for line in lines[first_row:] if not _TABLE_ROW_RE.match(line)).strip()
+
+        # 单行超过预算时按预算拆成多段，每段单独成块（表头 + 区间行 + 行号前缀另占一些预算）
+        row_budget = max(self.size_limit - header_size - self.measure("第0000-0000条记录") - 2, self.size_limit // 4, 1)
+        groups: List[List[str]] = []
+        current: List[str] = []
+        size = header_size
+        for line in row_lines:
+            line_size = self.measure(line) + 1
+            if line_size > row_budget:
+                if current:
+                    groups.append(current)
+                    current, size = [], header_size
+                groups.extend([part] for part in self._split_table_row(line, row_budget))
+                continue
+            if current and (len(current) >= self.table_rows or size + line_size > self.size_limit):
+                groups.append(current)
+                current, size = [], header_size
+            current.append(line)
+            size += line_size
+        if current:
+            groups.append(current)
+
+        pieces = []
+        for group in groups:
+            row_start = int(_TABLE_ROW_RE.match(group[0]).group(1))
+            row_end = int(_TABLE_ROW_RE.match(group[-1]).group(1))
+            content = "\n".join(header + [f"第{row_start}-{row_end}条记录", ""] + group)
+            pieces.append((content, {"row_start": row_start, "row_end": row_end}))
+        # 旧格式里跟在行后面的统计摘要单独成块
+        if tail:
+            pieces.append(("\n".join(header + ["", tail]), {}))
+
+        chunks = [
+            {
+                "content": content,
+                "metadata": {
+                    "source": source,
+                    "chunk_index": i,
+                    "total_chunks": len(pieces),
+                    "strategy": "table",
+                    **row_range,
+                },
+            }
+            for i, (content, row_range) in enumerate(pieces)
+        ]
+        logger.info(f"文档 {source} 表格切分完成: {len(chunks)} 个 chunks")
+        return chunks
+
+    def _split_table_row(self, line: str, budget: int) -> List[str]:
+        """把一行超长记录按预算拆段，后续段加 "记录N(续):" 前缀，仍能按行号归属到原行。"""
+        row_num = _TABLE_ROW_RE.match(line).group(1)
+        prefix = f"记录{row_num}(续): "
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=max(budget - self.measure(prefix), 1),
+            chunk_overlap=0,
+            length_function=self.measure,
+            separators=[",", "，", "。", " ", ""],
+        )
+        parts = splitter.split_text(line)
+        return [parts[0]] + [prefix + part.lstrip(",，") for part in parts[1:]]
 def get_strategy_by_filename(filename: str) -> ChunkStrategy:
     """根据文件名自动选择分块策略"""
     ext = filename.lower().split('.')[-1]
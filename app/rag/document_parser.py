@@ -0,0 +1,293 @@
+# 文档解析：加载 + 切分 + 合并 metadata
+# PDF/DOCX/XLSX 解析是纯 CPU 工作，放线程里仍然受 GIL 限制，会拖慢同进程的对话请求；
+# DocumentParsePool 把解析放到独立进程里执行，带单文件超时，大 PDF 按页段拆给多个进程并行解析。
+# 本模块会在子进程里被导入，只依赖加载/切分相关的轻量模块，不要引入 Milvus / 模型相关依赖。
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from loguru import logger
+
+from app.rag.chunking import ChunkStrategy, DocumentChunker, get_strategy_by_filename
+from app.rag.load import DocumentLoader
+from app.rag.metadata_filters import (
+    build_base_metadata,
+    compute_content_hash,
+    merge_chunk_metadata,
+)
+
+
+def iter_chunk_records(
+    chunker: DocumentChunker,
+    records: Iterable[Dict],
+    filename: str,
+    title: str = "",
+    file_hash: Optional[str] = None,
+) -> Iterator[Dict]:
+    """逐条切分 records 并合并 metadata，records 可以是流式加载的生成器。"""
+    base_metadata = build_base_metadata(filename, title=title or None, file_hash=file_hash)
+    record_count = 0
+    chunk_count = 0
+    for record in records:
+        record_count += 1
+        text = record.get("content", "")
+        if not text or not str(text).strip():
+            continue
+
+        extra_metadata = record.get("metadata") or {}
+        for chunk in chunker.chunk_text(str(text), filename):
+            chunk_metadata = merge_chunk_metadata(
+                base_metadata=base_metadata,
+                extra_metadata=extra_metadata,
+                chunk_metadata=chunk.get("metadata") or {},
+            )
+            # 每个 chunk 带上内容 hash，重新上传时据此做增量 diff
+            chunk_metadata["content_hash"] = compute_content_hash(chunk["content"])
+            chunk_count += 1
+            yield {
+                "content": chunk["content"],
+                "metadata": chunk_metadata,
+            }
+
+    if not record_count:
+        logger.warning(f"文件{filename}为空")
+    elif not chunk_count:
+        logger.warning(f"文件{filename}切分后无内容")
+
+
+def chunk_records(
+    chunker: DocumentChunker,
+    records: Iterable[Dict],
+    filename: str,
+    title: str = "",
+    file_hash: Optional[str] = None,
+) -> List[Dict]:
+    """切分加载好的 records 并合并 metadata。"""
+    return list(iter_chunk_records(chunker, records, filename, title, file_hash=file_hash))
+
+
+def iter_document_chunks(
+    chunker: DocumentChunker,
+    file_path: str,
+    filename: str,
+    title: str = "",
+    file_hash: Optional[str] = None,
+) -> Iterator[Dict]:
+    """流式加载 + 切分：调用方按批消费，内存占用只和批大小有关，与文件大小无关。"""
+    if chunker.strategy == ChunkStrategy.CSV:
+        # 表格直接按 chunker 的行数分组产出 record，行分组来自结构化的行，切分时只需再按大小细分
+        records = DocumentLoader.iter_records(file_path, rows_per_record=chunker.table_rows)
+    else:
+        records = DocumentLoader.iter_records(file_path)
+    return iter_chunk_records(chunker, records, filename, title, file_hash=file_hash)
+
+
+class DeadlineChunkStream:
+    """
+    流式解析的时限：包住 iter_document_chunks，只累计花在加载 / 切分上的时间（不含下游 embedding / 写入），
+    超过 timeout 抛 TimeoutError。iter_batches 按 remaining() 给每次取批设上限，解析卡死时也能按时放弃。
+    """
+
+    def __init__(self, chunks: Iterable[Dict], timeout: float, filename: str = ""):
+        self._iterator = iter(chunks)
+        self.timeout = timeout
+        self.filename = filename
+        self.spent = 0.0
+
+    def __iter__(self) -> "DeadlineChunkStream":
+        return self
+
+    def __next__(self) -> Dict:
+        if self.spent > self.timeout:
+            raise TimeoutError(f"解析超时（>{self.timeout}s）")
+        started = time.monotonic()
+        try:
+            return next(self._iterator)
+        finally:
+            self.spent += time.monotonic() - started
+
+    def remaining(self) -> float:
+        return max(self.timeout - self.spent, 0.0)
+
+    def close(self) -> None:
+        close = getattr(self._iterator, "close", None)
+        if close is None:
+            return
+        try:
+            close()
+        except ValueError:
+            # 超时放弃时取批线程可能还卡在生成器里，无法关闭，只能等它自己结束
+            logger.warning(f"流式解析仍在进行，无法立即关闭: {self.filename}")
+
+
+def build_document_chunks(
+    chunker: DocumentChunker,
+    file_path: str,
+    filename: str,
+    title: str = "",
+    file_hash: Optional[str] = None,
+) -> List[Dict]:
+    """加载 + 切分 + 合并 metadata，纯同步 CPU 工作，调用方可放到线程/进程里执行。"""
+    return list(iter_document_chunks(chunker, file_path, filename, title, file_hash=file_hash))
+
+
+def chunker_options(settings) -> Dict:
+    """从配置取 DocumentChunker 的构造参数，上传链路和批量导入脚本共用，保证切分行为一致。"""
+    return {
+        "max_size": settings.doc_chunk_max_size,
+        "overlap": settings.doc_chunk_overlap,
+        "table_rows": settings.doc_table_rows_per_chunk,
+        "max_tokens": settings.doc_chunk_max_tokens,
+        "tokenizer": settings.doc_chunk_tokenizer,
+    }
+
+
+# ---- 以下函数在子进程中执行，必须是模块级函数（spawn 模式下按名字 pickle） ----
+
+def _new_chunker(filename: str, chunker_options: Dict) -> DocumentChunker:
+    return DocumentChunker(strategy=get_strategy_by_filename(filename), **chunker_options)
+
+
+def _build_chunks_task(
+    file_path: str,
+    filename: str,
+    title: str,
+    file_hash: Optional[str],
+    chunker_options: Dict,
+) -> List[Dict]:
+    chunker = _new_chunker(filename, chunker_options)
+    return build_document_chunks(chunker, file_path, filename, title, file_hash=file_hash)
+
+
+def _load_pdf_records_task(file_path: str, start: int, end: int) -> List[Dict]:
+    return list(DocumentLoader.iter_pdf_records(file_path, start, end))
+
+
+def _chunk_records_task(
+    records: List[Dict],
+    filename: str,
+    title: str,
+    file_hash: Optional[str],
+    chunker_options: Dict,
+) -> List[Dict]:
+    chunker = _new_chunker(filename, chunker_options)
+    return chunk_records(chunker, records, filename, title, file_hash=file_hash)
+
+
+class DocumentParsePool:
+    """文档解析进程池，首次使用时创建。"""
+
+    def __init__(
+        self,
+        max_workers: int = 0,
+        timeout: float = 300.0,
+        pdf_parallel_min_pages: int = 32,
+        pdf_pages_per_task: int = 16,
+    ):
+        # 0 表示 CPU 核数 - 1，给事件循环所在进程留一个核
+        self.max_workers = max_workers if max_workers > 0 else max(1, (os.cpu_count() or 2) - 1)
+        self.timeout = timeout
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+        self.pdf_pages_per_task = max(1, pdf_pages_per_task)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 主进程里有 Milvus I/O 线程池和事件循环线程，fork 可能继承到被持有的锁，统一用 spawn
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"文档解析进程池已启动：{self.max_workers} 个进程")
+        return self._executor
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        """终止并丢弃进程池；只处理出问题的那个实例，别的协程已经重建的新池不受影响。"""
+        if self._executor is executor:
+            self._executor = None
+        # ProcessPoolExecutor 不能取消已在运行的任务，超时的解析只能直接终止工作进程
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def build_chunks(
+        self,
+        file_path: str,
+        filename: str,
+        title: str = "",
+        file_hash: Optional[str] = None,
+        chunker_options: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """
+        在子进程中加载并切分文档，超时抛 TimeoutError。
+
+        Args:
+            chunker_options: DocumentChunker 的构造参数（max_size / overlap / table_rows / max_tokens / tokenizer）
+        """
+        args = (file_path, filename, title, file_hash, chunker_options or {})
+        try:
+            return await self._build_chunks_once(*args)
+        except BrokenProcessPool:
+            # 其它文件超时/崩溃导致进程池被终止时，本文件会跟着失败，重建后重试一次
+            logger.warning(f"解析进程池已失效，重建后重试: {filename}")
+            return await self._build_chunks_once(*args)
+
+    async def _build_chunks_once(self, file_path: str, filename: str, *args) -> List[Dict]:
+        executor = self._ensure_executor()
+        try:
+            return await asyncio.wait_for(
+                self._parse(executor, file_path, filename, *args),
+                timeout=self.timeout if self.timeout > 0 else None,
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"文档解析超时（>{self.timeout}s），终止解析进程: {filename}")
+            self._discard(executor)
+            raise TimeoutError(f"解析超时（>{self.timeout}s）") from None
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+
+    async def _parse(
+        self,
+        executor: ProcessPoolExecutor,
+        file_path: str,
+        filename: str,
+        title: str,
+        file_hash: Optional[str],
+        chunker_options: Dict,
+    ) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+        if file_path.lower().endswith(".pdf"):
+            page_count = await loop.run_in_executor(executor, DocumentLoader.pdf_page_count, file_path)
+            if page_count >= self.pdf_parallel_min_pages:
+                step = self.pdf_pages_per_task
+                page_records = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(
+                            executor, _load_pdf_records_task, file_path, start, start + step
+                        )
+                        for start in range(0, page_count, step)
+                    )
+                )
+                logger.info(
+                    f"PDF {filename} 共 {page_count} 页，拆成 {len(page_records)} 段并行解析"
+                )
+                # 按页产出的 record 与单进程流式加载一致，切分结果不受并行影响
+                records = [record for part in page_records for record in part]
+                return await loop.run_in_executor(
+                    executor, _chunk_records_task,
+                    records, filename, title, file_hash, chunker_options,
+                )
+        return await loop.run_in_executor(
+            executor, _build_chunks_task,
+            file_path, filename, title, file_hash, chunker_options,
+        )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,78 @@
+# 查询 embedding 微批合并模块
+# 并发 /api/chat 请求各自调用 embed_text，会产生一次次 batch=1 的远程调用 / 模型前向。
+# 这里把几毫秒内到达的查询攒成一批，一次 embed_queries 调用后再把向量分发回各个调用方。
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from loguru import logger
+
+
+class QueryEmbeddingBatcher:
+    """对 EmbeddingService 的透明包装：只合并查询向量化，文档向量化直接透传。"""
+
+    def __init__(self, inner, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.inner = inner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = set()
+        self.batches = 0
+        self.requests = 0
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    async def embed_text(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    async def embed_texts(self, texts: List[str]) -> np.ndarray:
+        return await self.inner.embed_texts(texts)
+
+    async def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return await self.inner.embed_queries(texts)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # 同一批里的重复查询只算一次
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        try:
+            vectors = await self.inner.embed_queries(texts)
+        except Exception as e:  # noqa: BLE001
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # 按行分发，每个调用方拿到的是批结果矩阵的一行视图，不复制
+        by_text: Dict[str, np.ndarray] = dict(zip(texts, vectors))
+        for text, future in batch:
+            # 调用方可能已经取消等待
+            if not future.done():
+                future.set_result(by_text[text])
+        logger.debug(
+            f"查询向量微批完成: 本批 {len(batch)} 个请求 / {len(texts)} 条去重文本，"
+            f"平均批大小 {self.requests / self.batches:.2f}"
+        )
@@ -0,0 +1,168 @@
+# Embedding 缓存模块
+# 两级缓存：进程内有界 LRU + SQLite 持久层，key = (provider, model, kind, sha256(text))。
+# 同一段文本重复上传、QueryRewriter 扩展出的重复查询都不再重复调用 DashScope / BGE。
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+
+class EmbeddingCache:
+    """两级 embedding 缓存，向量以 float32 字节存储，内存层直接保存 float32 数组。"""
+
+    def __init__(self, path: Optional[str] = None, max_items: int = 10000):
+        self.max_items = max_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(namespace: str, kind: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{namespace}|{kind}|{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                # 分段查询，避免超过 SQLite 单条语句的变量上限
+                for start in range(0, len(missing), 500):
+                    part = missing[start:start + 500]
+                    placeholders = ",".join("?" * len(part))
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                        part,
+                    ).fetchall()
+                    for key, blob in rows:
+                        # 直接引用 BLOB 的字节，不再转 Python 列表
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self._remember(key, vector)
+                    self.disk_hits += len(rows)
+
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        items = {key: np.asarray(vector, dtype=np.float32) for key, vector in items.items()}
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in items.items()],
+                )
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class CachedEmbeddingService:
+    """对 EmbeddingService 的透明包装，接口保持 embed_text / embed_texts 不变。"""
+
+    def __init__(self, inner, cache: EmbeddingCache, namespace: str):
+        self.inner = inner
+        self.cache = cache
+        self.namespace = namespace
+
+    def __getattr__(self, name):
+        # 其余属性（如 embeddings）直接透传给被包装的服务
+        return getattr(self.inner, name)
+
+    async def embed_text(self, text: str) -> np.ndarray:
+        key = self.cache.make_key(self.namespace, "query", text)
+        found = await asyncio.to_thread(self.cache.get_many, [key])
+        if key in found:
+            return found[key]
+
+        vector = np.asarray(await self.inner.embed_text(text), dtype=np.float32)
+        await asyncio.to_thread(self.cache.put_many, {key: vector})
+        return vector
+
+    async def _embed_cached(self, kind: str, texts: List[str], compute) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        keys = [self.cache.make_key(self.namespace, kind, text) for text in texts]
+        found = await asyncio.to_thread(self.cache.get_many, list(dict.fromkeys(keys)))
+
+        # 同一批里重复的文本也只算一次
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+
+        if pending:
+            vectors = await compute(list(pending.values()))
+            computed = {
+                key: np.asarray(vector, dtype=np.float32) for key, vector in zip(pending.keys(), vectors)
+            }
+            await asyncio.to_thread(self.cache.put_many, computed)
+            found.update(computed)
+
+        stats = self.cache.stats()
+        logger.info(
+            f"embedding 缓存({kind}): 本批 {len(texts)} 条，新计算 {len(pending)} 条，"
+            f"累计命中率 {stats['hit_rate']:.2%}（内存 {stats['memory_hits']} / "
+            f"磁盘 {stats['disk_hits']} / 未命中 {stats['misses']}）"
+        )
+        # 命中与新算的向量拼成一个连续的 (n, dim) 矩阵，Milvus 写入时按行直接取用
+        return np.stack([found[key] for key in keys])
+
+    async def embed_texts(self, texts: List[str]) -> np.ndarray:
+        return await self._embed_cached("document", texts, self.inner.embed_texts)
+
+    async def embed_queries(self, texts: List[str]) -> np.ndarray:
+        return await self._embed_cached("query", texts, self.inner.embed_queries)
@@ -1,29 +1,109 @@
 # 向量化服务模块
 # TODO: 任务 11.3 - 实现 EmbeddingService 类
-from typing import List
+import asyncio
+from typing import Awaitable, Callable, List, Sequence
+import numpy as np
 from langchain_community.embeddings import DashScopeEmbeddings
+from langchain_community.embeddings.dashscope import embed_with_retry
 from app.core.settings import Settings
 from app.rag.bge_embeddings import BGELocalEmbeddings
+from app.rag.onnx_embeddings import ONNXLocalEmbeddings
 from loguru import logger
 
+# 本地推理的 provider：没有远程请求条数上限
+LOCAL_PROVIDERS = ("bge", "onnx")
+
+
+def as_float32_matrix(vectors) -> np.ndarray:
+    """
+    统一成 C 连续的 float32 二维数组 (n, dim)。已经是 float32 数组时不复制；
+    DashScope 返回的 JSON 列表只在这里转换一次，之后一路以数组传到 Milvus / 缓存。
+    """
+    if isinstance(vectors, np.ndarray) and vectors.ndim == 2:
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+    if len(vectors) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(np.stack([np.asarray(v, dtype=np.float32) for v in vectors]))
+
+
+async def embed_in_batches(
+    embed_batch: Callable[[List[str]], Awaitable[Sequence]],
+    texts: List[str],
+    batch_size: int,
+    concurrency: int = 4,
+    max_retries: int = 2,
+    retry_delay: float = 0.5,
+) -> np.ndarray:
+    """
+    按 provider 单次请求上限分批向量化：最多 concurrency 批同时在途，
+    某一批失败只重试这一批（指数退避），不会把整篇文档重新发一遍。结果按输入顺序返回。
+    """
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), max(1, batch_size))]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, batch: List[str]) -> np.ndarray:
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                try:
+                    vectors = as_float32_matrix(await embed_batch(batch))
+                    if len(vectors) != len(batch):
+                        raise ValueError(f"返回向量数 {len(vectors)} 与输入 {len(batch)} 不一致")
+                    return vectors
+                except Exception as e:  # noqa: BLE001
+                    if attempt >= max_retries:
+                        raise
+                    logger.warning(
+                        f"第 {index + 1}/{len(batches)} 批向量化失败，{retry_delay * 2 ** attempt:.1f}s 后重试: {e}"
+                    )
+                    await asyncio.sleep(retry_delay * 2 ** attempt)
+
+    tasks = [asyncio.create_task(run(i, batch)) for i, batch in enumerate(batches)]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    if not results:
+        return as_float32_matrix([])
+    return np.concatenate(results)
+
 
 class EmbeddingService:
     def __init__(self, settings: Settings):
-        # 默认行为不变；只有显式配置 EMBEDDING_PROVIDER=bge 时才走本地模型。
+        # 默认行为不变；只有显式配置 EMBEDDING_PROVIDER=bge / onnx 时才走本地模型。
         if settings.embedding_provider == "bge":
             self.embeddings = BGELocalEmbeddings(
                 model_name=settings.embedding_model,
                 device=settings.embedding_device,
+                max_batch_size=settings.embedding_local_max_batch_size,
+                max_batch_tokens=settings.embedding_local_max_batch_tokens,
+            )
+        elif settings.embedding_provider == "onnx":
+            self.embeddings = ONNXLocalEmbeddings(
+                model_name=settings.embedding_model,
+                onnx_dir=settings.embedding_onnx_dir,
+                quantize=settings.embedding_onnx_quantize,
+                threads=settings.embedding_onnx_threads,
+                max_batch_size=settings.embedding_local_max_batch_size,
+                max_batch_tokens=settings.embedding_local_max_batch_tokens,
             )
         else:
             self.embeddings = DashScopeEmbeddings(
                 model=settings.embedding_model,  # "text-embedding-v4"
                 dashscope_api_key=settings.dashscope_api_key
             )
+        # 远程 provider 有单次请求条数上限，文档向量化按批并发发送；
+        # 本地模型没有请求上限，整批交给模型内部按 batch_size 编码（batch_size 为 0 表示不拆分）
+        self.doc_batch_size = (
+            0 if settings.embedding_provider in LOCAL_PROVIDERS else settings.embedding_doc_batch_size
+        )
+        self.concurrency = settings.embedding_concurrency
+        self.max_retries = settings.embedding_max_retries
 
-    async def embed_text(self, text: str) -> List[float]:
+    async def embed_text(self, text: str) -> np.ndarray:
         try:
-            result = await self.embeddings.aembed_query(text)
+            result = np.asarray(await self.embeddings.aembed_query(text), dtype=np.float32)
             logger.info(f"向量化单个文本成功，文本长度: {len(text)}, 向量维度: {len(result)}")
 
             return result
@@ -31,11 +111,44 @@ class EmbeddingService:
             logger.error(f"向量化文本失败: {str(e)}")
             raise Exception(f"向量化失败: {str(e)}")
 
-    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+    async def embed_texts(self, texts: List[str]) -> np.ndarray:
         try:
-            result = await self.embeddings.aembed_documents(texts)
-            logger.info(f"批量向量化成功，文本数量: {len(texts)}, 向量维度: {len(result[0]) if result else 0}")
+            if self.doc_batch_size:
+                result = await embed_in_batches(
+                    self.embeddings.aembed_documents,
+                    texts,
+                    batch_size=self.doc_batch_size,
+                    concurrency=self.concurrency,
+                    max_retries=self.max_retries,
+                )
+            else:
+                result = as_float32_matrix(await self.embeddings.aembed_documents(texts))
+            logger.info(f"批量向量化成功，文本数量: {len(texts)}, 向量维度: {result.shape[1]}")
             return result
         except Exception as e:
             logger.error(f"批量向量化失败: {str(e)}")
             raise Exception(f"批量向量化失败: {str(e)}")
+
+    async def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """批量向量化查询文本。
+
+        DashScope 的 aembed_documents 使用 text_type=document，查询需要走 text_type=query，
+        所以这里直接调用底层批量接口；本地 BGE 查询和文档编码方式一致。
+        """
+        try:
+            if isinstance(self.embeddings, DashScopeEmbeddings):
+                items = await asyncio.to_thread(
+                    embed_with_retry,
+                    self.embeddings,
+                    input=texts,
+                    text_type="query",
+                    model=self.embeddings.model,
+                )
+                result = as_float32_matrix([item["embedding"] for item in items])
+            else:
+                result = as_float32_matrix(await self.embeddings.aembed_documents(texts))
+            logger.info(f"批量向量化查询成功，查询数量: {len(texts)}")
+            return result
+        except Exception as e:
+            logger.error(f"批量向量化查询失败: {str(e)}")
+            raise Exception(f"批量向量化查询失败: {str(e)}")
@@ -0,0 +1,26 @@
+# 检索结果融合
+# RRF（Reciprocal Rank Fusion）：只看名次不看分数，dense / BM25 / 多路改写查询的结果都能直接合并。
+from typing import Dict, List, Optional, Sequence
+
+
+def doc_key(doc: Dict) -> str:
+    """同一个 chunk 在不同结果列表里的身份，沿用内容前 100 字作为 key。"""
+    return (doc.get("content") or "")[:100]
+
+
+def rrf_fuse(
+    result_lists: Sequence[List[Dict]],
+    top_k: Optional[int] = None,
+    k: int = 60,
+) -> List[Dict]:
+    """按 RRF 融合多路排序结果，分数相同时保留先出现的列表中的顺序。"""
+    scores: Dict[str, Dict] = {}
+    for docs in result_lists:
+        for rank, doc in enumerate(docs):
+            key = doc_key(doc)
+            entry = scores.setdefault(key, {"doc": doc, "score": 0.0})
+            entry["score"] += 1 / (k + rank + 1)
+    fused = sorted(scores.values(), key=lambda x: x["score"], reverse=True)
+    if top_k is not None:
+        fused = fused[:top_k]
+    return [entry["doc"] for entry in fused]
@@ -1,8 +1,12 @@
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional
 from loguru import logger
 import json
 import csv
 from app.rag.table_processor import TableProcessor
+
+# 流式加载时表格每条 record 的行数和 txt 每块的字符数
+TABLE_ROWS_PER_RECORD = 100
+TEXT_BLOCK_CHARS = 64 * 1024
 class DocumentLoader:
     """多格式文档加载器"""
     @staticmethod
@@ -27,24 +31,80 @@ class DocumentLoader:
 
     @staticmethod
     def load_records(file_path: str) -> List[Dict]:
+        return list(DocumentLoader.iter_records(file_path))
+
+    @staticmethod
+    def iter_records(
+        file_path: str,
+        rows_per_record: int = TABLE_ROWS_PER_RECORD,
+        text_block_chars: int = TEXT_BLOCK_CHARS,
+    ) -> Iterator[Dict]:
+        """
+        流式加载：按页 / 行块 / sheet / 段落块逐条产出 record，不把整个文件拼成一个大字符串。
+
+        PDF 每页一条（metadata 带 page），CSV / Excel 每 rows_per_record 行一条（带 row_start/row_end，
+        Excel 另带 sheet_name，每张表末尾一条统计摘要），txt 按空行边界攒到 text_block_chars 左右一条；
+        其余格式（md/docx/html/json）需要整体结构，仍整篇作为一条。
+        """
         ext = file_path.lower().split('.')[-1]
         if ext in {"xlsx", "xls"}:
-            return DocumentLoader.load_excel_records(file_path)
-        return [{"content": DocumentLoader.load(file_path), "metadata": {}}]
+            yield from DocumentLoader.iter_excel_records(file_path, rows_per_record)
+        elif ext == "pdf":
+            yield from DocumentLoader.iter_pdf_records(file_path)
+        elif ext == "csv":
+            yield from DocumentLoader.iter_csv_records(file_path, rows_per_record)
+        elif ext == "txt":
+            yield from DocumentLoader.iter_text_records(file_path, text_block_chars)
+        else:
+            yield {"content": DocumentLoader.load(file_path), "metadata": {}}
+
+    @staticmethod
+    def iter_pdf_records(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict]:
+        from pypdf import PdfReader
+        reader = PdfReader(file_path)
+        end = len(reader.pages) if end is None else min(end, len(reader.pages))
+        for i in range(start, end):
+            text = reader.pages[i].extract_text()
+            if text:
+                yield {"content": f"[第{i+1}页]\n{text}", "metadata": {"page": i + 1}}
+
+    @staticmethod
+    def iter_csv_records(file_path: str, rows_per_record: int = TABLE_ROWS_PER_RECORD) -> Iterator[Dict]:
+        table_name = file_path.split('/')[-1].split('\\')[-1]
+        with open(file_path, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            headers = next(reader, [])
+            yield from TableProcessor.iter_row_groups(headers, reader, table_name, rows_per_record)
+
+    @staticmethod
+    def iter_text_records(file_path: str, text_block_chars: int = TEXT_BLOCK_CHARS) -> Iterator[Dict]:
+        block: List[str] = []
+        size = 0
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                block.append(line)
+                size += len(line)
+                # 只在空行处断块，避免把一个段落切到两条 record 里
+                if size >= text_block_chars and not line.strip():
+                    yield {"content": "".join(block), "metadata": {}}
+                    block, size = [], 0
+        if block:
+            yield {"content": "".join(block), "metadata": {}}
     @staticmethod
     def _load_text(file_path:str)->str:
         with open(file_path,'r',encoding='utf-8') as f:
             return f.read()
     @staticmethod
     def load_pdf(file_path:str)->str:
+        return "\n\n".join(DocumentLoader.load_pdf_pages(file_path))
+    @staticmethod
+    def pdf_page_count(file_path:str)->int:
         from pypdf import PdfReader
-        reader=PdfReader(file_path)
-        text_parts=[]
-        for i,page in enumerate(reader.pages):
-            text=page.extract_text()
-            if text:
-                text_parts.append(f"[第{i+1}页]\n{text}")
-        return "\n\n".join(text_parts)
+        return len(PdfReader(file_path).pages)
+    @staticmethod
+    def load_pdf_pages(file_path:str,start:int=0,end:Optional[int]=None)->List[str]:
+        """解析 [start, end) 页，大 PDF 按页段拆给多个进程并行时使用"""
+        return [record["content"] for record in DocumentLoader.iter_pdf_records(file_path,start,end)]
     @staticmethod
     def load_docx(file_path:str)->str:
         from docx import Document
@@ -64,15 +124,8 @@ class DocumentLoader:
         return soup.get_text(separator='\n',strip=True)
     @staticmethod
     def load_csv(file_path:str)->str:
-        """加载csv文件，使用语义化表格处理"""
-        headers=[]
-        rows=[]
-        with open(file_path,'r',encoding='utf-8') as f:
-            reader=csv.reader(f)
-            headers=next(reader,[])
-            rows=[row for row in reader]
-            table_name=file_path.split('/')[-1].split('\\')[-1]
-            return TableProcessor.to_semantic_text(headers,rows,table_name)
+        """加载csv文件，使用语义化表格处理（完整表格：按行分组 + 统计摘要）"""
+        return "\n\n".join(record["content"] for record in DocumentLoader.iter_csv_records(file_path))
         
     @staticmethod  
     def load_json(file_path:str)->str:
@@ -97,25 +150,29 @@ class DocumentLoader:
     @staticmethod
     def load_excel_records(file_path: str) -> List[Dict]:
         """按 sheet 加载 Excel 文件，保留 sheet_name 元数据"""
-        from openpyxl import load_workbook
-        wb=load_workbook(file_path,data_only=True)
-        records=[]
-        for sheet_name in wb.sheetnames:
-            sheet=wb[sheet_name]
+        return list(DocumentLoader.iter_excel_records(file_path))
 
-            rows=[]
-            for row in sheet.iter_rows(values_only=True):
-                row_data=[str(cell) if cell is not None else '' for cell in row]
-                if any(cell.strip() for cell in row_data):
-                    rows.append(row_data)
-            if rows:
-                headers=rows[0]
-                data_rows=rows[1:]
-                sheet_text=TableProcessor.to_semantic_text(headers,data_rows,table_name=f"{sheet_name}")
-                records.append(
-                    {
-                        "content": sheet_text,
-                        "metadata": {"sheet_name": sheet_name},
-                    }
+    @staticmethod
+    def iter_excel_records(file_path: str, rows_per_record: int = TABLE_ROWS_PER_RECORD) -> Iterator[Dict]:
+        """
+        只读模式流式读取 Excel：每个 sheet 按 rows_per_record 行切成多条 record，末尾附一条整表统计摘要；
+        metadata 带 sheet_name 和数据行区间 row_start/row_end（表头之后第 1 行记为 1）。
+        """
+        from openpyxl import load_workbook
+        # read_only 模式按行解析 XML，不为整本工作簿建 cell 对象
+        wb=load_workbook(file_path,read_only=True,data_only=True)
+        try:
+            for sheet_name in wb.sheetnames:
+                rows=(
+                    [str(cell) if cell is not None else '' for cell in row]
+                    for row in wb[sheet_name].iter_rows(values_only=True)
                 )
-        return records
+                rows=(row for row in rows if any(cell.strip() for cell in row))
+                headers=next(rows,None)
+                if headers is None:
+                    continue
+                for record in TableProcessor.iter_row_groups(headers,rows,f"{sheet_name}",rows_per_record):
+                    record["metadata"]["sheet_name"]=sheet_name
+                    yield record
+        finally:
+            wb.close()
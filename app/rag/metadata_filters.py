@@ -1,5 +1,6 @@
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Collection, Dict, List, Optional, Tuple
+import hashlib
 import time
 
 
@@ -37,12 +38,13 @@ def build_base_metadata(
     filename: str,
     title: Optional[str] = None,
     ingested_at: Optional[int] = None,
+    file_hash: Optional[str] = None,
 ) -> Dict[str, Any]:
     timestamp = _coerce_int(ingested_at) if ingested_at is not None else None
     if timestamp is None:
         timestamp = int(time.time())
 
-    return {
+    metadata = {
         "source": filename,
         "title": (title or infer_title(filename)).strip(),
         "doc_type": infer_doc_type(filename),
@@ -51,6 +53,22 @@ def build_base_metadata(
         "ingested_at": timestamp,
         "timestamp": timestamp,
     }
+    if file_hash:
+        # 上传时流式计算的整文件 sha256，供去重 / 增量重建使用
+        metadata["file_hash"] = file_hash
+    return metadata
+
+
+def compute_content_hash(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+def compute_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 def extract_section_path(metadata: Dict[str, Any]) -> Optional[str]:
@@ -165,3 +183,76 @@ def matches_metadata_filters(
             return False
 
     return True
+
+
+def _milvus_string_literal(value: str) -> Optional[str]:
+    # 含引号 / 反斜杠的值不做转义下推，交给 Python 侧过滤兜底
+    if '"' in value or "\\" in value:
+        return None
+    return f'"{value}"'
+
+
+def milvus_field_ref(field: str, scalar_fields: Optional[Collection[str]] = None) -> str:
+    """schema v2 的标量列直接引用列名（走标量索引），否则落到 JSON metadata 上。"""
+    if scalar_fields and field in scalar_fields:
+        return field
+    return f'metadata["{field}"]'
+
+
+def milvus_source_expr(source: str, scalar_fields: Optional[Collection[str]] = None) -> str:
+    """按来源精确匹配的表达式（查询 / 删除某个来源的 chunk 用）；无法安全转义的来源名直接拒绝。"""
+    literal = _milvus_string_literal(source)
+    if literal is None:
+        raise ValueError(f"来源名包含引号或反斜杠，无法构造 Milvus 表达式: {source!r}")
+    return f"{milvus_field_ref('source', scalar_fields)} == {literal}"
+
+
+def build_milvus_filter_expr(
+    metadata_filters: Optional[Dict[str, Any]],
+    scalar_fields: Optional[Collection[str]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    把 normalize_metadata_filters 的结果编译成 Milvus 布尔表达式，让过滤在 ANN 检索内部完成。
+
+    Args:
+        scalar_fields: collection 中已提升为标量列的字段，这些字段直接用列名引用
+
+    Returns:
+        (expr, residual)：expr 为空串表示没有可下推的条件；
+        residual 是无法用表达式等价表达的过滤条件，需要在 Python 侧继续过滤。
+    """
+    filters = normalize_metadata_filters(metadata_filters)
+    clauses: List[str] = []
+    residual: Dict[str, Any] = {}
+
+    for field in ("source", "title", "doc_type", "sheet_name", "section_path"):
+        value = filters.get(field)
+        if value is None:
+            continue
+        literal = _milvus_string_literal(value)
+        if literal is None:
+            residual[field] = value
+            continue
+        clauses.append(f"{milvus_field_ref(field, scalar_fields)} == {literal}")
+
+    if "timestamp" in filters:
+        clauses.append(f'metadata["timestamp"] == {filters["timestamp"]}')
+    ingested_at = milvus_field_ref("ingested_at", scalar_fields)
+    if "ingested_at_from" in filters:
+        clauses.append(f'{ingested_at} >= {filters["ingested_at_from"]}')
+    if "ingested_at_to" in filters:
+        clauses.append(f'{ingested_at} <= {filters["ingested_at_to"]}')
+
+    for key, field in (("title_contains", "title"), ("section_path_contains", "section_path")):
+        value = filters.get(key)
+        if value is None:
+            continue
+        # Python 侧是大小写不敏感的包含匹配，而 like 区分大小写；
+        # 只有不含大小写字母（如纯中文）且不含通配符时两者才等价
+        literal = _milvus_string_literal(value)
+        if literal is None or value.lower() != value.upper() or "%" in value or "_" in value:
+            residual[key] = value
+            continue
+        clauses.append(f'{milvus_field_ref(field, scalar_fields)} like "%{value}%"')
+
+    return " and ".join(clauses), residual
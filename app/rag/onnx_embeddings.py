@@ -0,0 +1,133 @@
+# 本地 BGE 的 ONNX Runtime 后端（EMBEDDING_PROVIDER=onnx）
+# CPU 节点上 FlagModel 只能走 fp32 PyTorch，吞吐低。这里把同一个模型导出成 ONNX，默认再做动态 int8 量化
+# （权重离线量化成 int8，激活在推理时按批量化），用 ONNX Runtime 在 CPU 上推理，线程数可配置。
+# 首次使用时导出 / 量化一次并缓存到 onnx_dir，之后只加载 tokenizer 和 .onnx 文件，不再需要 PyTorch 前向。
+# 池化方式与 FlagModel 一致（CLS + L2 归一化），向量和 bge 后端在同一空间，可以共用已有 collection。
+import asyncio
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from loguru import logger
+
+from app.rag.bge_embeddings import MODEL_ALIASES, MODEL_CACHE_DIR, encode_by_length
+
+
+def cls_pool_normalize(last_hidden_state: np.ndarray) -> np.ndarray:
+    """取 [CLS] 位置的隐状态并做 L2 归一化，返回 (n, dim) 的 float32 矩阵。"""
+    cls = np.asarray(last_hidden_state[:, 0], dtype=np.float32)
+    norms = np.linalg.norm(cls, axis=1, keepdims=True)
+    return np.ascontiguousarray(cls / np.maximum(norms, 1e-12))
+
+
+def export_onnx_model(model_name: str, output_dir: Path, quantize: bool = True) -> Path:
+    """
+    导出 ONNX 模型（batch / 序列长度动态），quantize=True 时再生成动态 int8 量化版本。
+    已存在的文件直接复用；tokenizer 一并保存到 output_dir，推理时从这里加载。
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = output_dir / "model.onnx"
+    int8_path = output_dir / "model.int8.onnx"
+
+    if not fp32_path.exists():
+        # 只有导出时才需要 torch / transformers 的 PyTorch 模型
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"导出 ONNX 模型: {model_name} -> {fp32_path}")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["导出样例文本"], return_tensors="pt")
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                str(fp32_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        tokenizer.save_pretrained(str(output_dir))
+
+    if not quantize:
+        return fp32_path
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"动态 int8 量化: {fp32_path} -> {int8_path}")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class ONNXLocalEmbeddings:
+    """本地 BGE 的 ONNX Runtime 封装，接口与 BGELocalEmbeddings 一致。"""
+
+    def __init__(
+        self,
+        model_name: str,
+        onnx_dir: str = "",
+        quantize: bool = True,
+        threads: int = 0,
+        max_batch_size: int = 64,
+        max_batch_tokens: int = 16384,
+        max_length: int = 512,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = MODEL_ALIASES.get(model_name, model_name)
+        self.quantize = quantize
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_length = max_length
+
+        root = Path(onnx_dir) if onnx_dir else MODEL_CACHE_DIR / "onnx"
+        output_dir = root / self.model_name.replace("/", "__")
+        model_path = export_onnx_model(self.model_name, output_dir, quantize=quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(output_dir), use_fast=True)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 表示交给 ORT 按物理核数决定；同机还跑着服务时建议显式限制
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {item.name for item in self.session.get_inputs()}
+        logger.info(
+            f"ONNX embedding 已加载: {model_path.name}（{'int8' if quantize else 'fp32'}，"
+            f"intra-op 线程 {threads or 'auto'}）"
+        )
+
+    def _encode(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        # 整体只分词一次（不 padding），分批后每批只 pad 到批内最长
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        features = {name: value for name, value in encoded.items() if name in self._input_names}
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+
+        def encode_batch(batch: np.ndarray) -> np.ndarray:
+            padded = self.tokenizer.pad(
+                {name: [value[i] for i in batch] for name, value in features.items()},
+                return_tensors="np",
+            )
+            feeds = {name: np.asarray(value, dtype=np.int64) for name, value in padded.items()}
+            (last_hidden_state,) = self.session.run(["last_hidden_state"], feeds)
+            return cls_pool_normalize(last_hidden_state)
+
+        return encode_by_length(lengths, encode_batch, self.max_batch_size, self.max_batch_tokens)
+
+    async def aembed_query(self, text: str):
+        vectors = await asyncio.to_thread(self._encode, [text])
+        return vectors[0]
+
+    async def aembed_documents(self, texts):
+        return await asyncio.to_thread(self._encode, texts)
@@ -1,11 +1,15 @@
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import torch
 from FlagEmbedding import FlagReranker
 from loguru import logger
 
+from app.rag.metadata_filters import compute_content_hash
+
 
 # 本地模型统一放在 D 盘，避免下载到系统盘。
 MODEL_CACHE_DIR = Path("D:/AI编程/kiro-place/JAVA-agent/my-agent/models")
@@ -13,12 +17,70 @@ os.environ["HF_HOME"] = str(MODEL_CACHE_DIR)
 os.environ["TRANSFORMERS_CACHE"] = str(MODEL_CACHE_DIR)
 
 
+class RerankScoreCache:
+    """
+    (query hash, chunk hash) -> 重排分数的有界 LRU。
+    多路查询对重叠候选集多次重排、热门问题反复命中同一批 chunk 时，已算过的 pair 不再过模型。
+    """
+
+    def __init__(self, max_items: int = 20000):
+        self.max_items = max_items
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(query: str, content: str, content_hash: Optional[str] = None) -> Tuple[str, str]:
+        # 入库的 chunk metadata 里已经带了 content_hash，直接复用
+        return compute_content_hash(query), content_hash or compute_content_hash(content)
+
+    def get_many(self, keys: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        found: Dict[Tuple[str, str], float] = {}
+        with self._lock:
+            for key in keys:
+                score = self._scores.get(key)
+                if score is not None:
+                    self._scores.move_to_end(key)
+                    found[key] = score
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[Tuple[str, str], float]) -> None:
+        with self._lock:
+            for key, score in items.items():
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_items:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "lookups": lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "items": len(self._scores),
+        }
+
+
 class BGEReranker:
-    """Local BGE reranker with CUDA-aware defaults."""
+    """Local BGE reranker with CUDA-aware defaults and a (query, chunk) score cache."""
 
-    def __init__(self, model_name: str = "BAAI/bge-reranker-base"):
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-base",
+        batch_size: int = 32,
+        max_length: int = 512,
+        cache_size: int = 20000,
+    ):
         MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
         self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache = RerankScoreCache(max_items=cache_size)
         self.use_fp16 = torch.cuda.is_available()
         self.device = "cuda" if self.use_fp16 else "cpu"
 
@@ -42,22 +104,44 @@ class BGEReranker:
             return []
 
         limit = top_k or len(documents)
-        pairs = [[query, doc["content"]] for doc in documents]
+        keys = [
+            self.cache.make_key(query, doc["content"], (doc.get("metadata") or {}).get("content_hash"))
+            for doc in documents
+        ]
+        scores = self.cache.get_many(keys)
 
-        try:
-            raw_scores = self.reranker.compute_score(pairs)
-        except Exception as e:  # noqa: BLE001
-            raise RuntimeError(
-                f"BGE reranker scoring failed (model={self.model_name}, device={self.device})."
-            ) from e
+        # 只给缓存未命中的 pair 打分，同一次调用里重复的 chunk 也只算一次
+        pending: Dict[Tuple[str, str], str] = {}
+        for key, doc in zip(keys, documents):
+            if key not in scores and key not in pending:
+                pending[key] = doc["content"]
 
-        if raw_scores and isinstance(raw_scores[0], list):
-            scores = [score[0] for score in raw_scores]
-        else:
-            scores = raw_scores if isinstance(raw_scores, list) else [raw_scores]
+        if pending:
+            pairs = [[query, content] for content in pending.values()]
+            try:
+                raw_scores = self.reranker.compute_score(
+                    pairs, batch_size=self.batch_size, max_length=self.max_length
+                )
+            except Exception as e:  # noqa: BLE001
+                raise RuntimeError(
+                    f"BGE reranker scoring failed (model={self.model_name}, device={self.device})."
+                ) from e
 
-        scored_docs = list(zip(documents, scores))
+            # 只有一个 pair 时 compute_score 返回单个分数
+            if not isinstance(raw_scores, list):
+                raw_scores = [raw_scores]
+            computed = {
+                key: float(score[0] if isinstance(score, list) else score)
+                for key, score in zip(pending.keys(), raw_scores)
+            }
+            self.cache.put_many(computed)
+            scores.update(computed)
+
+        scored_docs = [(doc, scores[key]) for doc, key in zip(documents, keys)]
         scored_docs.sort(key=lambda item: item[1], reverse=True)
         result = [doc for doc, _score in scored_docs[:limit]]
-        logger.info(f"BGE rerank finished, returning {len(result)} documents")
+        logger.info(
+            f"BGE rerank finished, returning {len(result)} documents "
+            f"(scored {len(pending)}/{len(documents)} pairs, cache hit rate {self.cache.stats()['hit_rate']:.2%})"
+        )
         return result
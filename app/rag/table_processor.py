@@ -1,5 +1,107 @@
-from typing import List, Optional
+import re
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
 from loguru import logger
+import numpy as np
+
+# pandas 只用于按列向量化解析数值 / 计数，未安装时退回纯 NumPy 实现，结果一致
+try:
+    import pandas as pd
+except ImportError:  # pragma: no cover - 取决于部署环境
+    pd = None
+
+# 取值种类不超过该数的列输出分布统计，超过后不再计数
+MAX_CATEGORIES = 5
+_LINE_BREAK_RE = re.compile(r"\s*[\r\n]+\s*")
+
+
+def _single_line(value) -> str:
+    """单元格 / 列名里的换行压成空格，保证一行记录渲染后只占一行文本，切分时不会被拆散。"""
+    return _LINE_BREAK_RE.sub(" ", str(value))
+
+
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+def _value_counts(column) -> Iterator:
+    """非空取值的计数，按首次出现顺序。"""
+    if pd is not None:
+        return column[column != ""].value_counts(sort=False).items()
+    counts: Dict[str, int] = {}
+    for value in column:
+        if value != "":
+            counts[value] = counts.get(value, 0) + 1
+    return iter(counts.items())
+
+
+class TableStats:
+    """
+    列式统计累加器：按行块向量化更新，一遍得到数值列的 min/max/均值和低基数列的取值分布。
+    流式加载时每块 update 一次，不需要把整张表留在内存里。
+    """
+
+    def __init__(self, headers: List[str]):
+        self.headers = headers
+        width = len(headers)
+        self.row_count = 0
+        self._count = np.zeros(width, dtype=np.int64)
+        self._sum = np.zeros(width, dtype=np.float64)
+        self._min = np.full(width, np.nan)
+        self._max = np.full(width, np.nan)
+        # 每列的取值计数（保持首次出现顺序）；取值超过 MAX_CATEGORIES 种后置为 None
+        self._value_counts: List[Optional[Dict[str, int]]] = [{} for _ in headers]
+
+    def update(self, rows: List[List[str]]) -> None:
+        if not rows or not self.headers:
+            return
+        width = len(self.headers)
+        if pd is not None:
+            frame = pd.DataFrame([(list(row) + [''] * width)[:width] for row in rows], dtype=str)
+            stripped = frame.apply(lambda col: col.str.strip())
+            # 数值识别、min/max/sum 都按列在 C 层一次完成，不再逐格 try float()
+            numeric = stripped.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+            columns = [stripped[i] for i in range(width)]
+        else:
+            cells = [[str(value).strip() for value in (list(row) + [''] * width)[:width]] for row in rows]
+            numeric = np.array([[_to_float(value) for value in row] for row in cells], dtype=np.float64)
+            columns = [[row[i] for row in cells] for i in range(width)]
+        missing = np.isnan(numeric)
+        self.row_count += len(rows)
+        self._count += np.count_nonzero(~missing, axis=0)
+        self._sum += np.nansum(numeric, axis=0)
+        # 非数值格先替换成 ±inf，避免全 NaN 列触发 nanmin 告警
+        self._min = np.fmin(self._min, np.where(missing, np.inf, numeric).min(axis=0))
+        self._max = np.fmax(self._max, np.where(missing, -np.inf, numeric).max(axis=0))
+
+        for i in range(width):
+            counts = self._value_counts[i]
+            if counts is None:
+                continue
+            for value, n in _value_counts(columns[i]):
+                counts[value] = counts.get(value, 0) + int(n)
+            if len(counts) > MAX_CATEGORIES:
+                self._value_counts[i] = None
+
+    def summary_lines(self) -> List[str]:
+        """生成统计摘要"""
+        summary = [f"-共 {self.row_count}条记录"]
+        for i, header in enumerate(self.headers):
+            if self._count[i]:
+                avg_val = self._sum[i] / self._count[i]
+                summary.append(
+                    f"- {header}：范围 {self._min[i]:.2f} ~ {self._max[i]:.2f}，平均 {avg_val:.2f}"
+                )
+        for i, header in enumerate(self.headers):
+            counts = self._value_counts[i]
+            if counts and 1 < len(counts) <= MAX_CATEGORIES:
+                dist = ",".join([f"{k}({v}条)" for k, v in sorted(counts.items(), key=lambda x: -x[1])])
+                summary.append(f"- {header}分布：{dist}")
+        return summary
+
 
 class TableProcessor:
     """表格数据处理器 - 将表格转换为语义化文本"""
@@ -11,20 +113,21 @@ class TableProcessor:
         max_rows:int=100
     )->str:
         """
-        将表格转换为语义化文本
-        
+        将表格转换为语义化文本（只展示前 max_rows 行，完整表格请用 iter_row_groups）
+
         Args:
             headers: 列名列表
             rows: 数据行列表（每行是值的列表）
             table_name: 表格名称
             max_rows: 最大处理行数
-        
+
         Returns:
             语义化的文本描述
         """
         if not headers or not rows:
             return f"[{table_name}]空表格"
-        display_rows=rows[:max_rows] 
+        headers=[_single_line(header) for header in headers]
+        display_rows=rows[:max_rows]
         total_rows=len(rows)
         truncated=total_rows>max_rows
 
@@ -48,6 +151,62 @@ class TableProcessor:
             text_parts.append("统计摘要： ")
             text_parts.extend(summary)
         return "\n".join(text_parts)
+
+    @staticmethod
+    def iter_row_groups(
+        headers: List[str],
+        rows: Iterable[List[str]],
+        table_name: str = "数据表",
+        rows_per_group: int = 100,
+    ) -> Iterator[Dict]:
+        """
+        把完整表格按 rows_per_group 行切成多个 record，不丢弃任何行；
+        行可以是流式迭代器，统计随行块增量累积，全部行处理完后再产出一条整表统计摘要 record。
+
+        Yields:
+            {"content": 文本, "metadata": {"row_start", "row_end"}}，行号从表头之后的第 1 行记起
+        """
+        headers = [_single_line(header) for header in headers]
+        stats = TableStats(headers)
+        iterator = iter(rows)
+        row_start = 1
+        while True:
+            group = list(islice(iterator, rows_per_group))
+            if not group:
+                break
+            stats.update(group)
+            row_end = row_start + len(group) - 1
+            text_parts = [
+                f"[{table_name}]",
+                f"表格包含{len(headers)}列：{','.join(headers)}",
+                f"第{row_start}-{row_end}条记录",
+                "",
+            ]
+            text_parts.extend(
+                TableProcessor._describe_row(headers, row, row_start + i) for i, row in enumerate(group)
+            )
+            yield {
+                "content": "\n".join(text_parts),
+                "metadata": {"row_start": row_start, "row_end": row_end},
+            }
+            row_start = row_end + 1
+
+        if not headers or not stats.row_count:
+            yield {"content": f"[{table_name}]空表格", "metadata": {}}
+            return
+        text_parts = [
+            f"[{table_name}]",
+            f"表格包含{len(headers)}列：{','.join(headers)}",
+            f"共{stats.row_count}条记录",
+            "",
+            "统计摘要： ",
+        ]
+        text_parts.extend(stats.summary_lines())
+        yield {
+            "content": "\n".join(text_parts),
+            "metadata": {"row_start": 1, "row_end": stats.row_count},
+        }
+
     @staticmethod
     def _describe_row(headers: List[str], row: List[str], row_num: int) -> str:
         """将单行数据转换为自然语言描述"""
@@ -55,40 +214,13 @@ class TableProcessor:
         pairs=[]
         for header,value in zip(headers,values):
             if value and str(value).strip():
-                pairs.append(f"{header}为{value}")
+                pairs.append(f"{header}为{_single_line(value).strip()}")
         if pairs:
             return f"记录{row_num}: "+",".join(pairs)
         return f"记录{row_num}:(空记录)"
     @staticmethod
     def _generate_summary(headers:List[str],rows:List[List[str]])->List[str]:
         """生成统计摘要"""
-        summary=[]
-
-        summary.append(f"-共 {len(rows)}条记录")
-
-        for i,header in enumerate(headers):
-            values=[]
-            for row in rows:
-                if i<len(row):
-                    try:
-                        val=float(row[i])
-                        values.append(val)
-                    except (ValueError,TypeError):
-                        pass
-            if values:
-                min_val=min(values)
-                max_val=max(values)
-                avg_val=sum(values)/len(values)
-                summary.append(f"- {header}：范围 {min_val:.2f} ~ {max_val:.2f}，平均 {avg_val:.2f}")
-
-        for i,header in enumerate(headers):
-            value_counts={}
-            for row in rows:
-                if i<len(row):
-                    val=str(row[i]).strip()
-                    if val:
-                        value_counts[val]=value_counts.get(val,0)+1
-            if 1<len(value_counts)<=5:
-                dist=",".join([f"{k}({v}条)"for k,v in sorted(value_counts.items(),key=lambda x: -x[1])])
-                summary.append(f"- {header}分布：{dist}")
-        return summary
+        stats=TableStats(headers)
+        stats.update(rows)
+        return stats.summary_lines()
@@ -0,0 +1,77 @@
+# 文本 token 计数
+# 切分按 token 预算时使用：优先用 embedding 模型自己的 tokenizer（transformers fast tokenizer），
+# 配置为 approx 或加载失败时退回近似估算，无额外依赖。
+import math
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Sequence
+
+from loguru import logger
+
+_CJK_RE = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+_SYMBOL_RE = re.compile(r"[^\sA-Za-z0-9\u3400-\u9fff\uf900-\ufaff]")
+
+# 直方图分桶上界，对齐 BGE 的 512 上限
+TOKEN_HISTOGRAM_BINS = (64, 128, 256, 384, 512)
+
+
+def approx_token_count(text: str) -> int:
+    """
+    近似 token 数：BERT 类中文 tokenizer 基本一个汉字一个 token，
+    英文/数字按每 4 个字符 1 个 token 估（偏保守，宁可切小也不超上限），其它符号各算 1 个。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    words = sum(math.ceil(len(word) / 4) for word in _WORD_RE.findall(text))
+    symbols = len(_SYMBOL_RE.findall(text))
+    return cjk + words + symbols
+
+
+@lru_cache(maxsize=4)
+def get_token_counter(tokenizer: str = "approx") -> Callable[[str], int]:
+    """按名称取 token 计数函数，进程内缓存，解析进程池里每个进程只加载一次 tokenizer。"""
+    if not tokenizer or tokenizer == "approx":
+        return approx_token_count
+    try:
+        from transformers import AutoTokenizer
+
+        hf_tokenizer = AutoTokenizer.from_pretrained(tokenizer, use_fast=True)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"加载 tokenizer {tokenizer} 失败，改用近似 token 计数: {e}")
+        return approx_token_count
+
+    def count(text: str) -> int:
+        return len(hf_tokenizer.encode(text, add_special_tokens=False))
+
+    return count
+
+
+def summarize_token_counts(
+    counts: Iterable[int],
+    bins: Sequence[int] = TOKEN_HISTOGRAM_BINS,
+) -> Dict:
+    """chunk token 数分布：均值 / 分位数 / 最大值 + 分桶直方图。"""
+    values: List[int] = sorted(counts)
+    labels = []
+    lower = 0
+    for upper in bins:
+        labels.append(f"{lower + 1}-{upper}")
+        lower = upper
+    labels.append(f">{bins[-1]}")
+    histogram = {label: 0 for label in labels}
+    for value in values:
+        index = next((i for i, upper in enumerate(bins) if value <= upper), len(bins))
+        histogram[labels[index]] += 1
+
+    if not values:
+        return {"chunks": 0, "mean": 0.0, "p50": 0, "p95": 0, "max": 0, "histogram": histogram}
+    return {
+        "chunks": len(values),
+        "mean": round(sum(values) / len(values), 1),
+        "p50": values[(len(values) - 1) // 2],
+        "p95": values[min(len(values) - 1, math.ceil(len(values) * 0.95) - 1)],
+        "max": values[-1],
+        "histogram": histogram,
+    }
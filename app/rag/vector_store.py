@@ -3,24 +3,76 @@
 # 向量存储模块
 # TODO: 任务 12.2 - 实现 VectorStore 类
 
-from typing import List, Dict
+import asyncio
+import time
+from itertools import islice
+from typing import AsyncIterator, Iterable, List, Dict
 from app.clients.milvus_client import MilvusClient
-from app.rag.embeddings import EmbeddingService
+from app.rag.bm25 import BM25Retriever
+from app.rag.embeddings import EmbeddingService, as_float32_matrix
+from app.rag.fusion import rrf_fuse
 from loguru import logger
 import json
+import numpy as np
 import re
 from typing import Optional
 from langchain_core.messages import SystemMessage, HumanMessage
 from app.rag.metadata_filters import (
+    build_milvus_filter_expr,
+    compute_content_hash,
     matches_metadata_filters,
+    milvus_source_expr,
     normalize_metadata_filters,
 )
 
 
+def to_milvus_row(vector, content: str, metadata: Optional[Dict], scalar_fields=None) -> Dict:
+    """按 collection schema 组装一行：v2 的标量列从 metadata 中冗余一份出来。"""
+    metadata = metadata or {}
+    try:
+        ingested_at = int(metadata.get("ingested_at") or 0)
+    except (TypeError, ValueError):
+        ingested_at = 0
+    scalar_values = {
+        "source": str(metadata.get("source") or "")[:512],
+        "doc_type": str(metadata.get("doc_type") or "")[:64],
+        "title": str(metadata.get("title") or "")[:512],
+        "ingested_at": ingested_at,
+        "content_hash": metadata.get("content_hash") or compute_content_hash(content),
+    }
+    row = {"vector": vector, "content": content, "metadata": metadata}
+    for field in scalar_fields or ():
+        row[field] = scalar_values[field]
+    return row
+
+
+async def iter_batches(chunks: Iterable[Dict], batch_size: int) -> AsyncIterator[List[Dict]]:
+    """按批取 chunk；生成器输入（流式加载 + 切分）在线程里推进，解析不阻塞事件循环，内存只占一批。"""
+    if isinstance(chunks, list):
+        for start in range(0, len(chunks), batch_size):
+            yield chunks[start:start + batch_size]
+        return
+    iterator = iter(chunks)
+    # 带时限的流（DeadlineChunkStream）按剩余时间限制每次取批，解析卡在某一步时不会无限等待
+    remaining = getattr(iterator, "remaining", None)
+    while True:
+        try:
+            batch = await asyncio.wait_for(
+                asyncio.to_thread(lambda: list(islice(iterator, batch_size))),
+                timeout=remaining() if remaining is not None else None,
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError("流式解析超时") from None
+        if not batch:
+            return
+        yield batch
+
+
 class VectorStore:
     def __init__(self, milvus_client: MilvusClient, embedding_service: EmbeddingService,
                  reranker_llm: Optional[object] = None,reranker: Optional[object] = None, dense_top_k: int = 10, enable_rerank: bool = True,
-                 enable_hybrid: bool = True):
+                 enable_hybrid: bool = True, bm25_retriever: Optional[object] = None,
+                 insert_batch_size: int = 512):
         self.milvus = milvus_client
         self.embedding = embedding_service
         self.reranker_llm = reranker_llm
@@ -28,33 +80,119 @@ class VectorStore:
         self.dense_top_k = dense_top_k
         self.enable_rerank = enable_rerank
         self.enable_hybrid = enable_hybrid
-        self.bm25_retriever = None  # 新增
-        self.all_chunks = []  # 新增：存储所有文档用于 BM25
+        self.bm25_retriever = bm25_retriever  # 可由外部共享注入（持久化索引）
+        self.insert_batch_size = insert_batch_size
         logger.info("向量存储初始化完成")
 
-    async def insert(self, chunks: List[Dict]) -> None:
+    async def _insert_batch(self, chunks: List[Dict], index_bm25: bool = True) -> None:
+        vectors = await self._embed_chunks(chunks)
+        await self._write_chunks(chunks, vectors, index_bm25=index_bm25)
+
+    async def _embed_chunks(self, chunks: List[Dict]) -> np.ndarray:
+        return as_float32_matrix(await self.embedding.embed_texts([chunk["content"] for chunk in chunks]))
+
+    async def _write_chunks(self, chunks: List[Dict], vectors: np.ndarray, index_bm25: bool = True) -> List[int]:
+        """写入一批已 embedding 的 chunk，返回 Milvus 分配的主键（upsert 失败时据此回滚）。"""
+        # vectors 是 (n, dim) float32 矩阵，行 / 整列直接交给 pymilvus，不在这里展开成 Python 列表
+        texts = [chunk["content"] for chunk in chunks]
+        scalar_fields = getattr(self.milvus, "scalar_fields", None)
+        if scalar_fields:
+            data = [
+                to_milvus_row(vector, text, chunk["metadata"], scalar_fields)
+                for vector, text, chunk in zip(vectors, texts, chunks)
+            ]
+        else:
+            data = [
+                vectors, texts, [chunk["metadata"] for chunk in chunks]
+            ]
+        result = await self._milvus_call(self.milvus.collection.insert, data)
+        if self.enable_hybrid and index_bm25:
+            if self.bm25_retriever is None:
+                self.bm25_retriever = BM25Retriever()
+            # 增量写入，只对新 chunk 分词
+            self.bm25_retriever.add(chunks)
+        return list(getattr(result, "primary_keys", None) or [])
+
+    async def insert(self, chunks: List[Dict], flush: bool = False) -> None:
+        """
+        按 insert_batch_size 分批写入。
+
+        默认不 flush：新数据在 growing segment 中即可被检索，逐次 flush 只会制造大量小 segment；
+        需要立即落盘（例如批量导入结束）时传 flush=True 或使用 bulk_ingest()。
+        """
         try:
             if not chunks:
                 logger.warning("没有文档需要插入")
                 return
-            texts = [chunk["content"] for chunk in chunks]
-            vectors = await self.embedding.embed_texts(texts)
-            data = [
-                vectors, texts, [chunk["metadata"] for chunk in chunks]
-            ]
-            self.milvus.collection.insert(data)
-            self.milvus.collection.flush()
+            pipeline = InsertPipeline(self)
+            for start in range(0, len(chunks), self.insert_batch_size):
+                await pipeline.submit(chunks[start:start + self.insert_batch_size])
+            await pipeline.drain()
+            if flush:
+                await self._milvus_call(self.milvus.collection.flush)
             logger.info(f"成功插入 {len(chunks)} 个文档块")
-            self.all_chunks.extend(chunks)
-            if self.enable_hybrid:
-                from app.rag.bm25 import BM25Retriever
-                self.bm25_retriever = BM25Retriever()
-                self.bm25_retriever.index(self.all_chunks)
 
         except Exception as e:
             logger.error(f"插入文档失败: {str(e)}")
             raise Exception(f"插入文档失败: {str(e)}")
 
+    def bulk_ingest(self, batch_size: Optional[int] = None) -> "BulkIngestSession":
+        """批量导入会话：跨文档缓冲 chunk、按批写入，结束时只 flush 一次。"""
+        return BulkIngestSession(self, batch_size or self.insert_batch_size)
+
+    async def _milvus_call(self, fn, *args, **kwargs):
+        """pymilvus 调用均为同步阻塞，交给 MilvusClient 的专用线程池执行，不占用事件循环。"""
+        run = getattr(self.milvus, "run", None)
+        if run is not None:
+            return await run(fn, *args, **kwargs)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def _count_entities(self) -> int:
+        try:
+            rows = self.milvus.collection.query(expr="", output_fields=["count(*)"])
+            return int(rows[0]["count(*)"])
+        except Exception:  # noqa: BLE001
+            # 老版本 Milvus 不支持 count(*)，退回 num_entities（可能包含未压缩的删除）
+            return int(self.milvus.collection.num_entities)
+
+    def _load_all_chunks(self, batch_size: int) -> List[Dict]:
+        iterator = self.milvus.collection.query_iterator(
+            batch_size=batch_size,
+            output_fields=["content", "metadata"],
+        )
+        chunks = []
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                chunks.extend(
+                    {"content": row.get("content", ""), "metadata": row.get("metadata") or {}}
+                    for row in batch
+                )
+        finally:
+            iterator.close()
+        return chunks
+
+    def _sync_bm25_index(self, batch_size: int) -> None:
+        total = self._count_entities()
+        if total == len(self.bm25_retriever):
+            logger.info(f"BM25 索引与 Milvus 一致（{total} 个 chunks），跳过回灌")
+            return
+        logger.info(
+            f"BM25 索引（{len(self.bm25_retriever)}）与 Milvus（{total}）不一致，开始从 collection 回灌"
+        )
+        self.bm25_retriever.index(self._load_all_chunks(batch_size))
+
+    async def sync_bm25_index(self, batch_size: int = 1000) -> None:
+        """启动时校准 BM25：本地索引条数与 collection 不一致时，从 Milvus 全量回灌一次。"""
+        if not self.enable_hybrid:
+            return
+        if self.bm25_retriever is None:
+            self.bm25_retriever = BM25Retriever()
+        # 全量回灌包含大量分词，放到线程里执行，避免阻塞事件循环
+        await asyncio.to_thread(self._sync_bm25_index, batch_size)
+
     def _truncate(self, text: str, max_len: int = 260) -> str:
         text = (text or "").strip().replace("\n", " ")
         return text[:max_len]
@@ -115,33 +253,81 @@ class VectorStore:
         top_k: int = 3,
         metadata_filters: Optional[Dict] = None,
     ) -> List[Dict]:
+        return await self.search_many([query], top_k=top_k, metadata_filters=metadata_filters)
+
+    def _search_params(self, limit: int) -> Dict:
+        if hasattr(self.milvus, "search_params"):
+            return self.milvus.search_params(limit)
+        return {"metric_type": "IP", "params": {"nprobe": 10}}
+
+    async def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        if len(queries) == 1:
+            # 单条查询走 embed_text，可被缓存 / 跨请求微批合并
+            return as_float32_matrix([await self.embedding.embed_text(queries[0])])
+        if hasattr(self.embedding, "embed_queries"):
+            return as_float32_matrix(await self.embedding.embed_queries(queries))
+        return as_float32_matrix(await asyncio.gather(*(self.embedding.embed_text(q) for q in queries)))
+
+    async def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        metadata_filters: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """
+        多路查询一次检索：查询批量向量化，一次多向量 Milvus search，
+        每路与 BM25 做 RRF 后再跨查询 RRF 融合，最后只对并集重排一次。
+
+        Args:
+            queries: 改写/扩展后的查询列表，第一条作为重排时的主查询
+        """
         try:
+            queries = list(dict.fromkeys(q for q in queries if q))
+            if not queries:
+                return []
             normalized_filters = normalize_metadata_filters(metadata_filters)
+            # 能表达的条件下推到 Milvus，在 ANN 检索内部过滤；
+            # 只有无法下推的条件（如大小写不敏感的包含匹配）才需要放大召回再在 Python 侧过滤
+            filter_expr, residual_filters = build_milvus_filter_expr(
+                normalized_filters, getattr(self.milvus, "scalar_fields", None)
+            )
             candidate_limit = max(self.dense_top_k, top_k)
-            if normalized_filters:
+            if residual_filters:
                 candidate_limit = max(candidate_limit * 5, top_k * 10, 30)
 
-            query_vector = await self.embedding.embed_text(query)
-            results = self.milvus.collection.search(
-                data=[query_vector],
+            query_vectors = await self._embed_queries(queries)
+            results = await self._milvus_call(
+                self.milvus.collection.search,
+                data=query_vectors,
                 anns_field="vector",
-                param={"metric_type": "IP", "params": {"nprobe": 10}},
+                param=self._search_params(candidate_limit),
                 limit=candidate_limit,
+                expr=filter_expr or None,
                 output_fields=["content", "metadata"]
             )
-            docs = []
-            for hit in results[0]:
-                docs.append(
-                    {
-                        "content": hit.entity.get("content"),
-                        "metadata": hit.entity.get("metadata"),
-                        "score": hit.score
-                    }
-                )
-            # ===== 新增：混合检索融合 =====
-            if self.enable_hybrid and self.bm25_retriever is not None:
-                bm25_docs = self.bm25_retriever.search(query, top_k=candidate_limit)
-                docs = self._rrf_merge(docs, bm25_docs, top_k=candidate_limit)
+            ranked_lists = []
+            for query, hits in zip(queries, results):
+                docs = []
+                for hit in hits:
+                    docs.append(
+                        {
+                            "content": hit.entity.get("content"),
+                            "metadata": hit.entity.get("metadata"),
+                            "score": hit.score
+                        }
+                    )
+                # ===== 新增：混合检索融合 =====
+                if self.enable_hybrid and self.bm25_retriever is not None:
+                    bm25_docs = self.bm25_retriever.search(
+                        query,
+                        top_k=candidate_limit,
+                        metadata_filters=normalized_filters or None,
+                    )
+                    docs = self._rrf_merge(docs, bm25_docs, top_k=candidate_limit)
+                ranked_lists.append(docs)
+
+            # 多路查询按名次融合，同一 chunk 被多条查询命中会被抬高
+            docs = ranked_lists[0] if len(ranked_lists) == 1 else rrf_fuse(ranked_lists)
 
             if not docs:
                 logger.info("检索到0个相关文档")
@@ -155,20 +341,21 @@ class VectorStore:
                 ]
                 logger.info(
                     f"[VectorStore.search] metadata_filters={normalized_filters} "
-                    f"filtered {before_filter_count} -> {len(docs)}"
+                    f"expr={filter_expr!r} filtered {before_filter_count} -> {len(docs)}"
                 )
                 if not docs:
                     logger.info("metadata 过滤后无结果")
                     return []
 
+            query = queries[0]
             before = [(d.get("metadata") or {}).get("source", "") for d in docs[:3]]
             logger.info(
-                f"[VectorStore.search] 候选数={len(docs)} "
+                f"[VectorStore.search] 查询数={len(queries)} 候选数={len(docs)} "
                 f"(dense_top_k={self.dense_top_k}, top_k={top_k}, candidate_limit={candidate_limit})"
             )
             if self.enable_rerank and len(docs) > 1:
                 if self.reranker is not None:
-                    docs=self.reranker.rerank(query,docs,top_k=candidate_limit)
+                    docs=self.reranker.rerank(query,docs,top_k=len(docs))
                     logger.info("[VectorStore.search] Rerank 模型重排完成")
                       
                 elif self.reranker_llm is not None:
@@ -203,16 +390,202 @@ class VectorStore:
 
     def _rrf_merge(self, vector_docs: List[Dict], bm25_docs: List[Dict], top_k: int, k: int = 60) -> List[Dict]:
         """简单的 RRF 融合"""
-        scores = {}
-        for rank, doc in enumerate(bm25_docs):
-            key = doc["content"][:100]
-            scores[key] = scores.get(key, {"doc": doc, "score": 0})
-            scores[key]["score"] += 1 / (k + rank + 1)
-        for rank, doc in enumerate(vector_docs):
-            key = doc["content"][:100]
-            scores[key] = scores.get(key, {"doc": doc, "score": 0})
-            scores[key]["score"] += 1 / (k + rank + 1)
-        return [v["doc"] for v in sorted(scores.values(), key=lambda x: x["score"], reverse=True)[:top_k]]
+        return rrf_fuse([bm25_docs, vector_docs], top_k=top_k, k=k)
+
+    async def _source_rows(self, source: str) -> List[Dict]:
+        """查出某个来源现有的 chunk：id、内容 hash 和 metadata。"""
+        scalar_fields = getattr(self.milvus, "scalar_fields", None) or set()
+        # v2 直接读 content_hash 列；v1 老数据没有 hash 时只能取回内容现算
+        hash_field = "content_hash" if "content_hash" in scalar_fields else "content"
+        rows = await self._milvus_call(
+            self.milvus.collection.query,
+            expr=milvus_source_expr(source, scalar_fields),
+            output_fields=["id", "metadata", hash_field],
+        )
+        result = []
+        for row in rows:
+            metadata = row.get("metadata") or {}
+            content_hash = (
+                row.get("content_hash")
+                or metadata.get("content_hash")
+                or compute_content_hash(row.get("content", ""))
+            )
+            result.append({"id": row["id"], "content_hash": content_hash, "metadata": metadata})
+        return result
+
+    @staticmethod
+    def _indexed_file_hash(rows: List[Dict]) -> Optional[str]:
+        """
+        来源的每一行都带同一个 file_hash 才算这个版本已完整导入；
+        中途失败留下的新旧混合数据返回 None，重试时不会被误判为未变化而跳过。
+        """
+        hashes = {row["metadata"].get("file_hash") for row in rows}
+        if len(hashes) != 1:
+            return None
+        return hashes.pop()
+
+    async def source_exists(self, source: str) -> bool:
+        """该来源是否已有 chunk；批量导入据此决定直接追加还是走 upsert_source 增量更新。"""
+        rows = await self._milvus_call(
+            self.milvus.collection.query,
+            expr=milvus_source_expr(source, getattr(self.milvus, "scalar_fields", None)),
+            output_fields=["id"],
+            limit=1,
+        )
+        return bool(rows)
+
+    async def source_file_hash(self, source: str) -> Optional[str]:
+        """该来源已完整导入的整文件 sha256，用于在解析前判断是否可以直接跳过。"""
+        return self._indexed_file_hash(await self._source_rows(source))
+
+    async def _rewrite_kept_chunks(self, chunks: List[Dict], row_ids: List[int]) -> List[int]:
+        """
+        内容未变化的 chunk 复用旧向量、按本次的 metadata 重新写一行（旧行随后和过期 chunk 一起删除），
+        file_hash / ingested_at / title / chunk_index 与本次导入保持一致；只删不增的修改也能刷新 file_hash。
+        """
+        rows = await self._milvus_call(
+            self.milvus.collection.query,
+            expr=f"id in {row_ids}",
+            output_fields=["id", "vector"],
+        )
+        vectors_by_id = {row["id"]: row["vector"] for row in rows}
+        vectors = as_float32_matrix([vectors_by_id[row_id] for row_id in row_ids])
+        return await self._write_chunks(chunks, vectors, index_bm25=False)
+
+    async def _resync_bm25_source(self, source: str) -> None:
+        """按 Milvus 里该来源现有的行重建它的 BM25 条目，逐批读取。"""
+        iterator = await self._milvus_call(
+            self.milvus.collection.query_iterator,
+            batch_size=self.insert_batch_size,
+            expr=milvus_source_expr(source, getattr(self.milvus, "scalar_fields", None)),
+            output_fields=["content", "metadata"],
+            # 刚做完删除，要读到删除之后的数据
+            consistency_level="Strong",
+        )
+        self.bm25_retriever.remove_source(source)
+        try:
+            while True:
+                batch = await self._milvus_call(iterator.next)
+                if not batch:
+                    break
+                self.bm25_retriever.add(
+                    [{"content": row.get("content", ""), "metadata": row.get("metadata") or {}} for row in batch]
+                )
+        finally:
+            iterator.close()
+
+    async def _rollback_upsert(self, source: str, inserted_ids: List[int], resync_bm25: bool) -> None:
+        """
+        upsert 中途失败：删掉本次已写入的行，来源回到更新前的数据；
+        BM25 已经逐批换成了新内容时，再按 Milvus 现有数据重建该来源，两边保持一致。
+        """
+        try:
+            if inserted_ids:
+                await self._milvus_call(self.milvus.collection.delete, f"id in {inserted_ids}")
+            if resync_bm25 and self.bm25_retriever is not None:
+                await self._resync_bm25_source(source)
+            logger.warning(f"来源 {source} 更新失败，已回滚本次写入的 {len(inserted_ids)} 行")
+        except Exception as e:
+            # 回滚失败时新旧数据的 file_hash 不一致，重试同一文件不会被跳过
+            logger.error(f"回滚来源 {source} 的部分写入失败: {str(e)}")
+
+    async def upsert_source(
+        self,
+        source: str,
+        chunks: Iterable[Dict],
+        file_hash: Optional[str] = None,
+        on_progress=None,
+    ) -> Dict:
+        """
+        按内容 hash 增量更新一个来源：只对新增 / 修改的 chunk 做 embedding，未变化的 chunk 复用旧向量
+        按本次 metadata 重写，多余的旧 chunk 删除；整文件 hash 未变化时直接跳过。
+
+        Args:
+            chunks: chunk 列表或流式生成器，按 insert_batch_size 分批消费
+            on_progress: 每处理完一批回调 on_progress(n)，n 为本批 chunk 数（含未变化的）
+
+        Returns:
+            {"status": "success" | "skipped" | "empty", "added", "deleted", "unchanged"}
+            没有任何 chunk 时返回 empty，已有数据保持不动；中途失败时删掉本次写入的行后抛出
+        """
+        try:
+            rows = await self._source_rows(source)
+            if file_hash and rows and self._indexed_file_hash(rows) == file_hash:
+                logger.info(f"来源 {source} 文件内容未变化（sha256={file_hash}），跳过重建")
+                return {"status": "skipped", "added": 0, "deleted": 0, "unchanged": len(rows)}
+
+            existing: Dict[str, List[int]] = {}
+            for row in rows:
+                existing.setdefault(row["content_hash"], []).append(row["id"])
+
+            # 按 hash 做多重集合差：同样内容的 chunk 出现几次就保留几条；逐批 diff、逐批写入
+            added = 0
+            unchanged = 0
+            bm25_replaced = False
+            replaced_ids: List[int] = []
+            rewritten_ids: List[int] = []
+            pipeline = InsertPipeline(self, index_bm25=False)
+            try:
+                try:
+                    async for batch in iter_batches(chunks, self.insert_batch_size):
+                        # BM25 只需分词、不花 embedding：拿到第一批时清掉该来源的旧条目，之后逐批写入，
+                        # 不在内存里攒整篇文档；没有任何 chunk 时不动已有索引，失败时由回滚按 Milvus 重建
+                        if self.enable_hybrid:
+                            if self.bm25_retriever is None:
+                                self.bm25_retriever = BM25Retriever()
+                            if not bm25_replaced:
+                                self.bm25_retriever.remove_source(source)
+                                bm25_replaced = True
+                            self.bm25_retriever.add(batch)
+                        new_chunks = []
+                        kept_chunks, kept_ids = [], []
+                        for chunk in batch:
+                            content_hash = chunk["metadata"].get("content_hash") or compute_content_hash(chunk["content"])
+                            ids = existing.get(content_hash)
+                            if ids:
+                                kept_chunks.append(chunk)
+                                kept_ids.append(ids.pop())
+                            else:
+                                new_chunks.append(chunk)
+                        if new_chunks:
+                            await pipeline.submit(new_chunks)
+                            added += len(new_chunks)
+                        if kept_chunks:
+                            rewritten_ids.extend(await self._rewrite_kept_chunks(kept_chunks, kept_ids))
+                            replaced_ids.extend(kept_ids)
+                            unchanged += len(kept_chunks)
+                        if on_progress is not None:
+                            on_progress(len(batch))
+                    await pipeline.drain()
+                finally:
+                    # 生成器在两次 submit 之间抛错（解析失败 / 超时）时，在途的那批写入也要等它结束，不留孤儿任务
+                    await pipeline.abort()
+
+                if not added and not unchanged:
+                    logger.warning(f"来源 {source} 没有可写入的 chunk，保留已有数据")
+                    return {"status": "empty", "added": 0, "deleted": 0, "unchanged": 0}
+
+                # 先写新 chunk 再删旧 chunk，更新过程中检索不会出现空窗；
+                # 旧行删掉之后来源的所有行才都带上新的 file_hash，这个版本才算导入完成
+                stale_ids = [row_id for ids in existing.values() for row_id in ids]
+                if stale_ids or replaced_ids:
+                    await self._milvus_call(self.milvus.collection.delete, f"id in {stale_ids + replaced_ids}")
+            except Exception:
+                await self._rollback_upsert(source, pipeline.inserted_ids + rewritten_ids, bm25_replaced)
+                raise
+
+            logger.info(
+                f"来源 {source} 增量更新完成：新增 {added}，删除 {len(stale_ids)}，未变化 {unchanged}"
+            )
+            return {
+                "status": "success",
+                "added": added,
+                "deleted": len(stale_ids),
+                "unchanged": unchanged,
+            }
+        except Exception as e:
+            logger.error(f"增量更新来源 {source} 失败: {str(e)}")
+            raise Exception(f"增量更新来源 {source} 失败: {str(e)}")
 
     async def delete_by_source(self, source: str) -> None:
         """
@@ -223,10 +596,12 @@ class VectorStore:
         """
         try:
             # 先查询出所有匹配的文档 ID
-            expr = f"metadata['source'] == '{source}'"
+            # v2 schema 上 source 是带倒排索引的标量列，不再扫描 JSON
+            expr = milvus_source_expr(source, getattr(self.milvus, "scalar_fields", None))
 
             # 查询匹配的文档
-            results = self.milvus.collection.query(
+            results = await self._milvus_call(
+                self.milvus.collection.query,
                 expr=expr,
                 output_fields=["id"]
             )
@@ -240,15 +615,134 @@ class VectorStore:
 
             # 按 ID 删除
             delete_expr = f"id in {ids}"
-            self.milvus.collection.delete(delete_expr)
+            await self._milvus_call(self.milvus.collection.delete, delete_expr)
 
-            # 新增：同步删除 all_chunks 并重建 BM25 索引
-            self.all_chunks = [c for c in self.all_chunks if c.get("metadata", {}).get("source") != source]
-            if self.enable_hybrid and self.bm25_retriever is not None:
-                self.bm25_retriever.index(self.all_chunks)
+            # 同步从 BM25 索引中移除该来源，无需重建
+            if self.bm25_retriever is not None:
+                self.bm25_retriever.remove_source(source)
 
             logger.info(f"已删除来源为 {source} 的 {len(ids)} 个文档")
 
         except Exception as e:
             logger.error(f"删除文档失败: {str(e)}")
             raise Exception(f"删除文档失败: {str(e)}")
+
+
+class InsertPipeline:
+    """
+    embedding 与 Milvus 写入重叠的流水线：第 k 批写入 Milvus 的同时计算第 k+1 批的 embedding。
+    最多一个写入在途，批次按提交顺序落库；结束时调用 drain() 等待最后一批写完。
+    """
+
+    def __init__(self, vector_store: VectorStore, index_bm25: bool = True):
+        self.vector_store = vector_store
+        self.index_bm25 = index_bm25
+        self._pending: Optional[asyncio.Task] = None
+        # 已落库的主键，调用方出错时据此回滚
+        self.inserted_ids: List[int] = []
+
+    async def submit(self, chunks: List[Dict]) -> None:
+        try:
+            vectors = await self.vector_store._embed_chunks(chunks)
+        finally:
+            # 不论本批 embedding 是否成功，上一批的写入都要等它落完
+            await self.drain()
+        self._pending = asyncio.create_task(self._write(chunks, vectors))
+
+    async def _write(self, chunks: List[Dict], vectors: np.ndarray) -> None:
+        self.inserted_ids.extend(
+            await self.vector_store._write_chunks(chunks, vectors, index_bm25=self.index_bm25)
+        )
+
+    async def drain(self) -> None:
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            await pending
+
+    async def abort(self) -> None:
+        """出错退出时调用：等待在途写入结束但不再抛出它的异常，避免掩盖原始错误。"""
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        try:
+            await pending
+        except Exception as e:
+            logger.warning(f"中断时在途的写入失败: {str(e)}")
+
+
+class BulkIngestSession:
+    """
+    跨文档缓冲 chunk，攒满 batch_size 才写一次 Milvus，全部结束后统一 flush 一次，
+    并统计持续写入速率（chunks/s）。
+
+    用法：
+        async with vector_store.bulk_ingest() as bulk:
+            await bulk.add(chunks)
+        bulk.stats()
+    """
+
+    def __init__(self, vector_store: VectorStore, batch_size: int):
+        self.vector_store = vector_store
+        self.batch_size = batch_size
+        self._buffer: List[Dict] = []
+        self.written = 0
+        self.batches = 0
+        self._started = time.perf_counter()
+        self._elapsed: Optional[float] = None
+        self._pipeline = InsertPipeline(vector_store)
+
+    async def __aenter__(self) -> "BulkIngestSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.finish()
+        elif self.written:
+            # 出错时不再写剩余缓冲，但已写入的部分仍 flush 掉
+            try:
+                await self._pipeline.drain()
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"[bulk_ingest] 最后一批写入失败: {e}")
+            await self.vector_store._milvus_call(self.vector_store.milvus.collection.flush)
+
+    async def add(self, chunks: List[Dict]) -> None:
+        self._buffer.extend(chunks)
+        while len(self._buffer) >= self.batch_size:
+            batch = self._buffer[:self.batch_size]
+            self._buffer = self._buffer[self.batch_size:]
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict]) -> None:
+        # embedding 完成即返回，写入与下一批 embedding 重叠进行
+        await self._pipeline.submit(batch)
+        self.written += len(batch)
+        self.batches += 1
+        elapsed = time.perf_counter() - self._started
+        logger.info(
+            f"[bulk_ingest] 已写入 {self.written} 个 chunks（{self.batches} 批），"
+            f"{self.written / elapsed:.1f} chunks/s"
+        )
+
+    async def finish(self) -> Dict:
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            await self._write(batch)
+        await self._pipeline.drain()
+        if self.written:
+            await self.vector_store._milvus_call(self.vector_store.milvus.collection.flush)
+        self._elapsed = time.perf_counter() - self._started
+        stats = self.stats()
+        logger.info(
+            f"[bulk_ingest] 完成：{stats['chunks']} 个 chunks，{stats['batches']} 批，"
+            f"耗时 {stats['seconds']:.2f}s，{stats['chunks_per_sec']:.1f} chunks/s"
+        )
+        return stats
+
+    def stats(self) -> Dict:
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        return {
+            "chunks": self.written,
+            "batches": self.batches,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(self.written / elapsed, 1) if elapsed > 0 else 0.0,
+        }
@@ -1,5 +1,6 @@
 # 上传相关数据模型
 # TODO: 任务 13.1 - 定义 UploadResponse 模型
+from typing import Dict, Optional
 from pydantic import BaseModel,Field
 class UploadResponse(BaseModel):
     """
@@ -8,11 +9,34 @@ class UploadResponse(BaseModel):
     Example:
         {
             "filename": "document.txt",
-            "chunks": 5,
-            "status": "success"
+            "chunks": 0,
+            "status": "queued",
+            "job_id": "3f2c..."
         }
     """
 
     filename: str = Field(..., description="上传的文件名")
     chunks: int = Field(..., description="文档切分的 chunk 数量")
-    status: str = Field(..., description="处理状态: success 或 failed")
+    status: str = Field(..., description="处理状态: queued / success / failed / skipped")
+    job_id: Optional[str] = Field(None, description="后台导入任务 ID，用于查询进度")
+    file_hash: Optional[str] = Field(None, description="文件内容 sha256")
+
+
+class IngestionJobResponse(BaseModel):
+    """后台导入任务状态"""
+
+    job_id: str
+    filename: str
+    title: str = ""
+    file_hash: Optional[str] = None
+    status: str = Field(..., description="queued / parsing / indexing / success / failed / skipped")
+    chunks_total: int = 0
+    chunks_indexed: int = 0
+    chunks_added: int = Field(0, description="新增或修改后需要重新 embedding 的 chunk 数")
+    chunks_deleted: int = Field(0, description="删除的过期 chunk 数")
+    progress: float = Field(0.0, description="已写入 chunk 比例，0~1")
+    token_stats: Optional[Dict] = Field(None, description="chunk token 数分布：chunks / mean / p50 / p95 / max / histogram")
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from langchain.tools import tool
 from langchain_community.chat_models import ChatTongyi
 from loguru import logger
@@ -8,6 +10,7 @@ from app.agents.tools.internal_docs_tool import create_docs_tool
 from app.agents.tools.log_tool import query_log
 from app.agents.tools.prometheus_tool import query_prometheus_alerts
 from app.clients.milvus_client import MilvusClient
+from app.core.dependencies import AppResources
 from app.core.settings import Settings
 from app.rag.embeddings import EmbeddingService
 from app.rag.vector_store import VectorStore
@@ -17,9 +20,11 @@ from app.services.rag_service import RAGService
 class AIOpsService:
     """AIOps service that wraps the AIOps agent and its tools."""
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, resources: Optional[AppResources] = None):
         self.settings = settings
+        self.resources = resources
         self.rag_service = None
+        self.vector_store = None
         self._docs_ready = False
 
         @tool
@@ -27,21 +32,25 @@ class AIOpsService:
             """Query the internal document knowledge base."""
             return "知识库当前不可用。请确认 Milvus 已启动并且已上传文档。"
 
-        try:
-            self.milvus_client = MilvusClient(settings)
-            self.embedding_service = EmbeddingService(settings)
-            self.vector_store = VectorStore(self.milvus_client, self.embedding_service)
-            self.rag_service = self._build_rag_service()
-
-            @tool
-            async def docs_tool(query: str) -> str:
-                """Query the internal document knowledge base."""
-                return "知识库尚未完成初始化。请先确认 Milvus 已启动，然后重试。"
-
-            logger.info("Document retrieval dependencies initialized")
-        except Exception as e:
-            logger.warning(f"Document retrieval initialization failed: {e}")
-            logger.warning("AIOps can continue, but internal docs search is unavailable")
+        if resources is not None:
+            # 检索依赖由应用级资源容器提供，在 _ensure_docs_tool 中按需取用。
+            self.milvus_client = resources.milvus_client
+        else:
+            try:
+                self.milvus_client = MilvusClient(settings)
+                self.embedding_service = EmbeddingService(settings)
+                self.vector_store = VectorStore(self.milvus_client, self.embedding_service)
+                self.rag_service = self._build_rag_service()
+
+                @tool
+                async def docs_tool(query: str) -> str:
+                    """Query the internal document knowledge base."""
+                    return "知识库尚未完成初始化。请先确认 Milvus 已启动，然后重试。"
+
+                logger.info("Document retrieval dependencies initialized")
+            except Exception as e:
+                logger.warning(f"Document retrieval initialization failed: {e}")
+                logger.warning("AIOps can continue, but internal docs search is unavailable")
 
         self.tools = [
             query_prometheus_alerts,
@@ -76,8 +85,12 @@ class AIOpsService:
 
 
     async def _ensure_docs_tool(self):
-        await self.milvus_client.connect()
-        await self.milvus_client.ensure_collection()
+        if self.resources is not None:
+            self.rag_service = await self.resources.get_aiops_rag_service()
+            self.vector_store = self.resources.vector_store
+        else:
+            await self.milvus_client.connect()
+            await self.milvus_client.ensure_collection()
 
         if self._docs_ready:
             return
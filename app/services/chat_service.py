@@ -1,3 +1,5 @@
+from typing import Optional
+
 from langchain_community.chat_models import ChatTongyi
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from loguru import logger
@@ -8,32 +10,39 @@ from app.agents.tools.internal_docs_tool import create_docs_tool
 from app.agents.tools.log_tool import query_log
 from app.agents.tools.prometheus_tool import query_prometheus_alerts
 from app.agents.tools.tavily_tool import create_tavily_search_tool
-from app.clients.milvus_client import MilvusClient
+from app.core.dependencies import AppResources
 from app.core.settings import Settings
-from app.rag.embeddings import EmbeddingService
-from app.rag.reranker import BGEReranker
-from app.rag.vector_store import VectorStore
-from app.services.rag_service import RAGService
 from app.services.session_store import SessionStore
 
 
 class ChatService:
-    def __init__(self, settings: Settings, session_store: SessionStore):
+    def __init__(
+        self,
+        settings: Settings,
+        session_store: SessionStore,
+        resources: Optional[AppResources] = None,
+    ):
         self.settings = settings
         self.session_store = session_store
-        self.llm = ChatTongyi(
-            dashscope_api_key=settings.dashscope_api_key,
-            model_name=settings.chat_model,
-            streaming=True,
-        )
-        self.summary_llm = ChatTongyi(
-            dashscope_api_key=settings.dashscope_api_key,
-            model_name=settings.chat_model,
-            streaming=False,
-            temperature=0.0,
-        )
+        self.resources = resources
         self.rag_service = None
         self.chat_agent = None
+        if resources is not None:
+            # 复用应用级 LLM 客户端，避免每个请求重复构建。
+            self.llm = resources.chat_llm
+            self.summary_llm = resources.summary_llm
+        else:
+            self.llm = ChatTongyi(
+                dashscope_api_key=settings.dashscope_api_key,
+                model_name=settings.chat_model,
+                streaming=True,
+            )
+            self.summary_llm = ChatTongyi(
+                dashscope_api_key=settings.dashscope_api_key,
+                model_name=settings.chat_model,
+                streaming=False,
+                temperature=0.0,
+            )
 
     def _get_session_summary(self, session_id: str) -> str:
         get_summary = getattr(self.session_store, "get_summary", None)
@@ -164,46 +173,10 @@ class ChatService:
 
         try:
             logger.info("开始初始化 RAG 服务...")
-
-            logger.info("Step 1: 创建 MilvusClient")
-            milvus_client = MilvusClient(self.settings)
-
-            logger.info("Step 2: 连接 Milvus")
-            await milvus_client.connect()
-
-            logger.info("Step 3: 确保 collection 存在")
-            await milvus_client.ensure_collection()
-
-            logger.info("Step 4: 创建 EmbeddingService")
-            embedding_service = EmbeddingService(self.settings)
-
-            logger.info("Step 4.5: 创建 BGE Reranker")
-            try:
-                reranker = BGEReranker("BAAI/bge-reranker-base")
-            except Exception as e:  # noqa: BLE001
-                logger.warning(f"BGE Reranker 初始化失败，回退到 LLM 重排: {e}")
-                reranker = None
-
-            reranker_llm = ChatTongyi(
-                dashscope_api_key=self.settings.dashscope_api_key,
-                model_name="qwen-turbo",
-                streaming=False,
-                temperature=0.0,
-            )
-
-            logger.info("Step 5: 创建 VectorStore")
-            vector_store = VectorStore(
-                milvus_client,
-                embedding_service,
-                reranker_llm=reranker_llm,
-                reranker=reranker,
-                dense_top_k=10,
-                enable_rerank=True,
-            )
-
-            logger.info("Step 6: 创建 RAGService")
-            self.rag_service = RAGService(vector_store, self.llm)
-
+            if self.resources is None:
+                # 脚本等未走 lifespan 的场景，退化为当前实例私有的资源容器。
+                self.resources = AppResources(self.settings)
+            self.rag_service = await self.resources.get_rag_service()
             logger.info("RAG 服务初始化完成")
         except Exception as e:  # noqa: BLE001
             logger.error(f"RAG 服务初始化失败: {str(e)}")
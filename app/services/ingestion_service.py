@@ -0,0 +1,292 @@
+# 后台文档导入任务队列
+# 上传接口只负责落盘和登记任务，立即返回 job_id；加载/切分/向量化/写入在后台完成。
+# 两级流水线：解析 worker（加载 + 切分，CPU 密集，放解析进程池里）-> 有界队列 -> 索引 worker（embedding + 写入），
+# 一个文档在做 embedding 时，下一个文档已经在解析。
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from app.core.settings import Settings
+from app.rag.chunking import DocumentChunker, get_strategy_by_filename
+from app.rag.document_parser import (
+    DeadlineChunkStream,
+    DocumentParsePool,
+    build_document_chunks,
+    chunker_options,
+    iter_document_chunks,
+)
+from app.rag.tokenization import summarize_token_counts
+from app.rag.vector_store import VectorStore
+
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    filename: str
+    file_path: str
+    title: str = ""
+    file_hash: Optional[str] = None
+    # 上传先落到任务独占的暂存路径（file_path），任务成功 / 跳过后才替换到 final_path
+    final_path: Optional[str] = None
+    # queued -> parsing -> indexing -> success / failed；内容未变化时为 skipped
+    status: str = "queued"
+    chunks_total: int = 0
+    chunks_indexed: int = 0
+    # 增量更新结果：新增（需要 embedding）/ 删除的 chunk 数
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+    # chunk token 数分布（均值 / 分位数 / 直方图），流式导入时为空
+    token_stats: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("success", "failed", "skipped")
+
+    def progress(self) -> float:
+        if self.status in ("success", "skipped"):
+            return 1.0
+        if not self.chunks_total:
+            return 0.0
+        return round(self.chunks_indexed / self.chunks_total, 4)
+
+    def skip(self) -> None:
+        self.status = "skipped"
+        self.finished_at = time.time()
+
+    def fail(self, error: str) -> None:
+        self.status = "failed"
+        self.error = error
+        self.finished_at = time.time()
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data.pop("file_path")
+        data.pop("final_path")
+        data["progress"] = self.progress()
+        return data
+
+
+class IngestionJobQueue:
+    """进程内导入任务队列，worker 在首次提交任务时启动。"""
+
+    def __init__(
+        self,
+        settings: Settings,
+        vector_store_provider: Callable[[], Awaitable[VectorStore]],
+        max_finished_jobs: int = 1000,
+        parse_pool: Optional[DocumentParsePool] = None,
+    ):
+        self.settings = settings
+        self.vector_store_provider = vector_store_provider
+        # 未提供进程池时退回线程内解析
+        self.parse_pool = parse_pool
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._pending: Optional[asyncio.Queue] = None
+        self._parsed: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # 同一来源的任务串行执行：锁从跳过判断开始持有到写入结束，[锁, 等待/持有的任务数]
+        self._source_locks: Dict[str, list] = {}
+        self._holding: Dict[str, str] = {}
+
+    def _ensure_started(self) -> None:
+        if self._workers:
+            return
+        workers = max(1, self.settings.ingest_workers)
+        self._pending = asyncio.Queue()
+        # 背压：解析好的文档最多积压 workers 个，避免大文件把 chunk 全堆在内存里
+        self._parsed = asyncio.Queue(maxsize=workers)
+        self._workers = [asyncio.create_task(self._parse_worker()) for _ in range(workers)]
+        self._workers += [asyncio.create_task(self._index_worker()) for _ in range(workers)]
+        logger.info(f"导入任务队列已启动：{workers} 个解析 worker，{workers} 个索引 worker")
+
+    def submit(
+        self,
+        file_path: str,
+        filename: str,
+        title: str = "",
+        file_hash: Optional[str] = None,
+        final_path: Optional[str] = None,
+        job_id: Optional[str] = None,
+    ) -> IngestionJob:
+        self._ensure_started()
+        job = IngestionJob(
+            job_id=job_id or uuid.uuid4().hex,
+            filename=filename,
+            file_path=file_path,
+            title=title,
+            file_hash=file_hash,
+            final_path=final_path,
+        )
+        self.jobs[job.job_id] = job
+        self._evict_finished()
+        self._pending.put_nowait(job)
+        logger.info(f"导入任务已提交: job_id={job.job_id} file={filename}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def _evict_finished(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    async def _acquire_source(self, job: IngestionJob) -> None:
+        entry = self._source_locks.setdefault(job.filename, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._drop_source_entry(job.filename, entry)
+            raise
+        self._holding[job.job_id] = job.filename
+
+    def _drop_source_entry(self, source: str, entry: list) -> None:
+        entry[1] -= 1
+        if not entry[1]:
+            del self._source_locks[source]
+
+    def _finish(self, job: IngestionJob) -> None:
+        """任务结束（成功 / 跳过 / 失败）：处理暂存文件并释放来源锁，同一任务只生效一次。"""
+        if job.final_path and os.path.exists(job.file_path):
+            try:
+                if job.status in ("success", "skipped"):
+                    os.replace(job.file_path, job.final_path)
+                else:
+                    os.remove(job.file_path)
+            except OSError as e:
+                logger.warning(f"处理上传暂存文件失败: job_id={job.job_id} path={job.file_path} error={e}")
+        source = self._holding.pop(job.job_id, None)
+        if source is not None:
+            entry = self._source_locks[source]
+            entry[0].release()
+            self._drop_source_entry(source, entry)
+
+    def _new_chunker(self, job: IngestionJob) -> DocumentChunker:
+        return DocumentChunker(
+            strategy=get_strategy_by_filename(job.filename), **chunker_options(self.settings)
+        )
+
+    def _build_chunks(self, job: IngestionJob) -> List[Dict]:
+        return build_document_chunks(
+            self._new_chunker(job), job.file_path, job.filename, job.title, file_hash=job.file_hash
+        )
+
+    async def _parse(self, job: IngestionJob) -> Iterable[Dict]:
+        if os.path.getsize(job.file_path) >= self.settings.ingest_stream_min_bytes:
+            # 超大文件不在解析阶段物化成列表，交给索引 worker 边加载切分边按批写入，内存与文件大小无关。
+            # 不经过解析进程池，用与进程池相同的解析时限兜底（只计加载 / 切分耗时）
+            chunks = iter_document_chunks(
+                self._new_chunker(job), job.file_path, job.filename, job.title, file_hash=job.file_hash
+            )
+            timeout = self.settings.parse_timeout_seconds
+            return DeadlineChunkStream(chunks, timeout, job.filename) if timeout > 0 else chunks
+        if self.parse_pool is None:
+            return await asyncio.to_thread(self._build_chunks, job)
+        return await self.parse_pool.build_chunks(
+            job.file_path,
+            job.filename,
+            job.title,
+            file_hash=job.file_hash,
+            chunker_options=chunker_options(self.settings),
+        )
+
+    async def _parse_worker(self) -> None:
+        while True:
+            job = await self._pending.get()
+            handed_off = False
+            try:
+                # 同一来源的前一个任务写完之前不做跳过判断和解析，避免并发 upsert 写出重复 chunk
+                await self._acquire_source(job)
+                job.status = "parsing"
+                job.started_at = time.time()
+                # 同一文件重复上传：解析之前就能判断并跳过
+                if job.file_hash:
+                    vector_store = await self.vector_store_provider()
+                    if await vector_store.source_file_hash(job.filename) == job.file_hash:
+                        logger.info(f"导入任务跳过（文件未变化）: job_id={job.job_id} file={job.filename}")
+                        job.skip()
+                        continue
+                chunks = await self._parse(job)
+                if isinstance(chunks, list):
+                    if not chunks:
+                        job.fail("文件为空或切分后无内容")
+                        continue
+                    job.chunks_total = len(chunks)
+                    job.token_stats = summarize_token_counts(
+                        chunk["metadata"].get("token_count", 0) for chunk in chunks
+                    )
+                    logger.info(f"导入任务切分完成: job_id={job.job_id} tokens={job.token_stats}")
+                await self._parsed.put((job, chunks))
+                handed_off = True
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"导入任务解析失败: job_id={job.job_id} file={job.filename} error={e}")
+                job.fail(f"解析失败: {e}")
+            finally:
+                if not handed_off:
+                    self._finish(job)
+                self._pending.task_done()
+
+    async def _index_worker(self) -> None:
+        while True:
+            job, chunks = await self._parsed.get()
+            try:
+                job.status = "indexing"
+                vector_store = await self.vector_store_provider()
+
+                def on_progress(n: int) -> None:
+                    job.chunks_indexed += n
+
+                # 按内容 hash 增量更新：只对变化的 chunk 做 embedding，逐批回报进度
+                result = await vector_store.upsert_source(
+                    job.filename, chunks, file_hash=job.file_hash, on_progress=on_progress
+                )
+                if result["status"] == "skipped":
+                    job.skip()
+                    continue
+                if result["status"] == "empty":
+                    job.fail("文件为空或切分后无内容")
+                    continue
+                job.chunks_added = result["added"]
+                job.chunks_deleted = result["deleted"]
+                # 流式导入事先不知道总数，完成后补上
+                job.chunks_total = result["added"] + result["unchanged"]
+                job.status = "success"
+                job.finished_at = time.time()
+                logger.info(
+                    f"导入任务完成: job_id={job.job_id} file={job.filename} "
+                    f"chunks={job.chunks_total} 耗时 {job.finished_at - job.started_at:.2f}s"
+                )
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"导入任务写入失败: job_id={job.job_id} file={job.filename} error={e}")
+                job.fail(f"索引失败: {e}")
+            finally:
+                # 流式导入中途失败时生成器还开着文件，先关掉再处理暂存文件
+                if hasattr(chunks, "close"):
+                    chunks.close()
+                self._finish(job)
+                self._parsed.task_done()
+
+    async def join(self) -> None:
+        """等待当前所有任务处理完（测试与批量脚本使用）。"""
+        if not self._workers:
+            return
+        await self._pending.join()
+        await self._parsed.join()
+
+    async def shutdown(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -1,9 +1,11 @@
+import asyncio
 from typing import Dict, List, Optional
 
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from loguru import logger
 
+from app.rag.fusion import rrf_fuse
 from app.rag.query_rewriter import QueryRewriter
 
 
@@ -79,20 +81,26 @@ class RAGService:
             summary=session_summary,
         )
 
-        all_docs = []
-        seen_content = set()
-        for q in queries:
-            docs = await self.vector_store.search(
-                q,
+        search_many = getattr(self.vector_store, "search_many", None)
+        if callable(search_many):
+            # 一次批量 embedding + 一次多向量检索，融合后只重排一次
+            return await search_many(
+                queries,
                 top_k=top_k,
                 metadata_filters=metadata_filters,
             )
-            for doc in docs:
-                content_key = doc.get("content", "")[:100]
-                if content_key not in seen_content:
-                    all_docs.append(doc)
-                    seen_content.add(content_key)
-        return all_docs[:top_k]
+
+        results = await asyncio.gather(
+            *(
+                self.vector_store.search(
+                    q,
+                    top_k=top_k,
+                    metadata_filters=metadata_filters,
+                )
+                for q in queries
+            )
+        )
+        return rrf_fuse(results, top_k=top_k)
 
     def format_docs(self, docs: List[Dict]) -> str:
         if not docs:
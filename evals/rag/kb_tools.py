@@ -1,16 +1,19 @@
+import asyncio
 import json
+from collections import deque
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, List, Optional, Tuple
 
 from loguru import logger
-from pymilvus import utility
+from pymilvus import Collection, utility
 
-from app.clients.milvus_client import MilvusClient
+from app.clients.milvus_client import SCALAR_FIELD_SPECS, MilvusClient
 from app.core.settings import Settings, get_settings
-from app.rag.chunking import DocumentChunker, get_strategy_by_filename
+from app.rag.document_parser import DocumentParsePool, chunker_options
 from app.rag.embeddings import EmbeddingService
-from app.rag.vector_store import VectorStore
-from app.services.vector_index_service import VectorIndexService
+from app.rag.metadata_filters import compute_file_hash
+from app.rag.tokenization import summarize_token_counts
+from app.rag.vector_store import VectorStore, to_milvus_row
 
 
 # 统一从仓库根目录定位测试文档，避免依赖当前命令执行位置。
@@ -84,31 +87,80 @@ async def batch_index_documents(settings: Settings, doc_paths: Iterable[Path]) -
 
     embedding_service = EmbeddingService(settings)
     vector_store = VectorStore(milvus_client, embedding_service)
+    parse_pool = DocumentParsePool(
+        max_workers=settings.parse_workers,
+        timeout=settings.parse_timeout_seconds,
+        pdf_parallel_min_pages=settings.pdf_parallel_min_pages,
+        pdf_pages_per_task=settings.pdf_pages_per_task,
+    )
+    # 每个文件按现有规则自动选择分块策略，切分参数与上传链路一致。
+    options = chunker_options(settings)
 
     results = []
     total_chunks = 0
+    token_counts: List[int] = []
 
-    try:
-        for path in doc_paths:
-            # 每个文件按现有规则自动选择分块策略，避免和上传链路行为不一致。
-            chunker = DocumentChunker(
-                strategy=get_strategy_by_filename(path.name),
-                max_size=settings.doc_chunk_max_size,
-                overlap=settings.doc_chunk_overlap,
-            )
-            index_service = VectorIndexService(chunker, vector_store)
-            result = await index_service.index_document(
-                file_path=str(path),
-                filename=path.name,
-                title=path.stem,
+    async def parse(path: Path) -> Optional[Tuple[str, bool, List[dict]]]:
+        """返回 (file_hash, 来源是否已存在, chunks)；整文件未变化时返回 None，不再解析。"""
+        try:
+            file_hash = compute_file_hash(str(path))
+            exists = await vector_store.source_exists(path.name)
+            if exists and await vector_store.source_file_hash(path.name) == file_hash:
+                return None
+            chunks = await parse_pool.build_chunks(
+                str(path),
+                path.name,
+                path.stem,
+                file_hash=file_hash,
+                chunker_options=options,
             )
-            results.append(result)
-            total_chunks += result.get("chunks", 0)
+            return file_hash, exists, chunks
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"解析文档 {path.name} 失败: {e}")
+            return "", False, []
+
+    async def write(path: Path, task: "asyncio.Task") -> None:
+        nonlocal total_chunks
+        parsed = await task
+        if parsed is None:
+            logger.info(f"文档 {path.name} 内容未变化，跳过导入")
+            results.append({"filename": path.name, "chunks": 0, "status": "skipped"})
+            return
+        file_hash, exists, chunks = parsed
+        status = "success" if chunks else "failed"
+        if chunks and exists:
+            # 已导入过的来源与上传链路一致走增量更新：只对变化的 chunk 做 embedding，过期的删除，不会重复追加
+            try:
+                await vector_store.upsert_source(path.name, chunks, file_hash=file_hash)
+            except Exception as e:  # noqa: BLE001
+                logger.error(f"增量更新文档 {path.name} 失败: {e}")
+                status = "failed"
+        elif chunks:
+            # 新来源没有旧 chunk 可比对，直接进跨文件缓冲批量写入
+            await bulk.add(chunks)
+        if status == "success":
+            total_chunks += len(chunks)
+            token_counts.extend(chunk["metadata"]["token_count"] for chunk in chunks)
+        results.append({"filename": path.name, "chunks": len(chunks), "status": status})
+
+    try:
+        # 跨文件缓冲、按批写入，整批导入结束才 flush 一次；
+        # 文件在解析进程池里并行切分，最多预取 max_workers 个，按提交顺序写入
+        async with vector_store.bulk_ingest(batch_size=settings.ingest_batch_size) as bulk:
+            pending: deque = deque()
+            for path in doc_paths:
+                pending.append((path, asyncio.create_task(parse(path))))
+                if len(pending) > parse_pool.max_workers:
+                    await write(*pending.popleft())
+            while pending:
+                await write(*pending.popleft())
     finally:
+        parse_pool.shutdown()
         await milvus_client.close()
 
     success_count = sum(1 for item in results if item.get("status") == "success")
-    failed_count = len(results) - success_count
+    skipped_count = sum(1 for item in results if item.get("status") == "skipped")
+    failed_count = len(results) - success_count - skipped_count
 
     return {
         "collection": settings.milvus_collection,
@@ -116,11 +168,111 @@ async def batch_index_documents(settings: Settings, doc_paths: Iterable[Path]) -
         "embedding_model": settings.embedding_model,
         "indexed_files": len(results),
         "success_count": success_count,
+        "skipped_count": skipped_count,
         "failed_count": failed_count,
         "total_chunks": total_chunks,
+        "ingest": bulk.stats(),
+        "chunk_tokens": summarize_token_counts(token_counts),
         "results": results,
     }
 
 
+async def migrate_collection_schema(
+    settings: Settings,
+    batch_size: int = 1000,
+    swap: bool = True,
+) -> dict:
+    """
+    把 v1 collection（只有 JSON metadata）复制到 v2 schema（标量列 + 标量索引）。
+
+    向量直接从旧 collection 读出，不重新调用 embedding。swap=True 时复制完成后
+    旧 collection 重命名为 <name>_v1_backup，新 collection 接管原名字；确认无误后可手动删除备份。
+    """
+    source_name = settings.milvus_collection
+    target_name = f"{source_name}_v2"
+    backup_name = f"{source_name}_v1_backup"
+
+    source_client = MilvusClient(settings)
+    await source_client.connect()
+    target_client: Optional[MilvusClient] = None
+    try:
+        await source_client.ensure_collection()
+        if source_client.scalar_fields >= set(SCALAR_FIELD_SPECS):
+            logger.info(f"collection {source_name} 已是 v2 schema，无需迁移")
+            return {"collection": source_name, "status": "skipped", "copied": 0}
+
+        # 上次中断留下的半成品直接丢弃，从头复制
+        if utility.has_collection(target_name):
+            utility.drop_collection(target_name)
+        target_client = MilvusClient(settings, collection_name=target_name)
+        await target_client.create_collection(schema_version=2)
+        scalar_fields = target_client.scalar_fields
+
+        iterator = source_client.collection.query_iterator(
+            batch_size=batch_size,
+            output_fields=["vector", "content", "metadata"],
+        )
+        copied = 0
+        try:
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    break
+                rows = [
+                    to_milvus_row(row["vector"], row.get("content", ""), row.get("metadata"), scalar_fields)
+                    for row in batch
+                ]
+                target_client.collection.insert(rows)
+                copied += len(rows)
+                logger.info(f"已复制 {copied} 条到 {target_name}")
+        finally:
+            iterator.close()
+        target_client.collection.flush()
+
+        source_count = source_client.collection.query(expr="", output_fields=["count(*)"])[0]["count(*)"]
+        if copied != source_count:
+            raise RuntimeError(f"迁移条数不一致：源 {source_count}，已复制 {copied}，未切换 collection")
+
+        if swap:
+            if utility.has_collection(backup_name):
+                raise RuntimeError(f"备份 collection {backup_name} 已存在，请先确认并删除后再切换")
+            source_client.collection.release()
+            utility.rename_collection(source_name, backup_name)
+            utility.rename_collection(target_name, source_name)
+            Collection(source_name).load()
+            logger.info(f"已切换：{source_name} -> {backup_name}，{target_name} -> {source_name}")
+
+        return {
+            "collection": source_name,
+            "target": source_name if swap else target_name,
+            "backup": backup_name if swap else None,
+            "status": "success",
+            "copied": copied,
+        }
+    finally:
+        # 两个客户端共用同一个连接别名，各自的 Milvus I/O 线程池都要关掉
+        if target_client is not None:
+            await target_client.close()
+        await source_client.close()
+
+
+async def rebuild_vector_index(settings: Settings, index_type: Optional[str] = None) -> dict:
+    """按 Settings（或显式指定的类型）原地重建向量索引，不重新 embedding。"""
+    milvus_client = MilvusClient(settings)
+    await milvus_client.connect()
+    try:
+        await milvus_client.ensure_collection()
+        previous = milvus_client.index_type
+        result = await milvus_client.rebuild_vector_index(index_type)
+        return {
+            "collection": settings.milvus_collection,
+            "previous_index_type": previous,
+            "status": "success",
+            **result,
+        }
+    finally:
+        await milvus_client.close()
+
+
 def to_pretty_json(data: dict) -> str:
     return json.dumps(data, ensure_ascii=False, indent=2)
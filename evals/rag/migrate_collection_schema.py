@@ -0,0 +1,22 @@
+import argparse
+import asyncio
+
+from evals.rag.kb_tools import load_settings, migrate_collection_schema, to_pretty_json
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="把当前知识库 collection 迁移到 v2 schema")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-swap", action="store_true", help="只复制到 <name>_v2，不切换原名字")
+    args = parser.parse_args()
+
+    result = await migrate_collection_schema(
+        load_settings(),
+        batch_size=args.batch_size,
+        swap=not args.no_swap,
+    )
+    print(to_pretty_json(result))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+import argparse
+import asyncio
+
+from app.clients.milvus_client import VECTOR_INDEX_TYPES
+from evals.rag.kb_tools import load_settings, rebuild_vector_index, to_pretty_json
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="重建当前知识库 collection 的向量索引")
+    parser.add_argument(
+        "--index-type",
+        choices=VECTOR_INDEX_TYPES,
+        default=None,
+        help="不指定时使用 Settings.milvus_index_type",
+    )
+    args = parser.parse_args()
+
+    result = await rebuild_vector_index(load_settings(), index_type=args.index_type)
+    print(to_pretty_json(result))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
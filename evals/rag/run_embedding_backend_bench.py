@@ -0,0 +1,176 @@
+import argparse
+import time
+from statistics import mean
+from typing import Dict, List
+
+import numpy as np
+from loguru import logger
+
+from app.core.settings import get_settings
+from app.rag.bge_embeddings import BGELocalEmbeddings
+from app.rag.chunking import DocumentChunker, get_strategy_by_filename
+from app.rag.document_parser import build_document_chunks, chunker_options
+from app.rag.onnx_embeddings import ONNXLocalEmbeddings
+from evals.rag.common import load_json, save_json
+from evals.rag.kb_tools import collect_test_documents
+from evals.rag.metrics import hit_at_k, mrr, ndcg_at_k, recall_at_k
+
+
+# 本地 embedding 后端对比：FlagModel(PyTorch fp32，到达顺序 / 长度分桶组批) vs ONNX Runtime fp32 vs ONNX Runtime 动态 int8。
+# 不经过 Milvus / BM25 / rerank，向量在内存里做精确内积检索，只比较 embedding 本身的吞吐和检索质量。
+RETRIEVAL_DATASET_PATH = "evals/rag/datasets/rag_retrieval_cases.json"
+REPORT_PATH = "evals/rag/reports/embedding_backend_bench_latest.json"
+DEFAULT_MODEL = "bge-large-zh"
+
+
+class ArrivalOrderBGE:
+    """按到达顺序固定 32 条一批编码（分桶组批之前的做法），作为长度分桶的对照。"""
+
+    def __init__(self, model: str):
+        self.inner = BGELocalEmbeddings(model_name=model, device="cpu")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.inner.model.encode(list(texts), batch_size=32, max_length=512)
+        return np.atleast_2d(vectors).astype(np.float32, copy=False)
+
+
+def build_backends(model: str, threads: int) -> Dict:
+    # 第一个后端作为基准，其余后端与它计算向量余弦一致度
+    return {
+        "flagmodel-fp32-arrival": lambda: ArrivalOrderBGE(model),
+        "flagmodel-fp32": lambda: BGELocalEmbeddings(model_name=model, device="cpu"),
+        "onnx-fp32": lambda: ONNXLocalEmbeddings(model_name=model, quantize=False, threads=threads),
+        "onnx-int8": lambda: ONNXLocalEmbeddings(model_name=model, quantize=True, threads=threads),
+    }
+
+
+def load_corpus(settings) -> List[Dict]:
+    chunks: List[Dict] = []
+    for path in collect_test_documents():
+        chunker = DocumentChunker(strategy=get_strategy_by_filename(path.name), **chunker_options(settings))
+        chunks.extend(build_document_chunks(chunker, str(path), path.name, title=path.stem))
+    return chunks
+
+
+def retrieve_sources(doc_vectors: np.ndarray, query_vectors: np.ndarray, sources: List[str], top_k: int) -> List[List[str]]:
+    """向量已 L2 归一化，内积即余弦；按 chunk 排序后按来源去重。"""
+    scores = query_vectors @ doc_vectors.T
+    ranked = []
+    for row in scores:
+        pred: List[str] = []
+        for index in np.argsort(-row):
+            source = sources[index]
+            if source not in pred:
+                pred.append(source)
+            if len(pred) >= top_k:
+                break
+        ranked.append(pred)
+    return ranked
+
+
+def evaluate(pred_lists: List[List[str]], cases: List[Dict]) -> Dict:
+    h1, h3, r3, mrr_list, ndcg3 = [], [], [], [], []
+    for pred, case in zip(pred_lists, cases):
+        gold = set(case["gold_sources"])
+        h1.append(hit_at_k(pred, gold, 1))
+        h3.append(hit_at_k(pred, gold, 3))
+        r3.append(recall_at_k(pred, gold, 3))
+        mrr_list.append(mrr(pred, gold))
+        ndcg3.append(ndcg_at_k(pred, gold, 3))
+    return {
+        "num_cases": len(cases),
+        "hit@1": round(mean(h1), 4) if h1 else 0.0,
+        "hit@3": round(mean(h3), 4) if h3 else 0.0,
+        "recall@3": round(mean(r3), 4) if r3 else 0.0,
+        "mrr": round(mean(mrr_list), 4) if mrr_list else 0.0,
+        "ndcg@3": round(mean(ndcg3), 4) if ndcg3 else 0.0,
+    }
+
+
+def run_backend(name: str, factory, texts: List[str], queries: List[str]) -> Dict:
+    started = time.perf_counter()
+    backend = factory()
+    load_seconds = time.perf_counter() - started
+
+    # 先跑一小批预热，排除首批的图优化 / 内存分配开销
+    backend._encode(texts[:8])
+    started = time.perf_counter()
+    doc_vectors = backend._encode(texts)
+    doc_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    query_vectors = np.concatenate([backend._encode([query]) for query in queries])
+    query_seconds = time.perf_counter() - started
+
+    logger.info(f"[embedding-bench] {name}: {len(texts) / doc_seconds:.1f} chunks/s")
+    return {
+        "name": name,
+        "load_seconds": round(load_seconds, 2),
+        "doc_seconds": round(doc_seconds, 2),
+        "docs_per_second": round(len(texts) / doc_seconds, 2),
+        "query_mean_ms": round(query_seconds / max(1, len(queries)) * 1000, 2),
+        "doc_vectors": doc_vectors,
+        "query_vectors": query_vectors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 embedding 后端吞吐 / 检索质量对比")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op 线程数，0 = 自动")
+    # 后端工厂是惰性的，这里只取名字做参数校验
+    parser.add_argument(
+        "--backends",
+        nargs="*",
+        choices=list(build_backends(DEFAULT_MODEL, 0)),
+        help="只跑指定后端，默认全部",
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    chunks = load_corpus(settings)
+    texts = [chunk["content"] for chunk in chunks]
+    sources = [chunk["metadata"]["source"] for chunk in chunks]
+    cases = load_json(RETRIEVAL_DATASET_PATH)
+    queries = [case["query"] for case in cases]
+    logger.info(f"[embedding-bench] 语料 {len(texts)} 个 chunk，查询 {len(queries)} 条")
+
+    backends = build_backends(args.model, args.threads)
+    names = args.backends or list(backends)
+
+    results = []
+    baseline = None
+    for name in names:
+        result = run_backend(name, backends[name], texts, queries)
+        pred_lists = retrieve_sources(result["doc_vectors"], result["query_vectors"], sources, top_k=3)
+        result["retrieval"] = evaluate(pred_lists, cases)
+        if baseline is None:
+            baseline = result
+        else:
+            # 逐 chunk 与基准向量的余弦，衡量量化 / 导出带来的偏差
+            cosine = np.sum(result["doc_vectors"] * baseline["doc_vectors"], axis=1)
+            result["cosine_vs_baseline"] = {
+                "baseline": baseline["name"],
+                "mean": round(float(cosine.mean()), 5),
+                "min": round(float(cosine.min()), 5),
+            }
+            result["speedup_vs_baseline"] = round(
+                result["docs_per_second"] / baseline["docs_per_second"], 2
+            )
+        results.append(result)
+        print(name, {k: v for k, v in result.items() if not k.endswith("_vectors")})
+
+    report = {
+        "model": args.model,
+        "threads": args.threads,
+        "retrieval_dataset_path": RETRIEVAL_DATASET_PATH,
+        "doc_dirs": ["aiops-docs", "aiops-docs-noise"],
+        "num_chunks": len(texts),
+        "results": [{k: v for k, v in r.items() if not k.endswith("_vectors")} for r in results],
+    }
+    save_json(REPORT_PATH, report)
+    print("saved:", REPORT_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from app.clients.milvus_client import MilvusClient
 from app.core.settings import Settings, get_settings
 from app.rag.bm25 import BM25Retriever
 from app.rag.chunking import DocumentChunker, get_strategy_by_filename
+from app.rag.document_parser import chunker_options
 from app.rag.embeddings import EmbeddingService
 from app.rag.load import DocumentLoader
 from app.rag.metadata_filters import build_base_metadata, merge_chunk_metadata
@@ -90,8 +91,7 @@ def build_chunk_cache(settings: Settings, doc_paths: Iterable[Path]) -> List[Dic
 
         chunker = DocumentChunker(
             strategy=get_strategy_by_filename(path.name),
-            max_size=settings.doc_chunk_max_size,
-            overlap=settings.doc_chunk_overlap,
+            **chunker_options(settings),
         )
         base_metadata = build_base_metadata(path.name, title=path.stem)
 
@@ -159,9 +159,8 @@ async def build_eval_stack(
 
     # 评测阶段重建一份 BM25，保证 hybrid 路径和插入阶段一致。
     if FIXED_ENABLE_HYBRID and chunk_cache:
-        vector_store.all_chunks = list(chunk_cache)
         vector_store.bm25_retriever = BM25Retriever()
-        vector_store.bm25_retriever.index(vector_store.all_chunks)
+        vector_store.bm25_retriever.index(list(chunk_cache))
 
     generation_llm = ChatTongyi(
         dashscope_api_key=settings.dashscope_api_key,
@@ -66,9 +66,8 @@ async def build_vector_store(
 
     # 同条件复跑时，把 BM25 内存索引也补齐。
     if enable_hybrid and chunk_cache:
-        vector_store.all_chunks = list(chunk_cache)
         vector_store.bm25_retriever = BM25Retriever()
-        vector_store.bm25_retriever.index(vector_store.all_chunks)
+        vector_store.bm25_retriever.index(list(chunk_cache))
 
     return vector_store, milvus_client
 
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+import app.core.dependencies as dependencies_module
+
+
+class FakeLLM:
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+
+
+class FakeMilvusClient:
+    def __init__(self, settings):
+        self.connect_calls = 0
+        self.ensure_calls = 0
+        self.closed = False
+
+    async def connect(self):
+        self.connect_calls += 1
+
+    async def ensure_collection(self):
+        self.ensure_calls += 1
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeEmbeddingService:
+    instances = 0
+
+    def __init__(self, settings):
+        FakeEmbeddingService.instances += 1
+
+
+class FakeReranker:
+    instances = 0
+
+    def __init__(self, model_name, **kwargs):
+        FakeReranker.instances += 1
+
+
+class FakeVectorStore:
+    def __init__(self, milvus_client, embedding_service, **kwargs):
+        self.milvus_client = milvus_client
+        self.embedding_service = embedding_service
+        self.kwargs = kwargs
+        self.bm25_synced = False
+
+    async def sync_bm25_index(self):
+        self.bm25_synced = True
+
+
+class FakeRAGService:
+    def __init__(self, vector_store, llm):
+        self.vector_store = vector_store
+        self.llm = llm
+
+
+class FakeSettings:
+    dashscope_api_key = "test-key"
+    chat_model = "test-model"
+    bm25_index_dir = None
+    embedding_cache_enabled = False
+    embedding_batch_enabled = False
+    ingest_batch_size = 512
+    parse_workers = 1
+    parse_timeout_seconds = 60.0
+    pdf_parallel_min_pages = 32
+    pdf_pages_per_task = 16
+    rerank_batch_size = 32
+    rerank_max_length = 512
+    rerank_cache_size = 100
+
+
+@pytest.fixture
+def patched_dependencies(monkeypatch):
+    FakeEmbeddingService.instances = 0
+    FakeReranker.instances = 0
+    monkeypatch.setattr(dependencies_module, "ChatTongyi", FakeLLM)
+    monkeypatch.setattr(dependencies_module, "MilvusClient", FakeMilvusClient)
+    monkeypatch.setattr(dependencies_module, "EmbeddingService", FakeEmbeddingService)
+    monkeypatch.setattr(dependencies_module, "BGEReranker", FakeReranker)
+    monkeypatch.setattr(dependencies_module, "VectorStore", FakeVectorStore)
+    monkeypatch.setattr(dependencies_module, "RAGService", FakeRAGService)
+
+
+@pytest.mark.asyncio
+async def test_app_resources_builds_rag_stack_once_under_concurrency(patched_dependencies):
+    resources = dependencies_module.AppResources(FakeSettings())
+
+    services = await asyncio.gather(*(resources.get_rag_service() for _ in range(5)))
+
+    assert all(service is services[0] for service in services)
+    assert FakeEmbeddingService.instances == 1
+    assert FakeReranker.instances == 1
+    assert resources.milvus_client.connect_calls == 1
+    assert services[0].vector_store is resources.vector_store
+    assert resources.vector_store.kwargs["bm25_retriever"] is resources.bm25_retriever
+    assert resources.vector_store.bm25_synced is True
+    assert services[0].llm is resources.chat_llm
+
+
+@pytest.mark.asyncio
+async def test_app_resources_shares_vector_store_between_chat_and_aiops(patched_dependencies):
+    resources = dependencies_module.AppResources(FakeSettings())
+    await resources.startup()
+
+    chat_rag = await resources.get_rag_service()
+    aiops_rag = await resources.get_aiops_rag_service()
+
+    assert chat_rag is not aiops_rag
+    assert chat_rag.vector_store is aiops_rag.vector_store
+
+    await resources.shutdown()
+    assert resources.milvus_client.closed is True
+
+
+@pytest.mark.asyncio
+async def test_app_resources_startup_failure_retries_on_first_request(patched_dependencies):
+    resources = dependencies_module.AppResources(FakeSettings())
+    attempts = {"count": 0}
+
+    async def flaky_connect():
+        attempts["count"] += 1
+        if attempts["count"] == 1:
+            raise RuntimeError("milvus down")
+
+    resources.milvus_client.connect = flaky_connect
+
+    await resources.startup()
+    assert resources.vector_store is None
+
+    rag_service = await resources.get_rag_service()
+    assert rag_service is not None
+    assert attempts["count"] == 2
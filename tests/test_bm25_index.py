@@ -0,0 +1,224 @@
+import threading
+
+import pytest
+
+from app.rag.bm25 import BM25Retriever
+from app.rag.vector_store import VectorStore
+
+
+def _chunk(content, source):
+    return {"content": content, "metadata": {"source": source}}
+
+
+def test_bm25_add_and_remove_source_is_incremental():
+    retriever = BM25Retriever()
+    retriever.add([_chunk("CPU 使用率过高的排查步骤", "cpu.md")])
+    retriever.add([_chunk("磁盘空间不足的处理方法", "disk.md")])
+
+    docs = retriever.search("cpu 排查", top_k=5)
+    assert [doc["metadata"]["source"] for doc in docs] == ["cpu.md"]
+    assert docs[0]["bm25_rank"] == 1
+
+    assert retriever.remove_source("cpu.md") == 1
+    assert retriever.search("CPU 排查", top_k=5) == []
+    assert len(retriever) == 1
+    assert retriever.df[retriever.vocab["cpu"]] == 0
+
+
+def test_bm25_persists_snapshot_and_log_across_restart(tmp_path):
+    retriever = BM25Retriever(index_dir=str(tmp_path))
+    retriever.index([_chunk("内存泄漏 OOM 排查", "memory.md")])
+    retriever.add([_chunk("服务不可用 503 排查", "service.md")])
+    retriever.remove_source("memory.md")
+    retriever.add([_chunk("慢响应 延迟 排查", "slow.md")])
+
+    assert (tmp_path / BM25Retriever.log_name).exists()
+
+    reloaded = BM25Retriever(index_dir=str(tmp_path))
+    assert len(reloaded) == 2
+    assert reloaded.search("503", top_k=3)[0]["metadata"]["source"] == "service.md"
+    assert reloaded.search("OOM", top_k=3) == []
+    # 加载时把追加日志合并进快照
+    assert not (tmp_path / BM25Retriever.log_name).exists()
+
+
+def test_bm25_compacts_log_in_background_once_it_outgrows_the_snapshot(tmp_path):
+    retriever = BM25Retriever(index_dir=str(tmp_path), compact_ratio=1.0, compact_min_bytes=0)
+    retriever.index([_chunk(f"文档 {i} 排查", f"{i}.md") for i in range(20)])
+    retriever.add([_chunk("a 文档", "a.md")])
+    assert (tmp_path / BM25Retriever.log_name).exists()
+
+    retriever.add([_chunk("很长的文档 " * 500, "big.md")])
+    retriever.drain()
+
+    assert not (tmp_path / BM25Retriever.log_name).exists()
+    assert not list(tmp_path.glob("ops.*.jsonl"))
+    # 合并期间继续写入的操作进新日志，重启后不丢
+    retriever.add([_chunk("c 文档", "c.md")])
+    assert len(BM25Retriever(index_dir=str(tmp_path))) == 23
+
+
+def test_bm25_load_skips_sealed_logs_already_in_snapshot(tmp_path):
+    retriever = BM25Retriever(index_dir=str(tmp_path))
+    retriever.index([_chunk("内存泄漏 OOM 排查", "memory.md")])
+    retriever.close()
+    # 模拟快照替换后、删除封存日志前进程退出：该日志已包含在快照里，不能重复重放
+    (tmp_path / "ops.1.jsonl").write_text(
+        '{"op": "add", "docs": [{"content": "x", "metadata": {"source": "x.md"}, "terms": {"x": 1}}]}\n',
+        encoding="utf-8",
+    )
+
+    assert len(BM25Retriever(index_dir=str(tmp_path))) == 1
+
+
+class FakeIterator:
+    def __init__(self, rows, batch_size):
+        self.batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+        self.closed = False
+
+    def next(self):
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def query(self, expr, output_fields):
+        return [{"count(*)": len(self.rows)}]
+
+    def query_iterator(self, batch_size, output_fields):
+        return FakeIterator(self.rows, batch_size)
+
+
+class FakeMilvusClient:
+    def __init__(self, collection):
+        self.collection = collection
+
+
+@pytest.mark.asyncio
+async def test_vector_store_bootstraps_bm25_from_milvus_when_out_of_sync():
+    rows = [
+        {"content": "CPU 飙高排查", "metadata": {"source": "cpu.md"}},
+        {"content": "磁盘打满排查", "metadata": {"source": "disk.md"}},
+        {"content": "内存泄漏排查", "metadata": {"source": "memory.md"}},
+    ]
+    store = VectorStore(
+        FakeMilvusClient(FakeCollection(rows)),
+        embedding_service=None,
+        bm25_retriever=BM25Retriever(),
+    )
+
+    await store.sync_bm25_index(batch_size=2)
+
+    assert len(store.bm25_retriever) == 3
+    assert store.bm25_retriever.search("磁盘", top_k=1)[0]["metadata"]["source"] == "disk.md"
+
+
+def test_sparse_matrix_scores_match_delta_scoring():
+    corpus = [
+        _chunk("CPU 使用率 过高 排查 CPU 热点", "cpu.md"),
+        _chunk("内存 使用率 过高 OOM", "memory.md"),
+        _chunk("磁盘 使用率 告警", "disk.md"),
+        _chunk("服务 不可用 排查 步骤", "service.md"),
+    ]
+    # 阈值调高：全部走 delta 段逐个打分
+    delta_only = BM25Retriever(rebuild_min_pending=10_000)
+    delta_only.add(corpus)
+    # 阈值为 0：首次查询即在后台构建 CSR 主段，等它建好再比较
+    matrix = BM25Retriever(rebuild_min_pending=0)
+    matrix.add(corpus)
+    matrix.search("使用率", top_k=1)
+    matrix.drain()
+
+    for query in ["CPU 使用率 排查", "使用率", "OOM 告警"]:
+        expected = delta_only.search(query, top_k=3)
+        actual = matrix.search(query, top_k=3)
+        assert [d["metadata"]["source"] for d in actual] == [
+            d["metadata"]["source"] for d in expected
+        ]
+        for a, e in zip(actual, expected):
+            assert a["bm25_score"] == pytest.approx(e["bm25_score"], rel=1e-5)
+    assert matrix._matrix is not None and not matrix._delta_docs
+
+
+def test_sparse_matrix_masks_removed_docs_and_merges_delta():
+    retriever = BM25Retriever(rebuild_min_pending=100)
+    retriever.index([_chunk("CPU 排查", "cpu.md"), _chunk("内存 排查", "memory.md")])
+    retriever.remove_source("cpu.md")
+    retriever.add([_chunk("CPU 告警 处理", "cpu-v2.md")])
+
+    docs = retriever.search("CPU", top_k=5)
+
+    assert [d["metadata"]["source"] for d in docs] == ["cpu-v2.md"]
+    assert retriever._matrix.n_docs == 2
+
+
+def test_bm25_search_applies_metadata_filters_before_truncation():
+    retriever = BM25Retriever()
+    retriever.index(
+        [_chunk(f"CPU 排查 CPU 告警 {i}", "noisy.md") for i in range(20)]
+        + [_chunk("CPU 排查以及大量其他无关的描述内容", "cpu.md")]
+    )
+    retriever.add([_chunk("CPU 排查补充说明", "extra.md")])
+
+    docs = retriever.search("CPU 排查", top_k=1, metadata_filters={"source": "cpu.md"})
+    assert [doc["metadata"]["source"] for doc in docs] == ["cpu.md"]
+
+    docs = retriever.search("CPU 排查", top_k=1, metadata_filters={"source": "extra.md"})
+    assert [doc["metadata"]["source"] for doc in docs] == ["extra.md"]
+
+
+def test_background_rebuild_keeps_serving_and_applies_removals_made_meanwhile(monkeypatch):
+    retriever = BM25Retriever(rebuild_min_pending=2)
+    retriever.index([_chunk("CPU 排查", "cpu.md"), _chunk("内存 排查", "memory.md")])
+    release = threading.Event()
+    build = retriever._build_matrix
+
+    def slow_build(*args):
+        release.wait(5)
+        return build(*args)
+
+    monkeypatch.setattr(retriever, "_build_matrix", slow_build)
+    retriever.add([_chunk("磁盘 排查", "disk.md"), _chunk("CPU 告警", "cpu-alert.md")])
+
+    # 触发后台重建的这次查询不等重建，由旧主段 + delta 作答
+    docs = retriever.search("排查", top_k=5)
+    assert {d["metadata"]["source"] for d in docs} == {"cpu.md", "memory.md", "disk.md"}
+    assert retriever._rebuild is not None
+
+    retriever.remove_source("disk.md")
+    retriever.remove_source("cpu.md")
+    retriever.add([_chunk("网络 排查", "net.md")])
+    release.set()
+    retriever.drain()
+
+    assert retriever._matrix.n_docs == 4
+    assert len(retriever._delta_docs) == 1
+    assert sorted(d["metadata"]["source"] for d in retriever.search("排查", top_k=5)) == ["memory.md", "net.md"]
+
+
+def test_bm25_filters_use_field_index_and_check_residual_conditions():
+    retriever = BM25Retriever()
+    retriever.index(
+        [
+            {"content": f"CPU 排查 CPU 告警 {i}", "metadata": {"source": "noisy.md", "doc_type": "md", "title": "噪声"}}
+            for i in range(20)
+        ]
+        + [
+            {"content": "CPU 排查 步骤", "metadata": {"source": "cpu.md", "doc_type": "md", "title": "CPU 手册"}},
+            {"content": "CPU 排查 表格", "metadata": {"source": "cpu.csv", "doc_type": "csv", "title": "CPU 清单"}},
+        ]
+    )
+
+    docs = retriever.search("CPU 排查", top_k=5, metadata_filters={"doc_type": "md", "title_contains": "手册"})
+    assert [doc["metadata"]["source"] for doc in docs] == ["cpu.md"]
+    docs = retriever.search("CPU 排查", top_k=5, metadata_filters={"doc_type": "csv", "source": "cpu.md"})
+    assert docs == []
+
+    retriever.remove_source("cpu.csv")
+    assert "csv" not in retriever.field_index["doc_type"]
+    assert retriever.search("CPU", top_k=5, metadata_filters={"doc_type": "csv"}) == []
@@ -0,0 +1,178 @@
+import time
+
+import pytest
+
+from app.rag.chunking import DocumentChunker, get_strategy_by_filename
+from app.rag.document_parser import DeadlineChunkStream, DocumentParsePool, build_document_chunks
+from app.rag.load import DocumentLoader
+
+
+def _write_pdf(path, page_texts):
+    """手写一个最小 PDF：每页一行 Helvetica 文本。"""
+    page_count = len(page_texts)
+    font_id = 3 + 2 * page_count
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{3 + 2 * i} 0 R" for i in range(page_count)), page_count
+        ),
+    ]
+    for i, text in enumerate(page_texts):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        data += f"{offset:010d} 00000 n \n".encode("latin-1")
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode(
+        "latin-1"
+    )
+    path.write_bytes(data)
+    return str(path)
+
+
+def _without_time(chunks):
+    # 子进程与本进程解析时间可能跨秒，比较时去掉导入时间
+    return [
+        {**chunk, "metadata": {k: v for k, v in chunk["metadata"].items() if k not in ("ingested_at", "timestamp")}}
+        for chunk in chunks
+    ]
+
+
+def _local_chunks(file_path, filename):
+    chunker = DocumentChunker(get_strategy_by_filename(filename), max_size=200, overlap=0)
+    return _without_time(build_document_chunks(chunker, file_path, filename, "manual", file_hash="h"))
+
+
+@pytest.mark.asyncio
+async def test_parse_pool_matches_in_process_chunking(tmp_path):
+    path = tmp_path / "cpu.md"
+    path.write_text("# CPU\n\n排查步骤：先看 top。\n\n## 内存\n\n再看 free -m。", encoding="utf-8")
+    pool = DocumentParsePool(max_workers=1, timeout=60)
+    try:
+        chunks = await pool.build_chunks(
+            str(path), "cpu.md", "manual", file_hash="h", chunker_options={"max_size": 200, "overlap": 0}
+        )
+    finally:
+        pool.shutdown()
+
+    assert _without_time(chunks) == _local_chunks(str(path), "cpu.md")
+
+
+@pytest.mark.asyncio
+async def test_parse_pool_splits_large_pdf_into_page_ranges(tmp_path):
+    texts = [f"Page {i} disk usage runbook" for i in range(7)]
+    path = _write_pdf(tmp_path / "runbook.pdf", texts)
+    pool = DocumentParsePool(max_workers=2, timeout=60, pdf_parallel_min_pages=4, pdf_pages_per_task=3)
+    try:
+        chunks = await pool.build_chunks(
+            str(path), "runbook.pdf", "manual", file_hash="h", chunker_options={"max_size": 200, "overlap": 0}
+        )
+    finally:
+        pool.shutdown()
+
+    assert DocumentLoader.pdf_page_count(path) == 7
+    assert DocumentLoader.load_pdf_pages(path, 5) == ["[第6页]\nPage 5 disk usage runbook", "[第7页]\nPage 6 disk usage runbook"]
+    # 按页段并行解析后拼接的结果与单进程整本解析一致
+    assert _without_time(chunks) == _local_chunks(path, "runbook.pdf")
+    assert "[第7页]" in chunks[-1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_parse_pool_times_out_and_recovers(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("CPU 使用率过高时的排查步骤说明。", encoding="utf-8")
+    # 子进程冷启动远超 1ms，必然超时
+    pool = DocumentParsePool(max_workers=1, timeout=0.001)
+    try:
+        with pytest.raises(TimeoutError):
+            await pool.build_chunks(str(path), "doc.txt")
+        assert pool._executor is None
+
+        pool.timeout = 60
+        chunks = await pool.build_chunks(str(path), "doc.txt")
+    finally:
+        pool.shutdown()
+
+    assert [chunk["content"] for chunk in chunks] == ["CPU 使用率过高时的排查步骤说明。"]
+
+
+def test_iter_records_streams_pages_row_blocks_and_text_blocks(tmp_path):
+    pdf = _write_pdf(tmp_path / "runbook.pdf", ["Page 0 cpu", "Page 1 disk"])
+    assert [r["metadata"] for r in DocumentLoader.iter_records(pdf)] == [{"page": 1}, {"page": 2}]
+
+    csv_path = tmp_path / "hosts.csv"
+    csv_path.write_text("host,cpu\n" + "".join(f"h{i},{i}\n" for i in range(250)), encoding="utf-8")
+    records = list(DocumentLoader.iter_records(str(csv_path), rows_per_record=100))
+    assert [r["metadata"] for r in records] == [
+        {"row_start": 1, "row_end": 100},
+        {"row_start": 101, "row_end": 200},
+        {"row_start": 201, "row_end": 250},
+        {"row_start": 1, "row_end": 250},
+    ]
+    assert "记录250: host为h249" in records[2]["content"]
+    assert "cpu：范围 0.00 ~ 249.00" in records[-1]["content"]
+
+    txt = tmp_path / "notes.txt"
+    txt.write_text("第一段\n第一段续\n\n第二段\n\n第三段\n", encoding="utf-8")
+    blocks = list(DocumentLoader.iter_records(str(txt), text_block_chars=5))
+    # 只在空行处断块，段落不会被拆开
+    assert [b["content"] for b in blocks] == ["第一段\n第一段续\n\n", "第二段\n\n", "第三段\n"]
+
+
+def test_iter_excel_records_reads_sheets_in_row_blocks(tmp_path):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    capacity = wb.active
+    capacity.title = "capacity"
+    capacity.append(["host", "disk_gb"])
+    for i in range(250):
+        capacity.append([f"h{i}", i])
+    owners = wb.create_sheet("owners")
+    owners.append(["team", "owner"])
+    owners.append(["sre", None])
+    owners.append([None, None])
+    path = tmp_path / "plan.xlsx"
+    wb.save(path)
+
+    records = list(DocumentLoader.iter_excel_records(str(path), rows_per_record=100))
+
+    assert [r["metadata"] for r in records] == [
+        {"sheet_name": "capacity", "row_start": 1, "row_end": 100},
+        {"sheet_name": "capacity", "row_start": 101, "row_end": 200},
+        {"sheet_name": "capacity", "row_start": 201, "row_end": 250},
+        {"sheet_name": "capacity", "row_start": 1, "row_end": 250},
+        {"sheet_name": "owners", "row_start": 1, "row_end": 1},
+        {"sheet_name": "owners", "row_start": 1, "row_end": 1},
+    ]
+    assert "记录101: host为h100" in records[1]["content"]
+    assert "team为sre" in records[-2]["content"]
+
+
+def test_deadline_chunk_stream_counts_only_parse_time_and_times_out():
+    def slow_chunks():
+        for i in range(3):
+            time.sleep(0.05)
+            yield {"content": str(i)}
+
+    stream = DeadlineChunkStream(slow_chunks(), timeout=0.08, filename="big.txt")
+    assert next(stream)["content"] == "0"
+    # 下游处理的耗时不计入解析时限
+    time.sleep(0.1)
+    assert next(stream)["content"] == "1"
+    assert stream.remaining() == 0.0
+    with pytest.raises(TimeoutError):
+        next(stream)
+    stream.close()
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.rag.embedding_batcher import QueryEmbeddingBatcher
+
+
+class FakeEmbeddingService:
+    def __init__(self, fail=False):
+        self.query_batches = []
+        self.fail = fail
+
+    async def embed_queries(self, texts):
+        self.query_batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("provider down")
+        return [[float(len(text))] for text in texts]
+
+    async def embed_texts(self, texts):
+        return [[0.0] for _ in texts]
+
+
+@pytest.mark.asyncio
+async def test_batcher_coalesces_concurrent_queries_into_one_call():
+    inner = FakeEmbeddingService()
+    batcher = QueryEmbeddingBatcher(inner, max_batch_size=16, max_wait_ms=5)
+
+    vectors = await asyncio.gather(
+        batcher.embed_text("a"),
+        batcher.embed_text("bb"),
+        batcher.embed_text("a"),
+        batcher.embed_text("cccc"),
+    )
+
+    assert vectors == [[1.0], [2.0], [1.0], [4.0]]
+    assert inner.query_batches == [["a", "bb", "cccc"]]
+
+
+@pytest.mark.asyncio
+async def test_batcher_flushes_immediately_when_batch_is_full():
+    inner = FakeEmbeddingService()
+    batcher = QueryEmbeddingBatcher(inner, max_batch_size=2, max_wait_ms=10_000)
+
+    vectors = await asyncio.wait_for(
+        asyncio.gather(*(batcher.embed_text(text) for text in ["a", "b", "c", "d"])),
+        timeout=1,
+    )
+
+    assert vectors == [[1.0]] * 4
+    assert inner.query_batches == [["a", "b"], ["c", "d"]]
+
+
+@pytest.mark.asyncio
+async def test_batcher_propagates_errors_to_every_waiter():
+    batcher = QueryEmbeddingBatcher(FakeEmbeddingService(fail=True), max_wait_ms=1)
+
+    results = await asyncio.gather(
+        batcher.embed_text("a"),
+        batcher.embed_text("b"),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
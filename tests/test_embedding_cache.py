@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from app.rag.embedding_cache import CachedEmbeddingService, EmbeddingCache
+
+
+class FakeEmbeddingService:
+    def __init__(self):
+        self.query_calls = []
+        self.document_calls = []
+
+    async def embed_text(self, text):
+        self.query_calls.append(text)
+        return [float(len(text)), 1.0]
+
+    async def embed_texts(self, texts):
+        self.document_calls.append(list(texts))
+        return [[float(len(text)), 0.0] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_cached_embedding_service_only_embeds_misses_and_dedupes_batch():
+    inner = FakeEmbeddingService()
+    service = CachedEmbeddingService(inner, EmbeddingCache(max_items=10), namespace="bge:test")
+
+    first = await service.embed_texts(["a", "bb", "a"])
+    second = await service.embed_texts(["bb", "ccc"])
+
+    assert first.dtype == np.float32 and first.flags["C_CONTIGUOUS"]
+    assert first.tolist() == [[1.0, 0.0], [2.0, 0.0], [1.0, 0.0]]
+    assert second.tolist() == [[2.0, 0.0], [3.0, 0.0]]
+    assert inner.document_calls == [["a", "bb"], ["ccc"]]
+
+
+@pytest.mark.asyncio
+async def test_cached_embedding_service_separates_query_and_document_vectors():
+    inner = FakeEmbeddingService()
+    service = CachedEmbeddingService(inner, EmbeddingCache(max_items=10), namespace="bge:test")
+
+    await service.embed_texts(["cpu"])
+    query_vector = await service.embed_text("cpu")
+    again = await service.embed_text("cpu")
+
+    assert query_vector.tolist() == again.tolist() == [3.0, 1.0]
+    assert inner.query_calls == ["cpu"]
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_disk_tier_survives_restart_and_reports_hit_rate(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    inner = FakeEmbeddingService()
+    service = CachedEmbeddingService(inner, EmbeddingCache(path=path, max_items=1), namespace="ds:v4")
+    await service.embed_texts(["runbook chunk", "another chunk"])
+    service.cache.close()
+
+    reopened = EmbeddingCache(path=path, max_items=1)
+    restarted = CachedEmbeddingService(FakeEmbeddingService(), reopened, namespace="ds:v4")
+    vectors = await restarted.embed_texts(["runbook chunk", "another chunk"])
+
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == [[13.0, 0.0], [13.0, 0.0]]
+    assert restarted.inner.document_calls == []
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 2
+    assert stats["hit_rate"] == 1.0
+    # LRU 有界
+    assert stats["memory_items"] == 1
+
+
+def test_embedding_cache_namespaces_do_not_collide():
+    cache = EmbeddingCache(max_items=10)
+    cache.put_many({cache.make_key("bge:a", "document", "x"): [1.0]})
+
+    assert cache.get_many([cache.make_key("bge:b", "document", "x")]) == {}
@@ -0,0 +1,137 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.rag.embeddings import embed_in_batches
+from app.rag.vector_store import VectorStore
+
+
+@pytest.mark.asyncio
+async def test_embed_in_batches_bounds_concurrency_and_retries_only_failed_batch():
+    calls = []
+    active = 0
+    max_active = 0
+    failed_once = set()
+
+    async def embed_batch(batch):
+        nonlocal active, max_active
+        calls.append(list(batch))
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if batch[0] == "t3" and "t3" not in failed_once:
+            failed_once.add("t3")
+            raise RuntimeError("429 throttled")
+        return [[float(text[1:])] for text in batch]
+
+    texts = [f"t{i}" for i in range(8)]
+    vectors = await embed_in_batches(embed_batch, texts, batch_size=3, concurrency=2, retry_delay=0)
+
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == [[float(i)] for i in range(8)]
+    assert max_active == 2
+    # 3 批 + 失败那一批重试 1 次
+    assert sorted(map(tuple, calls)) == sorted(
+        [("t0", "t1", "t2"), ("t3", "t4", "t5"), ("t3", "t4", "t5"), ("t6", "t7")]
+    )
+
+
+@pytest.mark.asyncio
+async def test_embed_in_batches_raises_after_exhausting_retries():
+    async def embed_batch(batch):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await embed_in_batches(embed_batch, ["a", "b"], batch_size=1, max_retries=1, retry_delay=0)
+
+
+class FakeCollection:
+    def __init__(self, events):
+        self.events = events
+        self.inserted = []
+
+    def insert(self, data):
+        self.inserted.append(len(data[1]))
+
+
+class SlowMilvusClient:
+    def __init__(self, events):
+        self.events = events
+        self.collection = FakeCollection(events)
+
+    async def run(self, fn, *args, **kwargs):
+        self.events.append("insert-start")
+        await asyncio.sleep(0.02)
+        result = fn(*args, **kwargs)
+        self.events.append("insert-end")
+        return result
+
+
+class SlowEmbeddingService:
+    def __init__(self, events):
+        self.events = events
+
+    async def embed_texts(self, texts):
+        self.events.append("embed-start")
+        await asyncio.sleep(0.02)
+        self.events.append("embed-end")
+        return [[0.1, 0.2] for _ in texts]
+
+
+@pytest.mark.asyncio
+async def test_insert_overlaps_next_embedding_with_previous_write():
+    events = []
+    store = VectorStore(
+        SlowMilvusClient(events), SlowEmbeddingService(events), enable_hybrid=False, insert_batch_size=2
+    )
+
+    await store.insert([{"content": f"c{i}", "metadata": {"source": "a.md"}} for i in range(5)])
+
+    assert store.milvus.collection.inserted == [2, 2, 1]
+    # 第 1 批写入开始于第 2 批 embedding 结束之前
+    second_embed_end = [i for i, e in enumerate(events) if e == "embed-end"][1]
+    assert events.index("insert-start") < second_embed_end
+    assert events[-1] == "insert-end"
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.data = []
+
+    def insert(self, data):
+        self.data.append(data)
+
+
+class RecordingMilvusClient:
+    def __init__(self, scalar_fields=None):
+        self.collection = RecordingCollection()
+        if scalar_fields:
+            self.scalar_fields = scalar_fields
+
+    async def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+class ListEmbeddingService:
+    async def embed_texts(self, texts):
+        # 模拟 DashScope：JSON 解出来的是 Python 列表
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_insert_passes_float32_vectors_to_milvus():
+    chunks = [{"content": text, "metadata": {"source": "a.md"}} for text in ("cpu", "disk")]
+
+    columnar = VectorStore(RecordingMilvusClient(), ListEmbeddingService(), enable_hybrid=False)
+    await columnar.insert(chunks)
+    vectors = columnar.milvus.collection.data[0][0]
+    assert isinstance(vectors, np.ndarray) and vectors.dtype == np.float32
+    assert vectors.tolist() == [[3.0, 0.5], [4.0, 0.5]]
+
+    rows = VectorStore(RecordingMilvusClient(scalar_fields=("source",)), ListEmbeddingService(), enable_hybrid=False)
+    await rows.insert(chunks)
+    row = rows.milvus.collection.data[0][0]
+    assert row["vector"].dtype == np.float32
+    assert row["vector"].tolist() == [3.0, 0.5]
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes_upload import get_ingestion_jobs, router
+from app.core.settings import get_settings
+from app.services.ingestion_service import IngestionJob, IngestionJobQueue
+
+
+class FakeSettings:
+    ingest_workers = 2
+    ingest_stream_min_bytes = 1 << 30
+    parse_timeout_seconds = 60.0
+    doc_chunk_max_size = 50
+    doc_chunk_overlap = 0
+    doc_table_rows_per_chunk = 20
+    doc_chunk_max_tokens = 0
+    doc_chunk_tokenizer = "approx"
+    upload_dir = None
+    upload_max_bytes = 1024
+    upload_chunk_size = 8
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.inserted = []
+        self.file_hashes = {}
+        self.active = 0
+        self.max_active = 0
+
+    async def source_file_hash(self, source):
+        return self.file_hashes.get(source)
+
+    async def upsert_source(self, source, chunks, file_hash=None, on_progress=None):
+        chunks = list(chunks)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        for start in range(0, len(chunks), 2):
+            await asyncio.sleep(0.01)
+            batch = chunks[start:start + 2]
+            self.inserted.extend(chunk["metadata"]["source"] for chunk in batch)
+            on_progress(len(batch))
+        self.file_hashes[source] = file_hash
+        self.active -= 1
+        return {"status": "success", "added": len(chunks), "deleted": 0, "unchanged": 0}
+
+
+def _write_doc(tmp_path, name, paragraphs):
+    path = tmp_path / name
+    path.write_text("\n\n".join(f"第{i}段：CPU 使用率过高时的排查步骤说明。" for i in range(paragraphs)), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_ingestion_queue_runs_jobs_in_background_and_reports_progress(tmp_path):
+    vector_store = FakeVectorStore()
+
+    async def provider():
+        return vector_store
+
+    queue = IngestionJobQueue(FakeSettings(), provider)
+    jobs = [
+        queue.submit(_write_doc(tmp_path, f"doc{i}.txt", 6), f"doc{i}.txt", title=f"doc{i}")
+        for i in range(3)
+    ]
+    empty = tmp_path / "empty.txt"
+    empty.write_text("", encoding="utf-8")
+    empty_job = queue.submit(str(empty), "empty.txt")
+
+    assert all(job.status == "queued" for job in jobs)
+    await queue.join()
+
+    for job in jobs:
+        assert job.status == "success"
+        assert job.chunks_total > 0
+        assert job.chunks_indexed == job.chunks_total
+        assert job.to_dict()["progress"] == 1.0
+        assert job.token_stats["chunks"] == job.chunks_total
+    assert empty_job.status == "failed"
+    assert sorted(set(vector_store.inserted)) == ["doc0.txt", "doc1.txt", "doc2.txt"]
+    # 两个索引 worker 并行写入
+    assert vector_store.max_active == 2
+    await queue.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_ingestion_queue_skips_unchanged_file_before_parsing(tmp_path):
+    vector_store = FakeVectorStore()
+    vector_store.file_hashes["doc.txt"] = "same-hash"
+
+    async def provider():
+        return vector_store
+
+    queue = IngestionJobQueue(FakeSettings(), provider)
+    job = queue.submit(_write_doc(tmp_path, "doc.txt", 3), "doc.txt", file_hash="same-hash")
+    await queue.join()
+
+    assert job.status == "skipped"
+    assert job.to_dict()["progress"] == 1.0
+    assert vector_store.inserted == []
+    await queue.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_ingestion_queue_streams_large_files_to_index_worker(tmp_path):
+    vector_store = FakeVectorStore()
+    settings = FakeSettings()
+    settings.ingest_stream_min_bytes = 0
+
+    async def provider():
+        return vector_store
+
+    queue = IngestionJobQueue(settings, provider)
+    job = queue.submit(_write_doc(tmp_path, "big.txt", 6), "big.txt")
+    await queue.join()
+
+    assert job.status == "success"
+    assert job.chunks_total == job.chunks_indexed == len(vector_store.inserted) > 0
+    await queue.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_ingestion_queue_serializes_jobs_for_same_source_and_moves_staged_files(tmp_path):
+    vector_store = FakeVectorStore()
+    active_sources = {}
+    upsert = vector_store.upsert_source
+
+    async def tracked_upsert(source, chunks, file_hash=None, on_progress=None):
+        active_sources[source] = active_sources.get(source, 0) + 1
+        assert active_sources[source] == 1
+        try:
+            return await upsert(source, chunks, file_hash=file_hash, on_progress=on_progress)
+        finally:
+            active_sources[source] -= 1
+
+    vector_store.upsert_source = tracked_upsert
+
+    async def provider():
+        return vector_store
+
+    queue = IngestionJobQueue(FakeSettings(), provider)
+    final_path = str(tmp_path / "doc.txt")
+    first = queue.submit(
+        _write_doc(tmp_path, "job1_doc.txt", 4), "doc.txt", file_hash="h1", final_path=final_path
+    )
+    second = queue.submit(
+        _write_doc(tmp_path, "job2_doc.txt", 2), "doc.txt", file_hash="h2", final_path=final_path
+    )
+    await queue.join()
+
+    assert first.status == second.status == "success"
+    # 按提交顺序串行执行，最后留下的是后一次上传的内容和 hash
+    assert vector_store.file_hashes["doc.txt"] == "h2"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["doc.txt"]
+    assert (tmp_path / "doc.txt").read_text(encoding="utf-8").count("段") == 2
+    assert queue._source_locks == {}
+    await queue.shutdown()
+
+
+def test_upload_route_returns_job_id_and_exposes_status(tmp_path):
+    settings = FakeSettings()
+    settings.upload_dir = str(tmp_path)
+
+    class FakeQueue:
+        def __init__(self):
+            self.submitted = []
+
+        def submit(self, file_path, filename, title="", file_hash=None, final_path=None, job_id=None):
+            self.submitted.append((file_path, filename, title, file_hash, final_path, job_id))
+            self.job = IngestionJob(
+                job_id=job_id, filename=filename, file_path=file_path, title=title,
+                file_hash=file_hash, final_path=final_path,
+            )
+            return self.job
+
+        def get(self, job_id):
+            return self.job if job_id == self.job.job_id else None
+
+    fake_queue = FakeQueue()
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[get_ingestion_jobs] = lambda: fake_queue
+    app.dependency_overrides[get_settings] = lambda: settings
+    client = TestClient(app)
+
+    content = "# CPU\n排查步骤".encode("utf-8")
+    file_hash = hashlib.sha256(content).hexdigest()
+    response = client.post(
+        "/api/upload",
+        files={"file": ("cpu.md", content, "text/markdown")},
+        data={"title": "CPU 排障"},
+    )
+
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    assert response.json() == {
+        "filename": "cpu.md",
+        "chunks": 0,
+        "status": "queued",
+        "job_id": job_id,
+        "file_hash": file_hash,
+    }
+    # 先落到任务独占的暂存路径，任务完成后才替换 cpu.md
+    staged = tmp_path / f"{job_id}_cpu.md"
+    assert fake_queue.submitted == [
+        (str(staged), "cpu.md", "CPU 排障", file_hash, str(tmp_path / "cpu.md"), job_id)
+    ]
+    assert staged.read_bytes() == content
+    assert not (tmp_path / "cpu.md").exists()
+
+    status = client.get(f"/api/upload/jobs/{job_id}")
+    assert status.status_code == 200
+    assert status.json()["status"] == "queued"
+    assert client.get("/api/upload/jobs/missing").status_code == 404
+
+
+def test_upload_route_rejects_files_over_size_limit(tmp_path):
+    settings = FakeSettings()
+    settings.upload_dir = str(tmp_path)
+    settings.upload_max_bytes = 16
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[get_ingestion_jobs] = lambda: None
+    app.dependency_overrides[get_settings] = lambda: settings
+    client = TestClient(app)
+
+    response = client.post("/api/upload", files={"file": ("big.txt", b"x" * 64, "text/plain")})
+
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,34 @@
+import numpy as np
+
+from app.rag.bge_embeddings import encode_by_length, plan_length_batches
+
+
+def test_plan_length_batches_groups_similar_lengths_under_token_budget():
+    lengths = [500, 10, 12, 480, 8, 11, 9, 490]
+
+    batches = plan_length_batches(lengths, max_batch_size=4, max_batch_tokens=1024)
+
+    # 长度降序贪心组批：长文本两两一批，短文本凑满 max_batch_size
+    assert [sorted(lengths[i] for i in batch) for batch in batches] == [
+        [490, 500],
+        [12, 480],
+        [8, 9, 10, 11],
+    ]
+    # 每批 padding 后的 token 数不超过预算，所有下标恰好出现一次
+    assert all(len(batch) * max(lengths[i] for i in batch) <= 1024 for batch in batches)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+
+
+def test_encode_by_length_restores_input_order():
+    lengths = [3, 1, 2]
+    calls = []
+
+    def encode_batch(batch):
+        calls.append(batch.tolist())
+        return np.asarray([[float(lengths[i]), 0.0] for i in batch], dtype=np.float32)
+
+    vectors = encode_by_length(lengths, encode_batch, max_batch_size=2, max_batch_tokens=100)
+
+    assert calls == [[0, 2], [1]]
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == [[3.0, 0.0], [1.0, 0.0], [2.0, 0.0]]
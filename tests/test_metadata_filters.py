@@ -1,4 +1,5 @@
 from app.rag.metadata_filters import (
+    build_milvus_filter_expr,
     build_base_metadata,
     merge_chunk_metadata,
     matches_metadata_filters,
@@ -86,3 +87,34 @@ def test_matches_metadata_filters_supports_exact_contains_and_range():
         },
     )
     assert not matches_metadata_filters(metadata, {"sheet_name": "Sheet1"})
+
+
+def test_build_milvus_filter_expr_pushes_down_expressible_filters():
+    expr, residual = build_milvus_filter_expr(
+        {
+            "source": "cpu.md",
+            "doc_type": "markdown",
+            "section_path_contains": "排查",
+            "title_contains": "CPU",
+            "timestamp_from": "1711900800",
+            "timestamp_to": 1711900900,
+        }
+    )
+
+    assert expr == (
+        'metadata["source"] == "cpu.md" and metadata["doc_type"] == "markdown" '
+        'and metadata["ingested_at"] >= 1711900800 and metadata["ingested_at"] <= 1711900900 '
+        'and metadata["section_path"] like "%排查%"'
+    )
+    # like 区分大小写，含字母的包含匹配留给 Python 侧
+    assert residual == {"title_contains": "CPU"}
+
+
+def test_build_milvus_filter_expr_keeps_unsafe_values_as_residual():
+    expr, residual = build_milvus_filter_expr(
+        {"title": 'say "hi"', "section_path_contains": "50%"}
+    )
+
+    assert expr == ""
+    assert residual == {"title": 'say "hi"', "section_path_contains": "50%"}
+    assert build_milvus_filter_expr(None) == ("", {})
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.clients.milvus_client import MilvusClient
+
+
+class FakeSettings:
+    milvus_collection = "knowledge_base"
+    milvus_io_workers = 2
+    milvus_call_timeout = 5.0
+
+
+@pytest.mark.asyncio
+async def test_run_executes_blocking_calls_off_the_event_loop():
+    client = MilvusClient(FakeSettings())
+
+    thread_name = await client.run(lambda: threading.current_thread().name)
+
+    assert thread_name.startswith("milvus-io")
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_run_lets_concurrent_calls_overlap():
+    client = MilvusClient(FakeSettings())
+    # 两个调用必须同时在跑才能通过 barrier，串行执行会直接 BrokenBarrierError
+    barrier = threading.Barrier(2, timeout=2)
+
+    results = await asyncio.gather(client.run(barrier.wait), client.run(barrier.wait))
+
+    assert sorted(results) == [0, 1]
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_run_raises_timeout_without_blocking_the_loop():
+    client = MilvusClient(FakeSettings())
+    ticks = []
+
+    async def ticker():
+        for _ in range(3):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    with pytest.raises(TimeoutError):
+        await asyncio.gather(client.run(time.sleep, 0.3, timeout=0.05), ticker())
+
+    assert len(ticks) == 3
+    await client.close()
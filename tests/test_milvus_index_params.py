@@ -0,0 +1,55 @@
+import pytest
+
+from app.clients.milvus_client import MilvusClient, auto_nlist, auto_nprobe, build_index_params
+
+
+class FakeSettings:
+    milvus_collection = "knowledge_base"
+    milvus_index_type = "AUTO"
+    milvus_index_nlist = 0
+    milvus_search_nprobe = 0
+    milvus_target_recall = 0.95
+    milvus_pq_m = 64
+    milvus_hnsw_m = 16
+    milvus_hnsw_ef_construction = 200
+    milvus_hnsw_ef = 64
+    milvus_diskann_search_list = 100
+
+
+def test_auto_nlist_scales_with_entity_count():
+    assert auto_nlist(0) == 128
+    assert auto_nlist(1_000_000) == 4096
+    assert auto_nlist(10**12) == 65536
+
+
+def test_auto_nprobe_grows_with_target_recall_and_stays_within_nlist():
+    assert auto_nprobe(128, 0.95) == 8
+    assert auto_nprobe(4096, 0.90) < auto_nprobe(4096, 0.95) < auto_nprobe(4096, 0.99)
+    assert auto_nprobe(4096, 1.0) == 4096
+
+
+def test_build_index_params_supports_each_index_type():
+    settings = FakeSettings()
+
+    auto = build_index_params(settings, entity_count=1_000_000)
+    assert auto == {"metric_type": "IP", "index_type": "IVF_FLAT", "params": {"nlist": 4096}}
+    assert build_index_params(settings, index_type="ivf_pq")["params"] == {"nlist": 128, "m": 64, "nbits": 8}
+    assert build_index_params(settings, index_type="HNSW")["params"] == {"M": 16, "efConstruction": 200}
+    assert build_index_params(settings, index_type="DISKANN")["params"] == {}
+
+    with pytest.raises(ValueError):
+        build_index_params(settings, index_type="ANNOY")
+
+
+def test_search_params_follow_detected_index_type():
+    client = MilvusClient(FakeSettings())
+
+    client.index_type, client.index_nlist = "IVF_SQ8", 4096
+    assert client.search_params(10) == {"metric_type": "IP", "params": {"nprobe": auto_nprobe(4096, 0.95)}}
+
+    client.index_type, client.index_nlist = "HNSW", None
+    assert client.search_params(10)["params"] == {"ef": 64}
+    assert client.search_params(200)["params"] == {"ef": 200}
+
+    client.index_type = "DISKANN"
+    assert client.search_params(10)["params"] == {"search_list": 100}
@@ -0,0 +1,22 @@
+import numpy as np
+
+from app.rag.onnx_embeddings import cls_pool_normalize
+
+
+def test_cls_pool_normalize_takes_first_token_and_l2_normalizes():
+    hidden = np.zeros((2, 3, 2), dtype=np.float32)
+    hidden[0, 0] = [3.0, 4.0]
+    hidden[1, 0] = [0.0, 2.0]
+    # 非 CLS 位置不参与池化
+    hidden[:, 1:] = 9.0
+
+    vectors = cls_pool_normalize(hidden)
+
+    assert vectors.dtype == np.float32 and vectors.flags["C_CONTIGUOUS"]
+    np.testing.assert_allclose(vectors, [[0.6, 0.8], [0.0, 1.0]], rtol=1e-6)
+
+
+def test_cls_pool_normalize_keeps_zero_vector_finite():
+    vectors = cls_pool_normalize(np.zeros((1, 2, 4), dtype=np.float32))
+
+    assert np.isfinite(vectors).all()
@@ -0,0 +1,55 @@
+import pytest
+
+from app.rag import reranker as reranker_module
+from app.rag.reranker import BGEReranker, RerankScoreCache
+
+
+class FakeFlagReranker:
+    def __init__(self, model_name, use_fp16=False):
+        self.calls = []
+
+    def compute_score(self, pairs, batch_size=256, max_length=512):
+        self.calls.append(([content for _, content in pairs], batch_size, max_length))
+        scores = [float(len(content)) for _, content in pairs]
+        # 与 FlagReranker 一致：只有一个 pair 时返回单个分数
+        return scores[0] if len(scores) == 1 else scores
+
+
+@pytest.fixture
+def reranker(monkeypatch):
+    monkeypatch.setattr(reranker_module, "FlagReranker", FakeFlagReranker)
+    return BGEReranker("fake-reranker", batch_size=8, max_length=256, cache_size=100)
+
+
+def _docs(*contents):
+    return [{"content": content, "metadata": {"source": f"{content}.md"}} for content in contents]
+
+
+def test_rerank_scores_only_unseen_pairs(reranker):
+    first = reranker.rerank("cpu 高", _docs("a", "ccc", "bb", "ccc"))
+    second = reranker.rerank("cpu 高", _docs("bb", "dddd", "a"))
+
+    assert [doc["content"] for doc in first] == ["ccc", "ccc", "bb", "a"]
+    assert [doc["content"] for doc in second] == ["dddd", "bb", "a"]
+    # 第一次重复的 chunk 只算一次；第二次只算新出现的 chunk，并使用配置的批大小 / 长度
+    assert reranker.reranker.calls == [(["a", "ccc", "bb"], 8, 256), (["dddd"], 8, 256)]
+    assert reranker.cache.stats()["hits"] == 2
+
+
+def test_rerank_cache_is_keyed_by_query_and_content_hash(reranker):
+    reranker.rerank("cpu 高", _docs("a", "bb"), top_k=1)
+    reranker.rerank("内存高", _docs("a", "bb"), top_k=1)
+    # 已入库 chunk 的 metadata 自带 content_hash，直接作为 key
+    hashed = [{"content": "a", "metadata": {"content_hash": RerankScoreCache.make_key("", "a")[1]}}]
+    reranker.rerank("cpu 高", hashed)
+
+    assert [call[0] for call in reranker.reranker.calls] == [["a", "bb"], ["a", "bb"]]
+
+
+def test_rerank_score_cache_is_bounded_lru():
+    cache = RerankScoreCache(max_items=2)
+    cache.put_many({("q", "a"): 1.0, ("q", "b"): 2.0})
+    cache.get_many([("q", "a")])
+    cache.put_many({("q", "c"): 3.0})
+
+    assert cache.get_many([("q", "a"), ("q", "b"), ("q", "c")]) == {("q", "a"): 1.0, ("q", "c"): 3.0}
@@ -0,0 +1,59 @@
+from app.rag.chunking import ChunkStrategy, DocumentChunker
+from app.rag.document_parser import build_document_chunks
+
+
+def test_csv_chunks_group_rows_and_replay_header(tmp_path):
+    path = tmp_path / "hosts.csv"
+    path.write_text("host,cpu\n" + "".join(f"h{i},{i}\n" for i in range(45)), encoding="utf-8")
+    chunker = DocumentChunker(ChunkStrategy.CSV, max_size=2000, overlap=0, table_rows=20)
+
+    chunks = build_document_chunks(chunker, str(path), "hosts.csv")
+
+    ranges = [(c["metadata"].get("row_start"), c["metadata"].get("row_end")) for c in chunks]
+    assert ranges == [(1, 20), (21, 40), (41, 45), (1, 45)]
+    for chunk in chunks:
+        assert chunk["metadata"]["strategy"] == "table"
+        assert chunk["content"].startswith("[hosts.csv]\n表格包含2列：host,cpu\n")
+    assert chunks[1]["content"].splitlines()[2] == "第21-40条记录"
+    assert chunks[1]["content"].splitlines()[-1] == "记录40: host为h39,cpu为39"
+    assert "统计摘要" in chunks[-1]["content"]
+
+
+def test_table_chunks_also_respect_max_size():
+    rows = "\n".join(f"记录{i}: note为{'x' * 40}" for i in range(1, 7))
+    text = f"[t]\n表格包含1列：note\n第1-6条记录\n\n{rows}"
+    chunker = DocumentChunker(ChunkStrategy.CSV, max_size=120, overlap=0, table_rows=20)
+
+    chunks = chunker.chunk_text(text, "t.csv")
+
+    assert [(c["metadata"]["row_start"], c["metadata"]["row_end"]) for c in chunks] == [(1, 2), (3, 4), (5, 6)]
+    assert all(c["content"].startswith("[t]\n表格包含1列：note\n") for c in chunks)
+
+
+def test_multiline_cell_stays_with_its_row(tmp_path):
+    path = tmp_path / "t.csv"
+    path.write_text('host,note\nh1,"line1\nline2"\nh2,ok\n', encoding="utf-8")
+    chunker = DocumentChunker(ChunkStrategy.CSV, max_size=2000, overlap=0, table_rows=20)
+
+    chunks = build_document_chunks(chunker, str(path), "t.csv")
+
+    assert [(c["metadata"].get("row_start"), c["metadata"].get("row_end")) for c in chunks] == [(1, 2), (1, 2)]
+    assert "记录1: host为h1,note为line1 line2" in chunks[0]["content"].splitlines()
+    assert not any(line == "line2" for c in chunks for line in c["content"].splitlines())
+
+
+def test_oversized_row_is_split_within_budget():
+    long_row = "记录2: " + ",".join(f"col{i}为{'y' * 20}" for i in range(12))
+    text = f"[t]\n表格包含12列：...\n第1-3条记录\n\n记录1: col0为a\n{long_row}\n记录3: col0为c"
+    chunker = DocumentChunker(ChunkStrategy.CSV, max_size=150, overlap=0, table_rows=20)
+
+    chunks = chunker.chunk_text(text, "t.csv")
+
+    ranges = [(c["metadata"]["row_start"], c["metadata"]["row_end"]) for c in chunks]
+    assert ranges[0] == (1, 1) and ranges[-1] == (3, 3)
+    assert set(ranges[1:-1]) == {(2, 2)} and len(ranges) > 3
+    assert all(len(c["content"]) <= 150 for c in chunks)
+    assert chunks[2]["content"].splitlines()[-1].startswith("记录2(续): ")
+    # 拆开的各段拼起来不丢内容
+    body = "".join(c["content"].splitlines()[-1].replace("记录2(续): ", ",") for c in chunks[1:-1])
+    assert body == long_row
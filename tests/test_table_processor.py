@@ -0,0 +1,60 @@
+from app.rag import table_processor
+from app.rag.table_processor import TableProcessor, TableStats
+
+
+def test_row_groups_keep_every_row_and_summarize_whole_table():
+    headers = ["host", "cpu", "env"]
+    rows = ([f"h{i}", str(i), "prod" if i % 3 else "test"] for i in range(250))
+
+    records = list(TableProcessor.iter_row_groups(headers, rows, "hosts", rows_per_group=100))
+
+    assert [r["metadata"] for r in records] == [
+        {"row_start": 1, "row_end": 100},
+        {"row_start": 101, "row_end": 200},
+        {"row_start": 201, "row_end": 250},
+        {"row_start": 1, "row_end": 250},
+    ]
+    assert records[2]["content"].splitlines()[:3] == ["[hosts]", "表格包含3列：host,cpu,env", "第201-250条记录"]
+    assert "记录250: host为h249,cpu为249,env为test" in records[2]["content"]
+    summary = records[-1]["content"]
+    assert "- cpu：范围 0.00 ~ 249.00，平均 124.50" in summary
+    assert "- env分布：prod(166条),test(84条)" in summary
+    # 高基数列不输出分布
+    assert "host分布" not in summary
+
+
+def test_table_stats_accumulates_blocks_like_single_pass():
+    headers = ["latency", "status", "note"]
+    rows = [[" 12 ", "ok", "x"], ["abc", "fail", ""], ["3.5", "ok"], ["", "", "y"]]
+
+    whole = TableStats(headers)
+    whole.update(rows)
+    blocks = TableStats(headers)
+    blocks.update(rows[:1])
+    blocks.update(rows[1:])
+
+    assert whole.summary_lines() == blocks.summary_lines() == [
+        "-共 4条记录",
+        "- latency：范围 3.50 ~ 12.00，平均 7.75",
+        "- latency分布：12(1条),abc(1条),3.5(1条)",
+        "- status分布：ok(2条),fail(1条)",
+        "- note分布：x(1条),y(1条)",
+    ]
+
+
+def test_table_stats_without_pandas_matches_pandas_path(monkeypatch):
+    headers = ["latency", "status", "note"]
+    rows = [[" 12 ", "ok", "x"], ["abc", "fail", ""], ["3.5", "ok"], ["", "", "y"], ["-1e1", "ok", "x"]]
+
+    with_pandas = TableStats(headers)
+    with_pandas.update(rows)
+    monkeypatch.setattr(table_processor, "pd", None)
+    numpy_only = TableStats(headers)
+    numpy_only.update(rows[:2])
+    numpy_only.update(rows[2:])
+
+    assert numpy_only.summary_lines() == with_pandas.summary_lines()
+
+
+def test_empty_table_yields_single_marker_record():
+    assert list(TableProcessor.iter_row_groups(["a"], [], "t")) == [{"content": "[t]空表格", "metadata": {}}]
@@ -0,0 +1,49 @@
+from app.rag.chunking import ChunkStrategy, DocumentChunker
+from app.rag.tokenization import approx_token_count, summarize_token_counts
+
+
+def test_approx_token_count_counts_cjk_per_char_and_words_per_four_chars():
+    assert approx_token_count("") == 0
+    assert approx_token_count("使用率过高") == 5
+    assert approx_token_count("CPU usage") == 1 + 2
+    assert approx_token_count("CPU 使用率过高，排查 top -H!") == 13
+
+
+def test_summarize_token_counts_builds_histogram_and_percentiles():
+    stats = summarize_token_counts([10, 100, 200, 300, 600])
+
+    assert stats["chunks"] == 5
+    assert stats["p50"] == 200
+    assert stats["max"] == 600
+    assert stats["histogram"] == {
+        "1-64": 1,
+        "65-128": 1,
+        "129-256": 1,
+        "257-384": 1,
+        "385-512": 0,
+        ">512": 1,
+    }
+
+
+def test_token_budget_keeps_mixed_language_chunks_under_limit():
+    text = "\n\n".join(
+        ["磁盘使用率超过百分之九十时需要先清理日志再扩容。" * 3, "Check disk usage with df -h and du -sh /var/log/*. " * 4] * 4
+    )
+    chunker = DocumentChunker(ChunkStrategy.RECURSIVE, max_size=800, overlap=0, max_tokens=60)
+
+    chunks = chunker.chunk_text(text, "disk.txt")
+
+    assert len(chunks) > 4
+    assert all(0 < c["metadata"]["token_count"] <= 60 for c in chunks)
+    assert all(c["metadata"]["token_count"] == approx_token_count(c["content"]) for c in chunks)
+
+
+def test_markdown_sections_over_token_budget_are_split_further():
+    text = "# 磁盘\n\n" + "清理日志文件并检查挂载点。" * 20 + "\n\n# CPU\n\n查看负载。"
+    chunker = DocumentChunker(ChunkStrategy.MARKDOWN, max_size=800, overlap=0, max_tokens=50)
+
+    chunks = chunker.chunk_text(text, "ops.md")
+
+    assert [c["metadata"]["header1"] for c in chunks].count("磁盘") > 1
+    assert all(c["metadata"]["token_count"] <= 50 for c in chunks)
+    assert chunks[-1]["content"] == "查看负载。"
@@ -0,0 +1,71 @@
+import pytest
+
+from app.rag.vector_store import VectorStore
+
+
+class FakeEmbeddingService:
+    def __init__(self):
+        self.batch_sizes = []
+
+    async def embed_texts(self, texts):
+        self.batch_sizes.append(len(texts))
+        return [[0.1, 0.2] for _ in texts]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted = []
+        self.flush_calls = 0
+
+    def insert(self, data):
+        self.inserted.append(len(data[1]))
+
+    def flush(self):
+        self.flush_calls += 1
+
+
+class FakeMilvusClient:
+    def __init__(self, collection):
+        self.collection = collection
+
+
+def _chunks(source, n):
+    return [{"content": f"{source} chunk {i}", "metadata": {"source": source}} for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_insert_batches_without_flushing_by_default():
+    collection = FakeCollection()
+    store = VectorStore(FakeMilvusClient(collection), FakeEmbeddingService(), insert_batch_size=2)
+
+    await store.insert(_chunks("a.md", 5))
+
+    assert collection.inserted == [2, 2, 1]
+    assert collection.flush_calls == 0
+    assert len(store.bm25_retriever) == 5
+
+    await store.insert(_chunks("b.md", 1), flush=True)
+    assert collection.flush_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_buffers_across_documents_and_flushes_once():
+    collection = FakeCollection()
+    embedding = FakeEmbeddingService()
+    store = VectorStore(FakeMilvusClient(collection), embedding, enable_hybrid=False)
+
+    async with store.bulk_ingest(batch_size=4) as bulk:
+        for source in ("a.md", "b.md", "c.md"):
+            await bulk.add(_chunks(source, 3))
+        # 第二批已完成 embedding，写入与后续 embedding 重叠，可能仍在途
+        assert embedding.batch_sizes == [4, 4]
+        assert collection.inserted[:1] == [4]
+        assert collection.flush_calls == 0
+
+    assert collection.inserted == [4, 4, 1]
+    assert embedding.batch_sizes == [4, 4, 1]
+    assert collection.flush_calls == 1
+    stats = bulk.stats()
+    assert stats["chunks"] == 9
+    assert stats["batches"] == 3
+    assert stats["chunks_per_sec"] > 0
@@ -0,0 +1,256 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from app.rag.metadata_filters import compute_content_hash
+from app.rag.vector_store import VectorStore
+
+
+class FakeEmbeddingService:
+    def __init__(self):
+        self.embedded = []
+
+    async def embed_texts(self, texts):
+        self.embedded.extend(texts)
+        return [[0.1, 0.2] for _ in texts]
+
+
+class FakeCollection:
+    """按 v2 schema 保存行，支持 source 查询和按 id 删除。"""
+
+    def __init__(self):
+        self.rows = {}
+        self.next_id = 1
+
+    def insert(self, data):
+        ids = []
+        for row in data:
+            self.rows[self.next_id] = {"id": self.next_id, **row}
+            ids.append(self.next_id)
+            self.next_id += 1
+        return SimpleNamespace(primary_keys=ids)
+
+    def query(self, expr, output_fields, limit=None):
+        if expr.startswith("id in"):
+            ids = {int(row_id) for row_id in re.findall(r"\d+", expr)}
+            matched = [row for row in self.rows.values() if row["id"] in ids]
+        else:
+            source = re.match(r'source == "(.*)"', expr).group(1)
+            matched = [row for row in self.rows.values() if row["source"] == source]
+        return [{field: row[field] for field in output_fields} for row in matched][:limit]
+
+    def query_iterator(self, batch_size, expr, output_fields, **kwargs):
+        rows = iter([self.query(expr, output_fields)])
+        return SimpleNamespace(next=lambda: next(rows, []), close=lambda: None)
+
+    def delete(self, expr):
+        for row_id in re.findall(r"\d+", expr):
+            self.rows.pop(int(row_id), None)
+
+
+class FakeMilvusClient:
+    def __init__(self, collection):
+        self.collection = collection
+        self.scalar_fields = {"source", "doc_type", "title", "ingested_at", "content_hash"}
+
+
+def _chunks(contents, file_hash, ingested_at):
+    return [
+        {
+            "content": content,
+            "metadata": {
+                "source": "runbook.md",
+                "file_hash": file_hash,
+                "ingested_at": ingested_at,
+                "content_hash": compute_content_hash(content),
+            },
+        }
+        for content in contents
+    ]
+
+
+@pytest.mark.asyncio
+async def test_upsert_source_only_embeds_changed_chunks_and_removes_stale_ones():
+    collection = FakeCollection()
+    embedding = FakeEmbeddingService()
+    store = VectorStore(FakeMilvusClient(collection), embedding)
+
+    first = await store.upsert_source(
+        "runbook.md", _chunks(["CPU 排查", "磁盘清理", "内存泄漏"], "v1", 100), file_hash="v1"
+    )
+    assert first == {"status": "success", "added": 3, "deleted": 0, "unchanged": 0}
+    assert await store.source_file_hash("runbook.md") == "v1"
+
+    skipped = await store.upsert_source(
+        "runbook.md", _chunks(["CPU 排查", "磁盘清理", "内存泄漏"], "v1", 200), file_hash="v1"
+    )
+    assert skipped["status"] == "skipped"
+
+    embedding.embedded.clear()
+    progress = []
+    second = await store.upsert_source(
+        "runbook.md",
+        _chunks(["CPU 排查", "磁盘清理（已更新）"], "v2", 300),
+        file_hash="v2",
+        on_progress=progress.append,
+    )
+
+    assert second == {"status": "success", "added": 1, "deleted": 2, "unchanged": 1}
+    assert embedding.embedded == ["磁盘清理（已更新）"]
+    assert sum(progress) == 2
+    assert sorted(row["content"] for row in collection.rows.values()) == ["CPU 排查", "磁盘清理（已更新）"]
+    assert await store.source_file_hash("runbook.md") == "v2"
+    assert [doc["content"] for doc in store.bm25_retriever.search("磁盘清理", top_k=5)] == ["磁盘清理（已更新）"]
+
+
+@pytest.mark.asyncio
+async def test_upsert_source_consumes_generators_in_batches_and_keeps_data_when_empty():
+    collection = FakeCollection()
+    embedding = FakeEmbeddingService()
+    store = VectorStore(FakeMilvusClient(collection), embedding, insert_batch_size=2)
+    consumed = []
+
+    def stream(contents, file_hash, ingested_at):
+        for chunk in _chunks(contents, file_hash, ingested_at):
+            consumed.append(chunk["content"])
+            yield chunk
+
+    progress = []
+    result = await store.upsert_source(
+        "runbook.md", stream(["a", "b", "c", "d", "e"], "v1", 100), file_hash="v1", on_progress=progress.append
+    )
+
+    assert result == {"status": "success", "added": 5, "deleted": 0, "unchanged": 0}
+    assert progress == [2, 2, 1]
+    assert consumed == ["a", "b", "c", "d", "e"]
+
+    empty = await store.upsert_source("runbook.md", stream([], "v2", 200), file_hash="v2")
+
+    assert empty["status"] == "empty"
+    assert len(collection.rows) == 5
+
+
+class RecordingBM25:
+    def __init__(self):
+        self.calls = []
+
+    def remove_source(self, source):
+        self.calls.append(("remove", source))
+        return 0
+
+    def add(self, documents):
+        self.calls.append(("add", len(documents)))
+
+
+@pytest.mark.asyncio
+async def test_upsert_source_feeds_bm25_per_batch_and_waits_for_pending_write_on_error():
+    collection = FakeCollection()
+    bm25 = RecordingBM25()
+    store = VectorStore(
+        FakeMilvusClient(collection), FakeEmbeddingService(), bm25_retriever=bm25, insert_batch_size=2
+    )
+
+    result = await store.upsert_source("runbook.md", _chunks(["a", "b", "c"], "v1", 100), file_hash="v1")
+
+    assert result["added"] == 3
+    assert bm25.calls == [("remove", "runbook.md"), ("add", 2), ("add", 1)]
+
+    def broken_stream():
+        yield from _chunks(["x", "y"], "v2", 200)
+        raise RuntimeError("解析失败")
+
+    with pytest.raises(Exception, match="解析失败"):
+        await store.upsert_source("runbook.md", broken_stream(), file_hash="v2")
+
+    # 第一批在生成器抛错前已提交写入：要等它落库拿到主键再回滚，而不是留下孤儿任务事后写入
+    await asyncio.sleep(0)
+    assert sorted(row["content"] for row in collection.rows.values()) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_upsert_source_refreshes_metadata_of_kept_chunks_without_reembedding():
+    collection = FakeCollection()
+    embedding = FakeEmbeddingService()
+    store = VectorStore(FakeMilvusClient(collection), embedding)
+    await store.upsert_source("runbook.md", _chunks(["CPU 排查", "磁盘清理", "内存泄漏"], "v1", 100), file_hash="v1")
+
+    # 只删不增：剩下的 chunk 不重新 embedding，但 file_hash / ingested_at 要更新，下次相同文件才能跳过
+    embedding.embedded.clear()
+    result = await store.upsert_source("runbook.md", _chunks(["CPU 排查", "内存泄漏"], "v2", 200), file_hash="v2")
+
+    assert result == {"status": "success", "added": 0, "deleted": 1, "unchanged": 2}
+    assert embedding.embedded == []
+    assert sorted((row["content"], row["ingested_at"]) for row in collection.rows.values()) == [
+        ("CPU 排查", 200),
+        ("内存泄漏", 200),
+    ]
+    assert {row["metadata"]["file_hash"] for row in collection.rows.values()} == {"v2"}
+    assert await store.source_file_hash("runbook.md") == "v2"
+
+
+@pytest.mark.asyncio
+async def test_source_queries_reject_unescapable_source_names():
+    store = VectorStore(FakeMilvusClient(FakeCollection()), FakeEmbeddingService())
+
+    with pytest.raises(Exception, match="引号"):
+        await store.delete_by_source('x" or id > 0 or source == "')
+
+
+@pytest.mark.asyncio
+async def test_source_exists_reports_whether_source_has_chunks():
+    store = VectorStore(FakeMilvusClient(FakeCollection()), FakeEmbeddingService())
+
+    assert await store.source_exists("runbook.md") is False
+    await store.upsert_source("runbook.md", _chunks(["CPU 排查"], "v1", 100), file_hash="v1")
+    assert await store.source_exists("runbook.md") is True
+
+
+class FlakyEmbeddingService(FakeEmbeddingService):
+    def __init__(self, fail_on_call):
+        super().__init__()
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    async def embed_texts(self, texts):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("embedding 服务不可用")
+        return await super().embed_texts(texts)
+
+
+@pytest.mark.asyncio
+async def test_failed_upsert_rolls_back_partial_writes_and_is_not_skipped_on_retry():
+    collection = FakeCollection()
+    embedding = FlakyEmbeddingService(fail_on_call=3)
+    store = VectorStore(FakeMilvusClient(collection), embedding, insert_batch_size=2)
+    await store.upsert_source("runbook.md", _chunks(["A", "B"], "v1", 100), file_hash="v1")
+
+    # 第二批 embedding 失败：第一批已经写入的新行要删掉，BM25 也回到 Milvus 里的旧内容
+    with pytest.raises(Exception, match="embedding 服务不可用"):
+        await store.upsert_source("runbook.md", _chunks(["a", "b", "c", "d"], "v2", 200), file_hash="v2")
+
+    assert sorted(row["content"] for row in collection.rows.values()) == ["A", "B"]
+    assert await store.source_file_hash("runbook.md") == "v1"
+    assert sorted(doc["content"] for doc in store.bm25_retriever.documents.values()) == ["A", "B"]
+
+    retry = await store.upsert_source("runbook.md", _chunks(["a", "b", "c", "d"], "v2", 300), file_hash="v2")
+
+    assert retry == {"status": "success", "added": 4, "deleted": 2, "unchanged": 0}
+    assert sorted(row["content"] for row in collection.rows.values()) == ["a", "b", "c", "d"]
+
+
+@pytest.mark.asyncio
+async def test_mixed_file_hashes_from_an_interrupted_import_are_not_treated_as_indexed():
+    collection = FakeCollection()
+    store = VectorStore(FakeMilvusClient(collection), FakeEmbeddingService())
+    await store.upsert_source("runbook.md", _chunks(["A", "B"], "v1", 100), file_hash="v1")
+    # 模拟回滚也没能执行的情况：新版本的行已写入，旧行还在
+    await store.insert(_chunks(["a", "b"], "v2", 200))
+
+    assert await store.source_file_hash("runbook.md") is None
+    result = await store.upsert_source("runbook.md", _chunks(["a", "b"], "v2", 300), file_hash="v2")
+
+    assert result == {"status": "success", "added": 0, "deleted": 2, "unchanged": 2}
+    assert await store.source_file_hash("runbook.md") == "v2"
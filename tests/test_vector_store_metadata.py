@@ -86,7 +86,12 @@ async def test_vector_store_search_applies_metadata_filters_and_expands_candidat
         },
     )
 
+    # title_contains 含字母无法等价下推，仍需放大召回
     assert collection.last_search_kwargs["limit"] == 30
+    assert collection.last_search_kwargs["expr"] == (
+        'metadata["doc_type"] == "markdown" and metadata["timestamp"] == 1711900850 '
+        'and metadata["section_path"] like "%排查%"'
+    )
     assert len(docs) == 1
     assert docs[0]["metadata"]["source"] == "cpu.md"
 
@@ -110,4 +115,89 @@ async def test_vector_store_search_without_filters_uses_regular_candidate_limit(
     docs = await store.search("CPU 怎么排查", top_k=2)
 
     assert collection.last_search_kwargs["limit"] == 4
+    assert collection.last_search_kwargs["expr"] is None
     assert len(docs) == 2
+
+
+@pytest.mark.asyncio
+async def test_vector_store_search_pushes_down_filters_without_over_fetching():
+    collection = FakeCollection(
+        [FakeHit("doc1", {"source": "a.md", "doc_type": "markdown"}, score=0.9)]
+    )
+    store = VectorStore(
+        FakeMilvusClient(collection),
+        FakeEmbeddingService(),
+        dense_top_k=4,
+        enable_rerank=False,
+        enable_hybrid=False,
+    )
+
+    docs = await store.search("CPU 怎么排查", top_k=2, metadata_filters={"source": "a.md"})
+
+    assert collection.last_search_kwargs["limit"] == 4
+    assert collection.last_search_kwargs["expr"] == 'metadata["source"] == "a.md"'
+    assert len(docs) == 1
+
+
+class FakeWriteCollection(FakeCollection):
+    def __init__(self):
+        super().__init__([])
+        self.inserted = None
+        self.query_exprs = []
+        self.deleted = []
+
+    def insert(self, data):
+        self.inserted = data
+
+    def flush(self):
+        pass
+
+    def query(self, expr, output_fields):
+        self.query_exprs.append(expr)
+        return [{"id": 1}, {"id": 2}]
+
+    def delete(self, expr):
+        self.deleted.append(expr)
+
+
+class FakeScalarMilvusClient(FakeMilvusClient):
+    def __init__(self, collection):
+        super().__init__(collection)
+        self.scalar_fields = {"source", "doc_type", "title", "ingested_at", "content_hash"}
+
+
+class FakeDocEmbeddingService(FakeEmbeddingService):
+    async def embed_texts(self, texts):
+        return [[0.1, 0.2, 0.3] for _ in texts]
+
+
+@pytest.mark.asyncio
+async def test_vector_store_v2_schema_inserts_rows_with_scalar_columns_and_deletes_by_column():
+    collection = FakeWriteCollection()
+    store = VectorStore(
+        FakeScalarMilvusClient(collection),
+        FakeDocEmbeddingService(),
+        enable_hybrid=False,
+    )
+
+    await store.insert(
+        [
+            {
+                "content": "CPU 排查",
+                "metadata": {"source": "cpu.md", "title": "CPU", "doc_type": "markdown", "ingested_at": 1711900850},
+            }
+        ]
+    )
+    row = collection.inserted[0]
+    assert row["source"] == "cpu.md"
+    assert row["doc_type"] == "markdown"
+    assert row["ingested_at"] == 1711900850
+    assert len(row["content_hash"]) == 64
+    assert row["metadata"]["title"] == "CPU"
+
+    await store.search("CPU", top_k=1, metadata_filters={"source": "cpu.md", "timestamp_from": 1})
+    assert collection.last_search_kwargs["expr"] == 'source == "cpu.md" and ingested_at >= 1'
+
+    await store.delete_by_source("cpu.md")
+    assert collection.query_exprs == ['source == "cpu.md"']
+    assert collection.deleted == ["id in [1, 2]"]
@@ -0,0 +1,135 @@
+import pytest
+
+from app.rag.vector_store import VectorStore
+from app.services.rag_service import RAGService
+
+
+class FakeBatchEmbeddingService:
+    def __init__(self):
+        self.embed_text_calls = []
+        self.embed_queries_calls = []
+
+    async def embed_text(self, query):
+        self.embed_text_calls.append(query)
+        return [0.1, 0.2]
+
+    async def embed_queries(self, queries):
+        self.embed_queries_calls.append(list(queries))
+        return [[float(i), 0.0] for i, _ in enumerate(queries)]
+
+
+class FakeEntity:
+    def __init__(self, content, metadata):
+        self._data = {"content": content, "metadata": metadata}
+
+    def get(self, key):
+        return self._data.get(key)
+
+
+class FakeHit:
+    def __init__(self, content, source, score=1.0):
+        self.entity = FakeEntity(content, {"source": source})
+        self.score = score
+
+
+class FakeCollection:
+    def __init__(self, hits_per_query):
+        self.hits_per_query = hits_per_query
+        self.search_calls = []
+
+    def search(self, **kwargs):
+        self.search_calls.append(kwargs)
+        return [self.hits_per_query[i] for i in range(len(kwargs["data"]))]
+
+
+class FakeMilvusClient:
+    def __init__(self, collection):
+        self.collection = collection
+
+
+class FakeReranker:
+    def __init__(self):
+        self.calls = []
+
+    def rerank(self, query, documents, top_k=None):
+        self.calls.append({"query": query, "contents": [d["content"] for d in documents]})
+        return list(documents)
+
+
+@pytest.mark.asyncio
+async def test_search_many_embeds_once_searches_once_and_reranks_union_once():
+    collection = FakeCollection(
+        [
+            [FakeHit("shared chunk", "a.md"), FakeHit("only first", "b.md")],
+            [FakeHit("only second", "c.md"), FakeHit("shared chunk", "a.md")],
+        ]
+    )
+    embedding = FakeBatchEmbeddingService()
+    reranker = FakeReranker()
+    store = VectorStore(
+        FakeMilvusClient(collection),
+        embedding,
+        reranker=reranker,
+        enable_hybrid=False,
+    )
+
+    docs = await store.search_many(["q1", "q2"], top_k=3)
+
+    assert embedding.embed_queries_calls == [["q1", "q2"]]
+    assert embedding.embed_text_calls == []
+    assert len(collection.search_calls) == 1
+    assert len(collection.search_calls[0]["data"]) == 2
+    assert reranker.calls == [
+        {"query": "q1", "contents": ["shared chunk", "only second", "only first"]}
+    ]
+    assert [d["content"] for d in docs] == ["shared chunk", "only second", "only first"]
+
+
+@pytest.mark.asyncio
+async def test_single_query_search_keeps_embed_text_path():
+    collection = FakeCollection([[FakeHit("chunk", "a.md")]])
+    embedding = FakeBatchEmbeddingService()
+    store = VectorStore(FakeMilvusClient(collection), embedding, enable_hybrid=False)
+
+    docs = await store.search("q1", top_k=1)
+
+    assert embedding.embed_text_calls == ["q1"]
+    assert embedding.embed_queries_calls == []
+    assert [d["content"] for d in docs] == ["chunk"]
+
+
+class FakeRewriter:
+    async def process_with_expansions(self, query, history=None, summary=None):
+        return [f"rewritten::{query}", f"expanded::{query}"]
+
+
+class FakeBatchVectorStore:
+    def __init__(self):
+        self.search_many_calls = []
+
+    async def search(self, query, top_k=3, metadata_filters=None):
+        raise AssertionError("search_many should be preferred")
+
+    async def search_many(self, queries, top_k=3, metadata_filters=None):
+        self.search_many_calls.append(
+            {"queries": queries, "top_k": top_k, "metadata_filters": metadata_filters}
+        )
+        return [{"content": "fused", "metadata": {}}]
+
+
+@pytest.mark.asyncio
+async def test_retrieve_multi_query_prefers_batched_search_many():
+    vector_store = FakeBatchVectorStore()
+    service = RAGService(vector_store, llm=None)
+    service.query_rewriter = FakeRewriter()
+
+    docs = await service.retrieve_multi_query("q", top_k=2, metadata_filters={"doc_type": "pdf"})
+
+    assert docs == [{"content": "fused", "metadata": {}}]
+    assert vector_store.search_many_calls == [
+        {
+            "queries": ["rewritten::q", "expanded::q"],
+            "top_k": 2,
+            "metadata_filters": {"doc_type": "pdf"},
+        }
+    ]